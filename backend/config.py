@@ -9,6 +9,63 @@ class Settings(BaseSettings):
     openai_model: str = "gpt-4.1-mini"
     cors_origins: List[str] = ["http://localhost:3000", "http://localhost:5173", "http://localhost:5174"]
 
+    # LLM retries on transient errors (connection, timeout, rate limit, 5xx)
+    llm_max_retries: int = 2
+    llm_retry_backoff_seconds: float = 0.5
+
+    # Local stand-in for the LLM API (backend/llm/stub.py): no key or network needed
+    llm_stub: bool = False
+    llm_stub_ttft_ms: float = 0.0
+    llm_stub_tokens_per_second: float = 0.0  # 0 = no delay between chunks
+    llm_stub_fault_rate: float = 0.0  # share of questions answered with a misspelt column
+
+    # Startup: load the data in the background after binding the port (/readyz
+    # reports when done) instead of before; warm prompts / LLM client as well
+    background_startup: bool = False
+    startup_warm: bool = True
+
+    # Server-side result store (paging/sorting/export by result id)
+    result_store_max_mb: int = 256
+    result_store_ttl_seconds: int = 1800
+
+    # Background job queue for long-running queries
+    job_workers: int = 2
+    job_max_queued: int = 100
+    job_retention_seconds: int = 3600
+
+    # Share one LLM call + execution between identical concurrent queries
+    coalesce_requests: bool = True
+
+    # Rewrite slow pandas idioms in generated code (row-wise apply, iterrows, ...)
+    optimize_generated_code: bool = True
+    # Run generated code on only the columns it references, when that is provably safe
+    prune_unused_columns: bool = True
+    # Memoize row masks of simple filters (df['Region'] == 'South', ...) per dataset version
+    cache_predicates: bool = True
+    predicate_cache_max_mb: int = 64
+
+    # Dry-run generated code on a stratified sample before the full snapshot
+    validate_on_sample: bool = True
+    validation_sample_rows: int = 500
+
+    # Send failed code back to the model with its error (per query)
+    repair_max_attempts: int = 2
+    repair_budget_seconds: float = 30.0
+
+    # Approximate answers (approximate=true): run on a proportional stratified
+    # sample, scale totals, 95% jackknife confidence intervals over replicate groups
+    approx_sample_rows: int = 5000
+    approx_replicate_groups: int = 10
+
+    # Chart-data stage: series longer than these are reduced (top-N + "Other", LTTB)
+    chart_max_categories: int = 15
+    chart_max_points: int = 300
+
+    # Batch questions (/api/query/batch)
+    batch_max_questions: int = 50
+    batch_llm_concurrency: int = 4
+    batch_max_workers: int = 8
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
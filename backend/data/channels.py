@@ -0,0 +1,109 @@
+"""
+Channel coverage and PTP conversion aggregates computed from the packed
+flag store the loader built for the current snapshot (popcounts, no int64
+column scans).
+
+Definitions follow the analysis prompt:
+- Attempt Coverage    = Attempt / Count of Cases * 100
+- Connect Coverage    = Contact / Count of Cases * 100
+- PTP Generation      = PTP / Count of Cases * 100
+- PTP Conversion Rate = PTP Conversion / PTP * 100
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.data.flags import CHANNELS, FlagStore, flag_columns
+from backend.data.loader import get_snapshot
+
+# Rows of a summary: each channel, then the any-channel flags
+_SUMMARY_ROWS = CHANNELS + ['Overall']
+_FLAG_NAMES = {
+    'Overall': {
+        'attempts': 'Overall Attempted',
+        'contacts': 'Overall Contactable',
+        'ptp': 'Overall PTP',
+        'ptp_conversions': 'Overall PTP Conversion',
+    },
+}
+_COUNTS = ['attempts', 'contacts', 'ptp', 'ptp_conversions']
+
+def get_flag_store() -> FlagStore:
+    """Flag store of the current snapshot, as packed by the loader."""
+    return get_snapshot()[1]
+
+
+def _flag_names(row: str) -> dict:
+    if row in _FLAG_NAMES:
+        return _FLAG_NAMES[row]
+    return {
+        'attempts': f'{row} Attempt',
+        'contacts': f'{row} Contact',
+        'ptp': f'{row} PTP',
+        'ptp_conversions': f'{row} PTP Conversion',
+    }
+
+
+def _pct(part: int, whole: int) -> float:
+    return round(part / whole * 100, 2) if whole > 0 else 0.0
+
+
+def _summary(channel: str, cases: int, counts: dict, group: Optional[str] = None) -> dict:
+    return {
+        "channel": channel,
+        "group": group,
+        "cases": cases,
+        **counts,
+        "attempt_coverage": _pct(counts['attempts'], cases),
+        "connect_coverage": _pct(counts['contacts'], cases),
+        "ptp_generation": _pct(counts['ptp'], cases),
+        "ptp_conversion_rate": _pct(counts['ptp_conversions'], counts['ptp']),
+    }
+
+
+def channel_summary(by: Optional[str] = None) -> list[dict]:
+    """
+    Coverage and conversion per channel (plus 'Overall'), optionally per
+    value of the column `by`. Flags a channel lacks count as zero.
+    Raises KeyError if `by` is not a column.
+    """
+    df, store = get_snapshot()
+    rows = [(channel, _flag_names(channel)) for channel in _SUMMARY_ROWS]
+    present = [name for _, names in rows for name in names.values() if name in store]
+
+    if by is None:
+        counts = {name: store.count(name) for name in present}
+        return [
+            _summary(channel, store.rows, {key: counts.get(name, 0) for key, name in names.items()})
+            for channel, names in rows
+        ]
+
+    if by not in df.columns:
+        raise KeyError(by)
+    codes, groups = pd.factorize(df[by], sort=True)
+    sizes = np.bincount(codes[codes >= 0], minlength=len(groups))
+    grouped = store.grouped_counts(present, codes, len(groups))
+    column_of = {name: j for j, name in enumerate(present)}
+
+    summaries = []
+    for g, group in enumerate(groups):
+        for channel, names in rows:
+            counts = {
+                key: int(grouped[g, column_of[name]]) if name in column_of else 0
+                for key, name in names.items()
+            }
+            summaries.append(_summary(channel, int(sizes[g]), counts, str(group)))
+    return summaries
+
+
+def flag_store_stats() -> dict:
+    """Packed size of the flag store against the int64 columns it mirrors."""
+    store = get_flag_store()
+    columns = [name for name in flag_columns() if name in store]
+    return {
+        "flags": len(columns),
+        "rows": store.rows,
+        "packed_bytes": store.nbytes,
+        "int64_bytes": len(columns) * store.rows * 8,
+    }
@@ -0,0 +1,139 @@
+"""
+Packed bitset store for the derived 0/1 per-loan flags.
+
+The loader derives about 30 indicator columns (channel Attempt / Contact,
+PTP, PTP Conversion, Overall / Voice Attempted and Contactable, Resolved).
+A FlagStore keeps each one as a packed bit array (1 bit per loan instead of
+8 bytes), combines them with vectorized OR / AND and counts them with a
+popcount, so channel coverage and conversion need no int64 column scans.
+
+The DataFrame keeps int64 columns for generated code: narrower ints would
+overflow on ordinary arithmetic such as df['Call Attempt'] * 1000.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+CHANNELS = ['IVR', 'WhatsApp', 'SMS', 'Call', 'Tara Call']
+VOICE_CHANNELS = ['IVR', 'Call', 'Tara Call']
+# Channels with PTP dispositions (SMS has none)
+PTP_CHANNELS = ['IVR', 'WhatsApp', 'Call', 'Tara Call']
+
+# Overall flag -> the flags it is the OR of
+OVERALL_FLAGS = {
+    'Overall PTP': [f'{channel} PTP' for channel in PTP_CHANNELS],
+    'Overall Attempted': [f'{channel} Attempt' for channel in CHANNELS],
+    'Overall Contactable': [f'{channel} Contact' for channel in CHANNELS],
+    'Voice Attempted': [f'{channel} Attempt' for channel in VOICE_CHANNELS],
+    'Voice Contactable': [f'{channel} Contact' for channel in VOICE_CHANNELS],
+}
+
+# Bits set per byte value, for numpy versions without bitwise_count
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+# Above this many groups grouped_counts switches from packed masks to bincount
+_MAX_MASKED_GROUPS = 64
+
+
+def flag_columns() -> list[str]:
+    """Every flag column the loader can derive, in a stable order."""
+    names = ['Resolved']
+    for channel in CHANNELS:
+        names += [f'{channel} Attempt', f'{channel} Contact']
+    for channel in PTP_CHANNELS:
+        names += [f'{channel} PTP', f'{channel} PTP Conversion']
+    names += list(OVERALL_FLAGS) + ['Overall PTP Conversion']
+    return names
+
+
+def popcount(packed: np.ndarray) -> int:
+    """Number of set bits in a packed array."""
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(packed).sum(dtype=np.int64))
+    return int(_POPCOUNT[packed].sum(dtype=np.int64))
+
+
+class FlagStore:
+    """Named per-row flags of one frame, packed 8 to a byte (padding bits are always 0)."""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+        self._bits: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, names: Optional[Iterable[str]] = None) -> "FlagStore":
+        """Pack the given (default: all known) 0/1 columns of df that exist."""
+        store = cls(len(df))
+        for name in names if names is not None else flag_columns():
+            if name in df.columns:
+                store.add(name, df[name].to_numpy() != 0)
+        return store
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._bits)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bits.nbytes for bits in self._bits.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._bits
+
+    def pack(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=bool)
+        if len(values) != self.rows:
+            raise ValueError(f"expected {self.rows} flags, got {len(values)}")
+        return np.packbits(values)
+
+    def add(self, name: str, values) -> np.ndarray:
+        """Store a flag from booleans (or 0/1); returns its pandas-compatible int64 column."""
+        self._bits[name] = self.pack(values)
+        return self.column(name)
+
+    def add_bits(self, name: str, bits: np.ndarray) -> np.ndarray:
+        """Store an already packed flag (e.g. from any_of); returns its int64 column."""
+        self._bits[name] = bits
+        return self.column(name)
+
+    def bits(self, name: str) -> np.ndarray:
+        return self._bits[name]
+
+    def any_of(self, names: Iterable[str]) -> np.ndarray:
+        """Packed OR of the stored flags among names (all zeros if none are stored)."""
+        present = [self._bits[name] for name in names if name in self._bits]
+        if not present:
+            return np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce(present)
+
+    def all_of(self, names: Iterable[str]) -> np.ndarray:
+        """Packed AND of the given flags (all must be stored)."""
+        return np.bitwise_and.reduce([self._bits[name] for name in names])
+
+    def column(self, name_or_bits) -> np.ndarray:
+        """A stored flag (or packed bits) as a 0/1 int64 array."""
+        bits = self._bits[name_or_bits] if isinstance(name_or_bits, str) else name_or_bits
+        return np.unpackbits(bits, count=self.rows).astype(np.int64)
+
+    def count(self, name_or_bits) -> int:
+        bits = self._bits[name_or_bits] if isinstance(name_or_bits, str) else name_or_bits
+        return popcount(bits)
+
+    def grouped_counts(self, names: list[str], codes: np.ndarray, groups: int) -> np.ndarray:
+        """
+        Set bits of each flag within each group: an int64 array of shape
+        (groups, len(names)), for group codes 0..groups-1 per row (-1 = none).
+        """
+        counts = np.zeros((groups, len(names)), dtype=np.int64)
+        if groups > _MAX_MASKED_GROUPS:
+            # Many small groups: one bincount per flag beats a mask per group
+            members = codes >= 0
+            for j, name in enumerate(names):
+                flag = self.column(name)[members]
+                counts[:, j] = np.bincount(codes[members], weights=flag, minlength=groups)
+            return counts
+        for group in range(groups):
+            members = self.pack(codes == group)
+            for j, name in enumerate(names):
+                counts[group, j] = popcount(self._bits[name] & members)
+        return counts
@@ -1,11 +1,19 @@
+import hashlib
+import os
+import threading
 from typing import Optional
 
 import pandas as pd
 
 from backend.config import settings
+from backend.data.flags import OVERALL_FLAGS, FlagStore
 
 
 _cached_df: Optional[pd.DataFrame] = None  # reload v8
+_cached_version: Optional[str] = None
+# (frame, packed flags the loader built for it), swapped as one (see channels.py)
+_cached_snapshot: Optional[tuple[pd.DataFrame, FlagStore]] = None
+_load_lock = threading.Lock()
 
 
 def load_and_process_data(file_path: str) -> pd.DataFrame:
@@ -14,6 +22,11 @@ def load_and_process_data(file_path: str) -> pd.DataFrame:
     Ported from AI-data's full load_and_process_data() with all column mappings,
     derived columns, PTP flags, etc.
     """
+    return _load_and_process(file_path)[0]
+
+
+def _load_and_process(file_path: str) -> tuple[pd.DataFrame, FlagStore]:
+    """The processed frame and the packed flag store its 0/1 flag columns came from."""
     # Load data - detect format from extension
     if '.csv' in file_path:
         df = pd.read_csv(file_path, encoding='latin-1', low_memory=False)
@@ -188,81 +201,109 @@ def load_and_process_data(file_path: str) -> pd.DataFrame:
     if 'State' in df.columns and 'Region' not in df.columns:
         df['Region'] = df['State'].map(state_region_map)
 
+    # ==========================================================================
+    # 0/1 flags: derived into a packed FlagStore (overall flags are bitwise ORs)
+    # and exposed as int64 columns
+    # ==========================================================================
+    flags = FlagStore(len(df))
+
     # Calculate Resolved flag
     if 'Status' in df.columns:
-        df['Resolved'] = (df['Status'] == 'COLLECTED').astype(int)
+        df['Resolved'] = flags.add('Resolved', df['Status'] == 'COLLECTED')
 
     # Calculate PTP flags based on dispositions
     if 'IVR Interactive Response' in df.columns:
-        df['IVR PTP'] = df['IVR Interactive Response'].isin(['Promise to pay']).astype(int)
+        df['IVR PTP'] = flags.add('IVR PTP', df['IVR Interactive Response'].isin(['Promise to pay']))
     if 'WhatsApp Interactive Response' in df.columns:
-        df['WhatsApp PTP'] = df['WhatsApp Interactive Response'].isin(['Promise to pay']).astype(int)
+        df['WhatsApp PTP'] = flags.add('WhatsApp PTP', df['WhatsApp Interactive Response'].isin(['Promise to pay']))
     if 'Best Disposition' in df.columns:
         ptp_dispositions = ['Maintain Balance', 'Promised to Pay', 'Already Paid', 'Paid on Call', 'Claims Paid', 'Partially Paid']
-        df['Call PTP'] = df['Best Disposition'].isin(ptp_dispositions).astype(int)
+        df['Call PTP'] = flags.add('Call PTP', df['Best Disposition'].isin(ptp_dispositions))
     if 'Voice Bot Best Disposition' in df.columns:
         tara_ptp_dispositions = ['Promised to Pay', 'Claims Paid', 'Already Paid', 'Paid on Call', 'Maintain Balance', 'PART PAID']
-        df['Tara Call PTP'] = df['Voice Bot Best Disposition'].isin(tara_ptp_dispositions).astype(int)
+        df['Tara Call PTP'] = flags.add('Tara Call PTP', df['Voice Bot Best Disposition'].isin(tara_ptp_dispositions))
 
     # Calculate Attempt and Contact flags
     for channel in ['IVR', 'WhatsApp', 'SMS', 'Call']:
         sent_col = f'{channel} Sent count'
         delivered_col = f'{channel} Delivered count'
         if sent_col in df.columns:
-            df[f'{channel} Attempt'] = (df[sent_col] > 0).astype(int)
+            df[f'{channel} Attempt'] = flags.add(f'{channel} Attempt', df[sent_col] > 0)
         if delivered_col in df.columns:
-            df[f'{channel} Contact'] = (df[delivered_col] > 0).astype(int)
+            df[f'{channel} Contact'] = flags.add(f'{channel} Contact', df[delivered_col] > 0)
 
     # Tara Call (Voice Bot) specific
     if 'Tara Call Sent Count' in df.columns:
-        df['Tara Call Attempt'] = (df['Tara Call Sent Count'] > 0).astype(int)
+        df['Tara Call Attempt'] = flags.add('Tara Call Attempt', df['Tara Call Sent Count'] > 0)
     if 'Tara Call Delivered Count' in df.columns:
-        df['Tara Call Contact'] = (df['Tara Call Delivered Count'] > 0).astype(int)
+        df['Tara Call Contact'] = flags.add('Tara Call Contact', df['Tara Call Delivered Count'] > 0)
 
     # Calculate PTP Conversions (PTP that resulted in collection)
-    if 'Call PTP' in df.columns:
-        df['Call PTP Conversion'] = ((df.get('Call PTP', 0) == 1) & (df['Status'] == 'COLLECTED')).astype(int)
-    if 'IVR PTP' in df.columns:
-        df['IVR PTP Conversion'] = ((df.get('IVR PTP', 0) == 1) & (df['Status'] == 'COLLECTED')).astype(int)
-    if 'WhatsApp PTP' in df.columns:
-        df['WhatsApp PTP Conversion'] = ((df.get('WhatsApp PTP', 0) == 1) & (df['Status'] == 'COLLECTED')).astype(int)
-    if 'Tara Call PTP' in df.columns:
-        df['Tara Call PTP Conversion'] = ((df.get('Tara Call PTP', 0) == 1) & (df['Status'] == 'COLLECTED')).astype(int)
-
-    # Overall PTP (any channel)
-    ptp_cols = ['IVR PTP', 'WhatsApp PTP', 'Call PTP', 'Tara Call PTP']
-    existing_ptp_cols = [col for col in ptp_cols if col in df.columns]
-    if existing_ptp_cols:
-        df['Overall PTP'] = (df[existing_ptp_cols].sum(axis=1) > 0).astype(int)
-        df['Overall PTP Conversion'] = ((df['Overall PTP'] == 1) & (df['Status'] == 'COLLECTED')).astype(int)
-
-    # Overall Attempted and Contactable
-    attempt_cols = ['IVR Attempt', 'WhatsApp Attempt', 'SMS Attempt', 'Call Attempt', 'Tara Call Attempt']
-    existing_attempt_cols = [col for col in attempt_cols if col in df.columns]
-    if existing_attempt_cols:
-        df['Overall Attempted'] = (df[existing_attempt_cols].sum(axis=1) > 0).astype(int)
-
-    contact_cols = ['IVR Contact', 'WhatsApp Contact', 'SMS Contact', 'Call Contact', 'Tara Call Contact']
-    existing_contact_cols = [col for col in contact_cols if col in df.columns]
-    if existing_contact_cols:
-        df['Overall Contactable'] = (df[existing_contact_cols].sum(axis=1) > 0).astype(int)
-
-    # Voice specific (IVR + Call + Tara)
-    voice_attempt_cols = ['IVR Attempt', 'Call Attempt', 'Tara Call Attempt']
-    existing_voice_attempt = [col for col in voice_attempt_cols if col in df.columns]
-    if existing_voice_attempt:
-        df['Voice Attempted'] = (df[existing_voice_attempt].sum(axis=1) > 0).astype(int)
-
-    voice_contact_cols = ['IVR Contact', 'Call Contact', 'Tara Call Contact']
-    existing_voice_contact = [col for col in voice_contact_cols if col in df.columns]
-    if existing_voice_contact:
-        df['Voice Contactable'] = (df[existing_voice_contact].sum(axis=1) > 0).astype(int)
-
-    return df
+    for channel in ['Call', 'IVR', 'WhatsApp', 'Tara Call']:
+        if f'{channel} PTP' in flags:
+            df[f'{channel} PTP Conversion'] = flags.add_bits(
+                f'{channel} PTP Conversion', flags.all_of([f'{channel} PTP', 'Resolved'])
+            )
+
+    # Overall PTP (any channel), Overall / Voice Attempted and Contactable
+    for name, parts in OVERALL_FLAGS.items():
+        if any(part in flags for part in parts):
+            df[name] = flags.add_bits(name, flags.any_of(parts))
+            if name == 'Overall PTP':
+                df['Overall PTP Conversion'] = flags.add_bits(
+                    'Overall PTP Conversion', flags.all_of(['Overall PTP', 'Resolved'])
+                )
+
+    return df, flags
+
+
+def _file_version(file_path: str) -> str:
+    """Short fingerprint of the data file (path, size, mtime)."""
+    try:
+        st = os.stat(file_path)
+        raw = f"{os.path.abspath(file_path)}:{st.st_size}:{st.st_mtime_ns}"
+    except OSError:
+        raw = file_path
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
 
 
 def get_dataframe() -> pd.DataFrame:
-    global _cached_df
+    global _cached_df, _cached_version, _cached_snapshot
     if _cached_df is None:
-        _cached_df = load_and_process_data(settings.data_file_path)
+        # Requests arriving during a background startup load wait for it instead of loading again
+        with _load_lock:
+            if _cached_df is None:
+                _cached_version = _file_version(settings.data_file_path)
+                _cached_snapshot = _load_and_process(settings.data_file_path)
+                _cached_df = _cached_snapshot[0]
     return _cached_df
+
+
+def reload_dataframe(file_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Load the data file again (or switch to file_path) and serve it from now on.
+    Caches keyed by get_dataset_version() rebuild on their next use.
+    """
+    global _cached_df, _cached_version, _cached_snapshot
+    with _load_lock:
+        if file_path is not None:
+            settings.data_file_path = file_path
+        _cached_snapshot = _load_and_process(settings.data_file_path)
+        df = _cached_snapshot[0]
+        # Frame before version: a reader pairing the new frame with the old
+        # version only builds a cache entry that is rebuilt right after
+        _cached_df = df
+        _cached_version = _file_version(settings.data_file_path)
+    return df
+
+
+def get_snapshot() -> tuple[pd.DataFrame, FlagStore]:
+    """The current frame with the packed flag store the loader built for it (a consistent pair)."""
+    get_dataframe()
+    return _cached_snapshot
+
+
+def get_dataset_version() -> str:
+    """Identifier of the loaded snapshot; changes whenever the data is reloaded from a different file."""
+    get_dataframe()
+    return _cached_version
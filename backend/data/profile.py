@@ -0,0 +1,81 @@
+"""
+Per-snapshot dataset profile used by the prompt builders.
+
+Everything a prompt needs to know about the data (column descriptions,
+samples, distinct values, ranges) is computed once per snapshot, so building
+a prompt costs the same regardless of how many rows are loaded.
+"""
+import threading
+from typing import Any, Optional
+
+import pandas as pd
+
+from backend.data.loader import get_dataframe, get_dataset_version
+
+# Columns whose distinct values are quoted in the prompts
+_DISTINCT_COLUMNS = [
+    'Region', 'State', 'DPD Bucket', 'POS Band', 'MOB Bucket', 'Allocation Name', 'Loan Product',
+]
+# Numeric columns whose min/max are quoted in the prompts
+_RANGE_COLUMNS = ['DPD']
+_SAMPLE_ROWS = 3
+
+
+def _column_sample(series: pd.Series) -> str:
+    non_null = series.dropna()
+    sample = non_null.iloc[0] if not non_null.empty else 'N/A'
+    return str(sample)[:50] + '...' if len(str(sample)) > 50 else str(sample)
+
+
+class DatasetProfile:
+    """Prompt-facing summary of one dataframe snapshot."""
+
+    def __init__(self, df: pd.DataFrame, version: str):
+        self.version = version
+        self.row_count = len(df)
+        self.columns: list[str] = df.columns.tolist()
+        self.dtypes: dict[str, str] = {col: str(df[col].dtype) for col in df.columns}
+        self.samples: dict[str, str] = {col: _column_sample(df[col]) for col in df.columns}
+        self.column_descriptions = "\n".join(
+            f"- {col} ({self.dtypes[col]}): e.g., {self.samples[col]}" for col in self.columns
+        )
+        self.sample_rows: list[dict] = df.head(_SAMPLE_ROWS).to_dict(orient='records')
+        # Unique values in order of appearance, missing values included
+        self.unique_values: dict[str, list] = {
+            col: df[col].unique().tolist() for col in _DISTINCT_COLUMNS if col in df.columns
+        }
+        self.ranges: dict[str, tuple[Any, Any]] = {
+            col: (df[col].min(), df[col].max()) for col in _RANGE_COLUMNS if col in df.columns
+        }
+        # Bytes held by each column (strings included), for column-pruning savings
+        self.column_bytes: dict[str, int] = df.memory_usage(deep=True, index=False).to_dict()
+
+    def has(self, col: str) -> bool:
+        return col in self.dtypes
+
+    def distinct(self, col: str, dropna: bool = True, limit: Optional[int] = None) -> list:
+        """Distinct values of a profiled column ([] if the column is absent)."""
+        values = self.unique_values.get(col, [])
+        if dropna:
+            values = [v for v in values if not pd.isna(v)]
+        return values[:limit] if limit is not None else list(values)
+
+
+_cached_profile: Optional[DatasetProfile] = None
+_profile_lock = threading.Lock()
+
+
+def get_dataset_profile(df: Optional[pd.DataFrame] = None) -> DatasetProfile:
+    """
+    Profile of the loaded snapshot, rebuilt only when the dataset version changes.
+    Frames other than the loaded snapshot are profiled on the fly (not cached).
+    """
+    global _cached_profile
+    if df is not None and df is not get_dataframe():
+        return DatasetProfile(df, version=f"frame-{id(df)}")
+
+    version = get_dataset_version()
+    with _profile_lock:
+        if _cached_profile is None or _cached_profile.version != version:
+            _cached_profile = DatasetProfile(get_dataframe(), version)
+        return _cached_profile
@@ -0,0 +1,178 @@
+"""
+Day / week / month rollups of the snapshot over its date columns.
+
+For Upload Date, Due Date and payment date columns, the additive collection
+and contact measures (Count of Cases, POS, Collected Amount, Resolved and
+the attempt / contact / PTP flags) are summed per day once per dataset
+version; weeks (starting Monday) and months are re-aggregated from the daily
+table. Ratios are derived on read, so every grain stays exact.
+"""
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.data.loader import get_dataframe, get_dataset_version
+
+GRAINS = ['day', 'week', 'month']
+PREFERRED_DATE_COLUMNS = ['Upload Date', 'Due Date']
+CASES = 'Count of Cases'
+MEASURES = [
+    'POS', 'Collected Amount', 'Resolved',
+    'Overall Attempted', 'Overall Contactable', 'Overall PTP', 'Overall PTP Conversion',
+    'Call Attempt', 'Call Contact', 'Call PTP',
+    'IVR Attempt', 'IVR Contact', 'WhatsApp Attempt', 'WhatsApp Contact',
+    'SMS Attempt', 'SMS Contact', 'Tara Call Attempt', 'Tara Call Contact',
+]
+# Derived rate -> (numerator, denominator), following the prompt definitions
+RATES = {
+    'Amount Efficiency': ('Collected Amount', 'POS'),
+    'Resolution Rate': ('Resolved', CASES),
+    'Attempt Coverage': ('Overall Attempted', CASES),
+    'Connect Coverage': ('Overall Contactable', CASES),
+    'PTP Generation': ('Overall PTP', CASES),
+    'PTP Conversion Rate': ('Overall PTP Conversion', 'Overall PTP'),
+}
+
+
+def rollup_date_columns(df: pd.DataFrame) -> list[str]:
+    """Parsed date columns to roll up: Upload Date, Due Date, then payment dates."""
+    dated = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    payments = [col for col in dated if 'pay' in col.lower() and col not in PREFERRED_DATE_COLUMNS]
+    return [col for col in PREFERRED_DATE_COLUMNS if col in dated] + payments
+
+
+def period_start(dates: pd.Series, grain: str) -> pd.Series:
+    """Start of the day / week (Monday) / month each date falls in."""
+    days = dates.dt.normalize()
+    if grain == 'day':
+        return days
+    if grain == 'week':
+        return days - pd.to_timedelta(days.dt.weekday, unit='D')
+    if grain == 'month':
+        return days - pd.to_timedelta(days.dt.day - 1, unit='D')
+    raise ValueError(f"Unknown grain: {grain}")
+
+
+def _daily(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    measures = [col for col in MEASURES if col in df.columns]
+    dated = df[column].notna()
+    frame = df.loc[dated, measures].copy()
+    frame[CASES] = 1
+    day = period_start(df.loc[dated, column], 'day')
+    return frame.groupby(day.to_numpy()).sum().rename_axis(column)[[CASES] + measures]
+
+
+def build_rollups(df: pd.DataFrame) -> dict[tuple[str, str], pd.DataFrame]:
+    """(date column, grain) -> measures summed per period, indexed by period start."""
+    rollups = {}
+    for column in rollup_date_columns(df):
+        daily = _daily(df, column)
+        rollups[(column, 'day')] = daily
+        for grain in ('week', 'month'):
+            starts = period_start(daily.index.to_series(), grain).to_numpy()
+            rollups[(column, grain)] = daily.groupby(starts).sum().rename_axis(column)
+    return rollups
+
+
+_cached_rollups: Optional[tuple[str, dict]] = None
+_rollup_lock = threading.Lock()
+
+
+def get_rollups() -> dict[tuple[str, str], pd.DataFrame]:
+    """Rollups of the current snapshot, rebuilt when the dataset version changes."""
+    global _cached_rollups
+    version = get_dataset_version()
+    with _rollup_lock:
+        if _cached_rollups is None or _cached_rollups[0] != version:
+            _cached_rollups = (version, build_rollups(get_dataframe()))
+        return _cached_rollups[1]
+
+
+def rolled_up_columns() -> list[str]:
+    """Date columns of the current snapshot that have rollups."""
+    return list(dict.fromkeys(column for column, _ in get_rollups()))
+
+
+def with_rates(table: pd.DataFrame) -> pd.DataFrame:
+    """A rollup table plus its derived percentage rates (0 where the denominator is 0)."""
+    out = table.copy()
+    for rate, (numerator, denominator) in RATES.items():
+        if numerator in out.columns and denominator in out.columns:
+            den = out[denominator].to_numpy(dtype=float)
+            num = out[numerator].to_numpy(dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[rate] = np.where(den > 0, np.round(num / den * 100, 2), 0.0)
+    return out
+
+
+def trend(
+    column: Optional[str] = None,
+    grain: str = 'month',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Rollup of a date column (default: the first available) at a grain, with
+    rates, for periods starting within [start, end]. Raises KeyError for an
+    unknown column and ValueError for an unknown grain.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain: {grain}")
+    rollups = get_rollups()
+    if column is None:
+        columns = rolled_up_columns()
+        if not columns:
+            return pd.DataFrame(columns=[CASES])
+        column = columns[0]
+    if (column, grain) not in rollups:
+        raise KeyError(column)
+    table = rollups[(column, grain)]
+    if start is not None:
+        table = table[table.index >= pd.Timestamp(start)]
+    if end is not None:
+        table = table[table.index <= pd.Timestamp(end)]
+    return with_rates(table)
+
+
+def infer_grain(values: pd.Series) -> Optional[str]:
+    """Grain of a series of period starts (month / week / day), or None if it isn't one."""
+    if isinstance(values.dtype, pd.PeriodDtype):
+        return {'M': 'month', 'W': 'week', 'D': 'day'}.get(values.dtype.freq.freqstr[0])
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        return None
+    dates = values.dropna()
+    if dates.empty or not (dates == dates.dt.normalize()).all():
+        return None
+    if (dates.dt.day == 1).all() and len(dates) > 1:
+        return 'month'
+    if (dates.dt.weekday == 0).all() and len(dates) > 1:
+        return 'week'
+    return 'day'
+
+
+def match_rollup(df: pd.DataFrame, x_key: str) -> Optional[dict]:
+    """
+    The rollup a temporal result's x column corresponds to, as
+    {"date_column", "grain"}, if its name refers to a rolled-up date column
+    and its values are day / week / month starts.
+    """
+    grain = infer_grain(df[x_key])
+    if grain is None:
+        return None
+    name = x_key.lower()
+    for column in rolled_up_columns():
+        stem = column.lower().replace(' date', '')
+        if column.lower() == name or stem in name:
+            return {"date_column": column, "grain": grain}
+    return None
+
+
+def rollup_stats() -> dict:
+    rollups = get_rollups()
+    return {
+        "tables": {f"{column}/{grain}": len(table) for (column, grain), table in rollups.items()},
+        "bytes": int(sum(table.memory_usage(index=True).sum() for table in rollups.values())),
+        "dataset_version": get_dataset_version(),
+    }
@@ -0,0 +1,140 @@
+"""
+Stratified row samples of a snapshot, by default over each Region x DPD
+Bucket combination (missing values included).
+
+- stratified_sample: at least one row per stratum, the rest spread in
+  proportion to stratum size, so rare segments are always represented
+  (validation dry runs).
+- ApproximateSample: a self-weighting proportional sample (every row
+  stands for about the same number of portfolio rows) split into jackknife
+  replicate groups (approximate answers with confidence intervals).
+"""
+import threading
+import weakref
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import settings
+from backend.data.loader import get_dataframe, get_dataset_version
+
+STRATA_COLUMNS = ['Region', 'DPD Bucket']
+
+
+def stratified_sample(
+    df: pd.DataFrame,
+    n: int,
+    by: Optional[list[str]] = None,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    About n rows of df (original order and index kept): one per stratum plus
+    a proportional share of the rest. Returns df itself when it has <= n rows.
+    """
+    if len(df) <= n:
+        return df
+    by = [col for col in (STRATA_COLUMNS if by is None else by) if col in df.columns]
+    rng = np.random.default_rng(seed)
+    if not by:
+        positions = rng.choice(len(df), n, replace=False)
+        return df.iloc[np.sort(positions)]
+
+    strata = df.groupby(by, dropna=False, observed=True, sort=False).indices
+    spare = max(n - len(strata), 0)
+    picks = []
+    for positions in strata.values():
+        take = min(len(positions), 1 + spare * len(positions) // len(df))
+        picks.append(rng.choice(positions, take, replace=False))
+    return df.iloc[np.sort(np.concatenate(picks))]
+
+
+_cached_sample: Optional[tuple[str, int, pd.DataFrame]] = None
+_sample_lock = threading.Lock()
+
+
+def get_validation_sample(df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Stratified sample of settings.validation_sample_rows rows, rebuilt only
+    when the dataset version changes. Other frames are sampled on the fly.
+    """
+    global _cached_sample
+    n = settings.validation_sample_rows
+    if df is not None and df is not get_dataframe():
+        return stratified_sample(df, n)
+
+    version = get_dataset_version()
+    with _sample_lock:
+        if _cached_sample is None or _cached_sample[:2] != (version, n):
+            _cached_sample = (version, n, stratified_sample(get_dataframe(), n))
+        return _cached_sample[2]
+
+
+class ApproximateSample:
+    """Proportional stratified sample of a snapshot, with jackknife replicate groups."""
+
+    def __init__(self, df: pd.DataFrame, version: str, n: int, groups: int, seed: int = 0):
+        self.version = version
+        self.requested = (n, groups)
+        self.population_rows = len(df)
+        by = [col for col in STRATA_COLUMNS if col in df.columns]
+        rng = np.random.default_rng(seed)
+        fraction = min(1.0, n / len(df)) if len(df) else 1.0
+
+        if by:
+            strata = list(df.groupby(by, dropna=False, observed=True, sort=False).indices.values())
+        else:
+            strata = [np.arange(len(df))]
+        picks, replicate = [], []
+        for positions in strata:
+            take = int(round(len(positions) * fraction))
+            chosen = rng.choice(positions, take, replace=False)
+            picks.append(chosen)
+            # Spread each stratum evenly over the replicate groups
+            replicate.append((np.arange(take) + rng.integers(groups)) % groups)
+
+        positions = np.concatenate(picks) if picks else np.array([], dtype=int)
+        order = np.argsort(positions, kind="stable")
+        self.frame = df.iloc[positions[order]]
+        # Replicate group (0..groups-1) of each sample row, in frame order
+        self.replicates = (np.concatenate(replicate) if replicate else np.array([], dtype=int))[order]
+        self.groups = groups
+
+    @property
+    def scale(self) -> float:
+        """Portfolio rows per sample row."""
+        return self.population_rows / len(self.frame) if len(self.frame) else 0.0
+
+    def without_group(self, group: int, frame: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """The sample (or a column subset of it) minus one replicate group."""
+        frame = self.frame if frame is None else frame
+        return frame[self.replicates != group]
+
+
+_cached_approximate: Optional[ApproximateSample] = None
+# Sample of the last other frame asked for (e.g. a batch's pinned snapshot)
+_cached_other: Optional[tuple[weakref.ref, ApproximateSample]] = None
+_approximate_lock = threading.Lock()
+
+
+def get_approximate_sample(df: Optional[pd.DataFrame] = None) -> ApproximateSample:
+    """
+    The maintained approximate-mode sample (settings.approx_sample_rows rows,
+    settings.approx_replicate_groups groups), rebuilt when the dataset version
+    or those settings change. The sample of the last other frame is kept
+    while that frame is alive.
+    """
+    global _cached_approximate, _cached_other
+    n, groups = settings.approx_sample_rows, settings.approx_replicate_groups
+    if df is not None and df is not get_dataframe():
+        with _approximate_lock:
+            if _cached_other is None or _cached_other[0]() is not df or _cached_other[1].requested != (n, groups):
+                _cached_other = (weakref.ref(df), ApproximateSample(df, f"frame-{id(df)}", n, groups))
+            return _cached_other[1]
+
+    version = get_dataset_version()
+    with _approximate_lock:
+        cached = _cached_approximate
+        if cached is None or cached.version != version or cached.requested != (n, groups):
+            cached = _cached_approximate = ApproximateSample(get_dataframe(), version, n, groups)
+        return cached
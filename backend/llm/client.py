@@ -1,34 +1,156 @@
+import importlib
 import json
-from typing import Optional
-
-from openai import OpenAI
+import time
+from typing import TYPE_CHECKING, Callable, Optional
 
 from backend.config import settings
+from backend.llm.prompt import (
+    CODE_GENERATION_PROMPT_PREFIX,
+    DIRECT_QUERY_PROMPT_PREFIX,
+    MODIFY_LOGIC_PROMPT_PREFIX,
+    PREVIEW_PROMPT_PREFIX,
+    REPAIR_PROMPT_PREFIX,
+    build_modify_logic_prompt,
+)
+from backend.llm.telemetry import record_call
+from backend.llm.tokens import prompt_token_report
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+# The openai package takes ~0.7 s to import, so it is imported on first use
+# (or by preload_sdk() during startup warm-up), not with this module.
+_client: Optional["OpenAI"] = None
+
+
+def _retryable() -> tuple:
+    """Transient failures worth retrying (only before any output has been streamed)."""
+    if settings.llm_stub:
+        return ()
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+def _get_client() -> "OpenAI":
+    global _client
+    if settings.llm_stub:
+        from backend.llm.stub import StubClient
+        return StubClient()
+    if _client is None:
+        from openai import OpenAI
+        # Retries are done in _chat so they can be counted
+        _client = OpenAI(api_key=settings.openai_api_key, max_retries=0)
+    return _client
 
 
-_client: Optional[OpenAI] = None
+def preload_sdk() -> None:
+    """Import the LLM SDK ahead of the first question (the client is still built on first use)."""
+    if not settings.llm_stub:
+        importlib.import_module("openai")
 
 
-def _get_client() -> OpenAI:
-    global _client
-    if _client is None:
-        _client = OpenAI(api_key=settings.openai_api_key)
-    return _client
+def _usage(usage) -> Optional[dict]:
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+    }
 
 
-def query_llm(user_query: str, system_prompt: str) -> str:
-    """Single-call LLM query (used by the direct one-shot flow)."""
+def _chat(
+    system_prompt: str,
+    user_query: str,
+    max_tokens: int,
+    call_type: str,
+    on_token: Optional[Callable[[str], None]] = None,
+    static_prefix: Optional[str] = None,
+) -> str:
+    """
+    Run one chat completion and return the stripped text.
+    The response is always streamed so time to first token can be measured;
+    when on_token is given each text delta is passed to it, and an exception
+    raised by on_token aborts the stream (recorded as cancelled, not as an
+    error). Usage, latency, retries and the static_prefix / dynamic token
+    split are recorded under call_type. Latency is end to end, retries and
+    backoff included; time to first token is measured from the start of the
+    attempt that produced it.
+    """
     client = _get_client()
-    response = client.chat.completions.create(
-        model=settings.openai_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_query},
-        ],
-        temperature=0,
-        max_tokens=10000,
+    prompt = prompt_token_report(system_prompt, user_query, static_prefix)
+    retryable = _retryable()
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_query},
+    ]
+
+    start = time.perf_counter()
+    ttft_ms: Optional[float] = None
+    usage: Optional[dict] = None
+    retries = 0
+    parts: list[str] = []
+    aborted = False  # on_token raised: the caller stopped the stream
+    try:
+        while True:
+            attempt_start = time.perf_counter()
+            try:
+                stream = client.chat.completions.create(
+                    model=settings.openai_model,
+                    messages=messages,
+                    temperature=0,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                try:
+                    for chunk in stream:
+                        if chunk.usage is not None:
+                            usage = _usage(chunk.usage)
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            if ttft_ms is None:
+                                ttft_ms = _elapsed_ms(attempt_start)
+                            parts.append(delta)
+                            if on_token is not None:
+                                try:
+                                    on_token(delta)
+                                except BaseException:
+                                    aborted = True
+                                    raise
+                finally:
+                    stream.close()
+                break
+            except retryable:
+                if parts or retries >= settings.llm_max_retries:
+                    raise
+                time.sleep(settings.llm_retry_backoff_seconds * (2 ** retries))
+                retries += 1
+    except BaseException as e:
+        # Caller aborts (e.g. PipelineCancelled on client disconnect) and interpreter-level
+        # exits are not provider failures
+        cancelled = aborted or not isinstance(e, Exception)
+        record_call(
+            call_type, _elapsed_ms(start), ttft_ms, usage, retries,
+            error=not cancelled, cancelled=cancelled, prompt=prompt,
+        )
+        raise
+
+    record_call(call_type, _elapsed_ms(start), ttft_ms, usage, retries, prompt=prompt)
+    return "".join(parts).strip()
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def query_llm(user_query: str, system_prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
+    """Single-call LLM query (used by the direct one-shot flow)."""
+    return _chat(
+        system_prompt, user_query, max_tokens=10000, call_type="query_llm", on_token=on_token,
+        static_prefix=DIRECT_QUERY_PROMPT_PREFIX,
     )
-    return response.choices[0].message.content.strip()
 
 
 def _clean_json_response(response_text: str) -> str:
@@ -46,19 +168,9 @@ def parse_query(user_query: str, system_prompt: str) -> dict:
     FIRST LLM call: Parse natural language query into preview structure.
     Returns JSON with output columns, logic, and row labels.
     """
-    client = _get_client()
-
-    response = client.chat.completions.create(
-        model=settings.openai_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_query},
-        ],
-        temperature=0,
-        max_tokens=2000,
+    response_text = _chat(
+        system_prompt, user_query, max_tokens=2000, call_type="parse_query", static_prefix=PREVIEW_PROMPT_PREFIX,
     )
-
-    response_text = response.choices[0].message.content.strip()
     response_text = _clean_json_response(response_text)
 
     try:
@@ -67,43 +179,35 @@ def parse_query(user_query: str, system_prompt: str) -> dict:
         raise ValueError(f"Failed to parse LLM response as JSON: {e}\nResponse: {response_text}")
 
 
-def generate_code(user_query: str, system_prompt: str) -> dict:
+def request_code(user_query: str, system_prompt: str, on_token: Optional[Callable[[str], None]] = None) -> str:
     """
-    SECOND LLM call: Generate pandas code and SQL from confirmed logic.
-    Returns dict with 'python' and 'sql' keys.
+    SECOND LLM call, raw: returns the model's PYTHON/SQL response text.
+    The system prompt (see build_code_generation_prompt) specifies the output format.
     """
-    client = _get_client()
-
-    enhanced_prompt = system_prompt + """
-
-## Output Format:
-Return your response in this exact format with both Python and SQL:
+    return _chat(
+        system_prompt, user_query, max_tokens=10000, call_type="generate_code", on_token=on_token,
+        static_prefix=CODE_GENERATION_PROMPT_PREFIX,
+    )
 
-PYTHON:
-```python
-<your pandas code here>
-```
 
-SQL:
-```sql
-<equivalent SQL query here>
-```
+def repair_code(user_message: str, system_prompt: str) -> str:
+    """Repair call: the failing code and its error in, corrected code out (see build_repair_request)."""
+    response_text = _chat(
+        system_prompt, user_message, max_tokens=4000, call_type="repair_code", static_prefix=REPAIR_PROMPT_PREFIX,
+    )
+    return extract_code(response_text)['python']
 
-The SQL should be a standard SELECT query that would produce the same result.
-Assume the table is named 'loans' with the same column names as the DataFrame."""
 
-    response = client.chat.completions.create(
-        model=settings.openai_model,
-        messages=[
-            {"role": "system", "content": enhanced_prompt},
-            {"role": "user", "content": user_query},
-        ],
-        temperature=0,
-        max_tokens=10000,
-    )
+def generate_code(user_query: str, system_prompt: str) -> dict:
+    """
+    SECOND LLM call: Generate pandas code and SQL from confirmed logic.
+    Returns dict with 'python' and 'sql' keys.
+    """
+    return extract_code(request_code(user_query, system_prompt))
 
-    response_text = response.choices[0].message.content.strip()
 
+def extract_code(response_text: str) -> dict:
+    """Split a PYTHON/SQL code-generation response into {'python': ..., 'sql': ...}."""
     result = {'python': '', 'sql': ''}
 
     # Extract Python code
@@ -148,57 +252,12 @@ def modify_logic(current_logic: list, followup: str, df) -> list:
     Modify existing logic based on a follow-up message.
     Returns updated logic list.
     """
-    client = _get_client()
+    system_prompt = build_modify_logic_prompt(df, current_logic, followup)
 
-    all_columns = df.columns.tolist()
-
-    current_logic_str = "\n".join(
-        [f"- {col.get('Column', col.get('name', ''))}: {col.get('Logic', col.get('logic', ''))}"
-         for col in current_logic]
-    )
-
-    system_prompt = f"""You are modifying an existing query logic based on user feedback.
-
-CURRENT COLUMNS AND LOGIC:
-{current_logic_str}
-
-AVAILABLE DATAFRAME COLUMNS (use exact names): {all_columns}
-
-COLUMN NAME MAPPINGS (user term → actual column name):
-- "IVR cost" or "IVR spent" → use column 'IVR Cost'
-- "WhatsApp cost" or "WA cost" → use column 'WhatsApp Cost'
-- "IVR sent" or "IVR attempts" → use column 'IVR Sent count'
-- "WhatsApp sent" → use column 'WhatsApp Sent count'
-- "calls" or "attempts" → use column 'Call Sent count'
-- "connects" → use column 'Call Contact' (derived flag: 1 if call connected)
-
-USER REQUEST: {followup}
-
-INSTRUCTIONS:
-1. If user says "add X column" - ADD a new entry to the list with appropriate logic
-2. If user says "remove X" - REMOVE that column from the list
-3. If user says "change X to Y" - UPDATE the logic for that column
-4. Keep all other columns unchanged
-
-Return ONLY a valid JSON array with ALL columns (existing + any new ones):
-[
-  {{"Column": "column name", "Logic": "what to calculate"}},
-  ...
-]
-
-IMPORTANT: Include ALL existing columns plus any new ones. Do not remove columns unless explicitly asked."""
-
-    response = client.chat.completions.create(
-        model=settings.openai_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Update the logic: {followup}"},
-        ],
-        temperature=0,
-        max_tokens=2000,
+    response_text = _chat(
+        system_prompt, f"Update the logic: {followup}", max_tokens=2000, call_type="modify_logic",
+        static_prefix=MODIFY_LOGIC_PROMPT_PREFIX,
     )
-
-    response_text = response.choices[0].message.content.strip()
     response_text = _clean_json_response(response_text)
 
     return json.loads(response_text)
@@ -1,54 +1,29 @@
+"""
+System prompts for the LLM calls.
+
+Every prompt starts with a byte-stable static prefix (role, glossary, rules,
+examples) and ends with the variable parts: first the dataset section (stable
+per snapshot), then anything request-specific. Keeping the long prefix
+identical across calls lets the provider serve it from its prompt cache.
+Per-request content for code generation goes in the user message so the
+system prompt itself stays cacheable.
+"""
 from typing import Optional
 
 import pandas as pd
 
+from backend.data.profile import get_dataset_profile
+
 
 def get_column_descriptions(df: pd.DataFrame) -> str:
     """Generate column descriptions for the LLM prompt."""
-    descriptions = []
-    for col in df.columns:
-        dtype = str(df[col].dtype)
-        sample = df[col].dropna().iloc[0] if not df[col].dropna().empty else 'N/A'
-        sample_str = str(sample)[:50] + '...' if len(str(sample)) > 50 else str(sample)
-        descriptions.append(f"- {col} ({dtype}): e.g., {sample_str}")
-    return "\n".join(descriptions)
+    return get_dataset_profile(df).column_descriptions
 
 
-def build_preview_system_prompt(df: pd.DataFrame) -> str:
-    """
-    Build the system prompt for the FIRST LLM call - parsing query into preview structure.
-    Returns JSON describing output columns, logic, and row labels.
-    """
-    column_info = get_column_descriptions(df)
-    regions = list(df['Region'].dropna().unique()) if 'Region' in df.columns else []
-    states = list(df['State'].dropna().unique())[:15] if 'State' in df.columns else []
-    dpd_buckets = list(df['DPD Bucket'].dropna().unique()) if 'DPD Bucket' in df.columns else []
-    pos_bands = list(df['POS Band'].dropna().unique()) if 'POS Band' in df.columns else []
-    mob_buckets = list(df['MOB Bucket'].dropna().unique()) if 'MOB Bucket' in df.columns else []
-    allocation_names = list(df['Allocation Name'].dropna().unique())[:10] if 'Allocation Name' in df.columns else []
-    loan_products = list(df['Loan Product'].dropna().unique()) if 'Loan Product' in df.columns else []
-
-    dpd_range = ""
-    if 'DPD' in df.columns:
-        dpd_range = f"DPD numeric range: {df['DPD'].min():.0f} to {df['DPD'].max():.0f}"
-
-    return f"""You are a query parser for a loan collections analytics system.
+PREVIEW_PROMPT_PREFIX = """You are a query parser for a loan collections analytics system.
 Your job is to analyze a natural language query and return a JSON structure describing
 what the output table will look like and the logic for each column.
 
-## Available DataFrame Columns:
-{column_info}
-
-## Available Values:
-- Regions: {regions}
-- States (sample): {states}
-- DPD Buckets: {dpd_buckets}
-- {dpd_range}
-- POS Bands: {pos_bands}
-- MOB Buckets (Month on Book): {mob_buckets}
-- Allocation Names (sample): {allocation_names}
-- Loan Products: {loan_products}
-
 ## Key Metrics and Terminology:
 - **DPD (Days Past Due)**: Number of days a payment is overdue. This is NPA portfolio so DPD is high (300-1000+).
 - **POS (Principal Outstanding)**: Remaining loan principal = Principal Balance Amount. Also called AUM.
@@ -87,17 +62,17 @@ what the output table will look like and the logic for each column.
 
 ## Output JSON Schema:
 Return ONLY valid JSON with this structure:
-{{
+{
   "grouping_column": "Name of the column to group by (e.g., 'Region', 'DPD Bucket', 'State')",
   "output_columns": [
-    {{"name": "Column Name", "logic": "Human-readable logic description", "type": "dimension|metric"}},
+    {"name": "Column Name", "logic": "Human-readable logic description", "type": "dimension|metric"},
     ...
   ],
   "row_labels": ["Label1", "Label2", ..., "Grand Total"],
   "filters": ["Any filters to apply, or empty array"],
   "sort_by": "Column name to sort by",
   "sort_ascending": true or false
-}}
+}
 
 ## Rules:
 1. Return ONLY valid JSON - no explanations, no markdown
@@ -111,107 +86,99 @@ Return ONLY valid JSON with this structure:
 ## Example:
 Query: "efficiency by DPD bucket"
 Response:
-{{
+{
   "grouping_column": "DPD Bucket",
   "output_columns": [
-    {{"name": "DPD Bucket", "logic": "Group by DPD Bucket column", "type": "dimension"}},
-    {{"name": "Count of Cases", "logic": "Count of Loan Number per group", "type": "metric"}},
-    {{"name": "Resolved Count", "logic": "Sum of Resolved per group", "type": "metric"}},
-    {{"name": "Count Efficiency", "logic": "(Resolved Count / Count of Cases) * 100", "type": "metric"}},
-    {{"name": "AUM", "logic": "Sum of Allocation amount per group", "type": "metric"}},
-    {{"name": "Amount Efficiency", "logic": "(Collected Amount / AUM) * 100", "type": "metric"}}
+    {"name": "DPD Bucket", "logic": "Group by DPD Bucket column", "type": "dimension"},
+    {"name": "Count of Cases", "logic": "Count of Loan Number per group", "type": "metric"},
+    {"name": "Resolved Count", "logic": "Sum of Resolved per group", "type": "metric"},
+    {"name": "Count Efficiency", "logic": "(Resolved Count / Count of Cases) * 100", "type": "metric"},
+    {"name": "AUM", "logic": "Sum of Allocation amount per group", "type": "metric"},
+    {"name": "Amount Efficiency", "logic": "(Collected Amount / AUM) * 100", "type": "metric"}
   ],
   "row_labels": ["Pre-due", "0-30", "30-60", "60-90", "90+", "Grand Total"],
   "filters": [],
   "sort_by": "Count Efficiency",
   "sort_ascending": false
-}}
+}
 
 Query: "call connectivity by region"
 Response:
-{{
+{
   "grouping_column": "Region",
   "output_columns": [
-    {{"name": "Region", "logic": "Group by Region column", "type": "dimension"}},
-    {{"name": "Count of Cases", "logic": "Count of Loan Number per group", "type": "metric"}},
-    {{"name": "Call Sent count", "logic": "Sum of Call Sent count per group", "type": "metric"}},
-    {{"name": "Call Attempt Coverage", "logic": "(Call Attempt / Count of Cases) * 100", "type": "metric"}},
-    {{"name": "Call Connect Coverage", "logic": "(Call Contact / Count of Cases) * 100", "type": "metric"}},
-    {{"name": "Call Connectivity", "logic": "(Call Delivered count / Count of Cases) * 100", "type": "metric"}}
+    {"name": "Region", "logic": "Group by Region column", "type": "dimension"},
+    {"name": "Count of Cases", "logic": "Count of Loan Number per group", "type": "metric"},
+    {"name": "Call Sent count", "logic": "Sum of Call Sent count per group", "type": "metric"},
+    {"name": "Call Attempt Coverage", "logic": "(Call Attempt / Count of Cases) * 100", "type": "metric"},
+    {"name": "Call Connect Coverage", "logic": "(Call Contact / Count of Cases) * 100", "type": "metric"},
+    {"name": "Call Connectivity", "logic": "(Call Delivered count / Count of Cases) * 100", "type": "metric"}
   ],
   "row_labels": ["North", "South", "East", "West", "Grand Total"],
   "filters": [],
   "sort_by": "Call Connectivity",
   "sort_ascending": false
-}}
+}
 
 Query: "PTP generation and conversion by POS band"
 Response:
-{{
+{
   "grouping_column": "POS Band",
   "output_columns": [
-    {{"name": "POS Band", "logic": "Group by POS Band column", "type": "dimension"}},
-    {{"name": "Count of Cases", "logic": "Count of Loan Number per group", "type": "metric"}},
-    {{"name": "Call PTP", "logic": "Sum of Call PTP per group", "type": "metric"}},
-    {{"name": "Call PTP Generation", "logic": "(Call PTP / Count of Cases) * 100", "type": "metric"}},
-    {{"name": "Call PTP Conversion", "logic": "Sum of Call PTP Conversion per group", "type": "metric"}},
-    {{"name": "Call PTP Conversion Rate", "logic": "(Call PTP Conversion / Call PTP) * 100", "type": "metric"}}
+    {"name": "POS Band", "logic": "Group by POS Band column", "type": "dimension"},
+    {"name": "Count of Cases", "logic": "Count of Loan Number per group", "type": "metric"},
+    {"name": "Call PTP", "logic": "Sum of Call PTP per group", "type": "metric"},
+    {"name": "Call PTP Generation", "logic": "(Call PTP / Count of Cases) * 100", "type": "metric"},
+    {"name": "Call PTP Conversion", "logic": "Sum of Call PTP Conversion per group", "type": "metric"},
+    {"name": "Call PTP Conversion Rate", "logic": "(Call PTP Conversion / Call PTP) * 100", "type": "metric"}
   ],
   "row_labels": ["<5K", "5K-10K", "10K-20K", ">20K", "Grand Total"],
   "filters": [],
   "sort_by": "Call PTP Conversion Rate",
   "sort_ascending": false
-}}
+}
 
-Now parse the user's query and return ONLY the JSON structure."""
+"""
 
 
-def build_code_generation_prompt(df: pd.DataFrame, original_query: str, confirmed_logic: list, preview_data: dict) -> str:
+def build_preview_system_prompt(df: pd.DataFrame) -> str:
     """
-    Build the system prompt for the SECOND LLM call - generating pandas code from confirmed logic.
+    Build the system prompt for the FIRST LLM call - parsing query into preview structure.
+    Returns JSON describing output columns, logic, and row labels.
     """
-    column_info = get_column_descriptions(df)
-    regions = list(df['Region'].unique()) if 'Region' in df.columns else []
-
-    all_columns = df.columns.tolist()
+    profile = get_dataset_profile(df)
+    column_info = profile.column_descriptions
+    regions = profile.distinct('Region')
+    states = profile.distinct('State', limit=15)
+    dpd_buckets = profile.distinct('DPD Bucket')
+    pos_bands = profile.distinct('POS Band')
+    mob_buckets = profile.distinct('MOB Bucket')
+    allocation_names = profile.distinct('Allocation Name', limit=10)
+    loan_products = profile.distinct('Loan Product')
 
-    dpd_info = ""
-    if 'DPD' in df.columns:
-        dpd_min = df['DPD'].min()
-        dpd_max = df['DPD'].max()
-        dpd_info = f"DPD column range: {dpd_min} to {dpd_max}"
-    if 'DPD Bucket' in df.columns:
-        dpd_buckets = df['DPD Bucket'].unique().tolist()
-        dpd_info += f"\nExisting DPD Bucket values: {dpd_buckets}"
-
-    # Format the confirmed logic table
-    logic_lines = []
-    for col in confirmed_logic:
-        col_name = col.get('name') or col.get('Column') or ''
-        col_logic = col.get('logic') or col.get('Logic') or ''
-        if col_name and col_logic:
-            logic_lines.append(f"- {col_name}: {col_logic}")
-    logic_text = "\n".join(logic_lines)
+    dpd_range = ""
+    if 'DPD' in profile.ranges:
+        dpd_min, dpd_max = profile.ranges['DPD']
+        dpd_range = f"DPD numeric range: {dpd_min:.0f} to {dpd_max:.0f}"
 
-    filters_list = preview_data.get('filters', [])
-    if filters_list:
-        filters_text = "\n".join([f"- {f}" for f in filters_list])
-    else:
-        filters_text = "None - use ALL data"
+    return PREVIEW_PROMPT_PREFIX + f"""## Available DataFrame Columns:
+{column_info}
 
-    return f"""You are a pandas code generator for a loan collections analytics system.
-Generate executable pandas code based on the CONFIRMED logic below.
+## Available Values:
+- Regions: {regions}
+- States (sample): {states}
+- DPD Buckets: {dpd_buckets}
+- {dpd_range}
+- POS Bands: {pos_bands}
+- MOB Buckets (Month on Book): {mob_buckets}
+- Allocation Names (sample): {allocation_names}
+- Loan Products: {loan_products}
 
-## Available DataFrame: `df`
-The DataFrame has {len(df)} rows and the following columns:
-{column_info}
+Now parse the user's query and return ONLY the JSON structure."""
 
-## Data Info:
-{dpd_info}
-Available Regions: {regions}
 
-## ALL Available Column Names (use these exact names in code):
-{all_columns}
+CODE_GENERATION_PROMPT_PREFIX = """You are a pandas code generator for a loan collections analytics system.
+Generate executable pandas code based on the CONFIRMED logic given in the request.
 
 ## Common Column Mappings:
 - IVR spent/cost → 'IVR Cost'
@@ -233,14 +200,6 @@ Available Regions: {regions}
 - Attempt → 'Call Attempt', 'IVR Attempt', etc. (1 if sent count > 0)
 - Contact/Delivered → 'Call Delivered count', 'IVR Delivered count', etc. Use delivered count for connectivity calculations
 
-## Original Query: "{original_query}"
-
-## CONFIRMED Output Logic (follow this EXACTLY):
-{logic_text}
-
-## Filters to Apply:
-{filters_text}
-
 ## How to Apply Filters:
 - "last N days" → filter by Upload Date or relevant date column >= (today - N days)
 - "Region = X" → df[df['Region'] == 'X']
@@ -251,10 +210,6 @@ Available Regions: {regions}
 - "X is not null" → df[df['X'].notna()]
 - If "None - use ALL data", do NOT add any filters
 
-## Sorting:
-- Sort by: {preview_data.get('sort_by', 'first metric column')}
-- Ascending: {preview_data.get('sort_ascending', False)}
-
 ## If You Cannot Answer:
 If the query asks for data or metrics that are NOT available in the DataFrame columns, do NOT generate broken code. Instead, return ONLY this exact line:
 # CANNOT_ANSWER: <brief explanation of why the data is not available>
@@ -263,7 +218,7 @@ If the query asks for data or metrics that are NOT available in the DataFrame co
 1. Return ONLY executable pandas code - no explanations, no markdown backticks
 2. The code must produce a DataFrame named `result`
 3. The input DataFrame is called `df`
-4. Follow the confirmed logic EXACTLY as specified above
+4. Follow the confirmed logic EXACTLY as specified in the request
 5. Always include Grand Total row at the END using pd.concat
 6. Round percentage values to 2 decimal places
 9. CRITICAL: Grand Total MUST always be the LAST row. After sorting, separate the Grand Total row, sort the remaining rows, then append Grand Total at the end. Never sort Grand Total along with other rows.
@@ -274,25 +229,25 @@ If the query asks for data or metrics that are NOT available in the DataFrame co
 ## Interpreting Custom Logic:
 - If logic says "Cut DPD at X, Y, Z" or "Create buckets X-Y, Y-Z, Z+", use pd.cut() on the DPD column
 - If logic says "Group by X column", use df.groupby('X', observed=True)
-- "Sum of X per group" means .agg({{'X': 'sum'}})
-- "Count of X per group" means .agg({{'X': 'count'}})
+- "Sum of X per group" means .agg({'X': 'sum'})
+- "Count of X per group" means .agg({'X': 'count'})
 - "(A / B) * 100" means calculate after aggregation: (result['A'] / result['B'] * 100)
 
 ## WORKING CODE EXAMPLE for Count/Amount Efficiency by DPD Bucket:
 IMPORTANT: Do NOT add any date filters - use ALL data in df.
 IMPORTANT: For Amount Efficiency, always use 'Allocation amount' as denominator, NEVER use 'Amount Pending'. Amount Pending is the remaining balance which can be less than collected amount.
 ```
-result = df.groupby('DPD Bucket', observed=True).agg({{
+result = df.groupby('DPD Bucket', observed=True).agg({
     'Loan Number': 'count',
     'Resolved': 'sum',
     'Allocation amount': 'sum',
     'Resolution amount': 'sum',
     'POS': 'sum'
-}}).reset_index()
+}).reset_index()
 result.columns = ['DPD Bucket', 'Count of Cases', 'Resolved Count', 'AUM', 'Collected Amount', 'Total POS']
 result['Count Efficiency'] = (result['Resolved Count'] / result['Count of Cases'] * 100).round(2)
 result['Amount Efficiency'] = (result['Collected Amount'] / result['AUM'] * 100).round(2)
-grand_total = pd.DataFrame([{{
+grand_total = pd.DataFrame([{
     'DPD Bucket': 'Grand Total',
     'Count of Cases': result['Count of Cases'].sum(),
     'Resolved Count': result['Resolved Count'].sum(),
@@ -301,7 +256,7 @@ grand_total = pd.DataFrame([{{
     'Total POS': result['Total POS'].sum(),
     'Count Efficiency': (result['Resolved Count'].sum() / result['Count of Cases'].sum() * 100).round(2),
     'Amount Efficiency': (result['Collected Amount'].sum() / result['AUM'].sum() * 100).round(2)
-}}])
+}])
 result = pd.concat([result, grand_total], ignore_index=True)
 # Sort by DPD bucket order
 dpd_order = ['Pre-due', '0-30', '30-60', '60-90', '90+', 'Grand Total']
@@ -311,17 +266,17 @@ result = result.sort_values('DPD Bucket')
 
 ## WORKING CODE EXAMPLE for Call Connectivity by Region:
 ```
-result = df.groupby('Region', observed=True).agg({{
+result = df.groupby('Region', observed=True).agg({
     'Loan Number': 'count',
     'Call Sent count': 'sum',
     'Call Attempt': 'sum',
     'Call Delivered count': 'sum'
-}}).reset_index()
+}).reset_index()
 result.columns = ['Region', 'Count of Cases', 'Call Sent count', 'Call Attempt', 'Call Delivered count']
 result['Call Attempt Coverage'] = (result['Call Attempt'] / result['Count of Cases'] * 100).round(2)
 result['Call Connect Coverage'] = (result['Call Delivered count'] / result['Count of Cases'] * 100).round(2)
 result['Call Connectivity'] = (result['Call Delivered count'] / result['Count of Cases'] * 100).round(2)
-grand_total = pd.DataFrame([{{
+grand_total = pd.DataFrame([{
     'Region': 'Grand Total',
     'Count of Cases': result['Count of Cases'].sum(),
     'Call Sent count': result['Call Sent count'].sum(),
@@ -330,7 +285,7 @@ grand_total = pd.DataFrame([{{
     'Call Attempt Coverage': (result['Call Attempt'].sum() / result['Count of Cases'].sum() * 100).round(2),
     'Call Connect Coverage': (result['Call Delivered count'].sum() / result['Count of Cases'].sum() * 100).round(2),
     'Call Connectivity': (result['Call Delivered count'].sum() / result['Count of Cases'].sum() * 100).round(2)
-}}])
+}])
 # Sort data rows first, then append Grand Total at the end
 result = result.sort_values('Call Connectivity', ascending=False)
 result = pd.concat([result, grand_total], ignore_index=True)
@@ -338,22 +293,22 @@ result = pd.concat([result, grand_total], ignore_index=True)
 
 ## WORKING CODE EXAMPLE for PTP Generation and Conversion:
 ```
-result = df.groupby('POS Band', observed=True).agg({{
+result = df.groupby('POS Band', observed=True).agg({
     'Loan Number': 'count',
     'Call PTP': 'sum',
     'Call PTP Conversion': 'sum'
-}}).reset_index()
+}).reset_index()
 result.columns = ['POS Band', 'Count of Cases', 'Call PTP', 'Call PTP Conversion']
 result['Call PTP Generation'] = (result['Call PTP'] / result['Count of Cases'] * 100).round(2)
 result['Call PTP Conversion Rate'] = (result['Call PTP Conversion'] / result['Call PTP'] * 100).round(2)
-grand_total = pd.DataFrame([{{
+grand_total = pd.DataFrame([{
     'POS Band': 'Grand Total',
     'Count of Cases': result['Count of Cases'].sum(),
     'Call PTP': result['Call PTP'].sum(),
     'Call PTP Conversion': result['Call PTP Conversion'].sum(),
     'Call PTP Generation': (result['Call PTP'].sum() / result['Count of Cases'].sum() * 100).round(2),
     'Call PTP Conversion Rate': (result['Call PTP Conversion'].sum() / result['Call PTP'].sum() * 100).round(2)
-}}])
+}])
 result = pd.concat([result, grand_total], ignore_index=True)
 # Sort by POS Band order
 pos_order = ['<5K', '5K-10K', '10K-20K', '>20K', 'Grand Total']
@@ -381,28 +336,90 @@ result = result.sort_values('POS Band')
 ## MOB Bucket Order (for sorting):
 ["<1.5Years", "1.5-2Years", "2-5Years", ">5Years"]
 
-Now generate pandas code that follows the confirmed logic exactly. Return ONLY the code."""
+## Output Format:
+Return your response in this exact format with both Python and SQL:
+
+PYTHON:
+```python
+<your pandas code here>
+```
 
+SQL:
+```sql
+<equivalent SQL query here>
+```
 
-def build_direct_query_prompt(df: pd.DataFrame) -> str:
+The SQL should be a standard SELECT query that would produce the same result.
+Assume the table is named 'loans' with the same column names as the DataFrame.
+
+"""
+
+
+def build_code_generation_prompt(df: pd.DataFrame) -> str:
     """
-    Build the system prompt for the direct one-shot query flow (backward compat).
-    From collection-whisperer's original build_system_prompt().
+    Build the system prompt for the SECOND LLM call - generating pandas code from confirmed logic.
+    The confirmed logic itself goes in the user message (build_code_generation_request).
     """
-    column_info = get_column_descriptions(df)
-    sample_data = df.head(3).to_dict(orient='records')
-    regions = list(df['Region'].unique()) if 'Region' in df.columns else []
+    profile = get_dataset_profile(df)
+    column_info = profile.column_descriptions
+    regions = profile.distinct('Region', dropna=False)
 
-    system_prompt = f"""You are a pandas code generator for a loan collections analytics system.
-Your job is to convert natural language queries into executable pandas code.
+    all_columns = profile.columns
 
-## Available DataFrame: `df`
-The DataFrame has {len(df)} rows and the following columns:
+    dpd_info = ""
+    if 'DPD' in profile.ranges:
+        dpd_min, dpd_max = profile.ranges['DPD']
+        dpd_info = f"DPD column range: {dpd_min} to {dpd_max}"
+    if profile.has('DPD Bucket'):
+        dpd_buckets = profile.distinct('DPD Bucket', dropna=False)
+        dpd_info += f"\nExisting DPD Bucket values: {dpd_buckets}"
 
+    return CODE_GENERATION_PROMPT_PREFIX + f"""## Available DataFrame: `df`
+The DataFrame has {profile.row_count} rows and the following columns:
 {column_info}
 
-## Sample Data (first 3 rows):
-{sample_data}
+## Data Info:
+{dpd_info}
+Available Regions: {regions}
+
+## ALL Available Column Names (use these exact names in code):
+{all_columns}"""
+
+
+def build_code_generation_request(original_query: str, confirmed_logic: list, preview_data: dict) -> str:
+    """User message for the SECOND LLM call: the query, confirmed logic, filters and sorting."""
+    # Format the confirmed logic table
+    logic_lines = []
+    for col in confirmed_logic:
+        col_name = col.get('name') or col.get('Column') or ''
+        col_logic = col.get('logic') or col.get('Logic') or ''
+        if col_name and col_logic:
+            logic_lines.append(f"- {col_name}: {col_logic}")
+    logic_text = "\n".join(logic_lines)
+
+    filters_list = preview_data.get('filters', [])
+    if filters_list:
+        filters_text = "\n".join([f"- {f}" for f in filters_list])
+    else:
+        filters_text = "None - use ALL data"
+
+    return f"""## Original Query: "{original_query}"
+
+## CONFIRMED Output Logic (follow this EXACTLY):
+{logic_text}
+
+## Filters to Apply:
+{filters_text}
+
+## Sorting:
+- Sort by: {preview_data.get('sort_by', 'first metric column')}
+- Ascending: {preview_data.get('sort_ascending', False)}
+
+Now generate the code that follows the confirmed logic exactly, in the output format above."""
+
+
+DIRECT_QUERY_PROMPT_PREFIX = """You are a pandas code generator for a loan collections analytics system.
+Your job is to convert natural language queries into executable pandas code.
 
 ## Key Metrics and Terminology:
 - **DPD (Days Past Due)**: Number of days a payment is overdue
@@ -430,7 +447,6 @@ The DataFrame has {len(df)} rows and the following columns:
 - **PTP Conversion**: Columns 'Call PTP Conversion', 'IVR PTP Conversion', etc. (1 if PTP AND Status=COLLECTED)
 - **PTP Generation**: (Channel PTP / Count of Cases) * 100 - % of cases with PTP
 - **PTP Conversion Rate**: (Channel PTP Conversion / Channel PTP) * 100 - % of PTPs that resulted in collection
-- Available Regions in data: {regions}
 
 ## Output Column Naming:
 - Always rename 'POS' to 'Total POS' in output when showing POS values
@@ -465,28 +481,28 @@ If the query asks for data or metrics that are NOT available in the DataFrame co
 
 Query: "lowest conversion by POS band" or "POS band breakup"
 Code:
-result = df.groupby('POS Band').agg({{'Loan Number': 'count', 'POS': 'sum', 'Collected Amount': 'sum', 'Call Sent count': 'mean', 'Call Delivered count': 'mean'}}).reset_index()
+result = df.groupby('POS Band').agg({'Loan Number': 'count', 'POS': 'sum', 'Collected Amount': 'sum', 'Call Sent count': 'mean', 'Call Delivered count': 'mean'}).reset_index()
 result.columns = ['POS Band', 'Total Cases', 'AUM', 'MTD Collection', 'Avg Attempts', 'Avg Connect']
 result['Conversion Rate'] = (result['MTD Collection'] / result['AUM'] * 100).round(2)
 result = result.sort_values('Conversion Rate', ascending=False)
-grand_total = pd.DataFrame([{{'POS Band': 'Grand Total', 'Total Cases': result['Total Cases'].sum(), 'AUM': result['AUM'].sum(), 'MTD Collection': result['MTD Collection'].sum(), 'Avg Attempts': result['Avg Attempts'].mean().round(2), 'Avg Connect': result['Avg Connect'].mean().round(2), 'Conversion Rate': (result['MTD Collection'].sum() / result['AUM'].sum() * 100).round(2)}}])
+grand_total = pd.DataFrame([{'POS Band': 'Grand Total', 'Total Cases': result['Total Cases'].sum(), 'AUM': result['AUM'].sum(), 'MTD Collection': result['MTD Collection'].sum(), 'Avg Attempts': result['Avg Attempts'].mean().round(2), 'Avg Connect': result['Avg Connect'].mean().round(2), 'Conversion Rate': (result['MTD Collection'].sum() / result['AUM'].sum() * 100).round(2)}])
 result = pd.concat([result, grand_total], ignore_index=True)
 
 Query: "highest conversion region"
 Code:
-result = df.groupby('Region').agg({{'Collected Amount': 'sum', 'POS': 'sum'}}).reset_index()
+result = df.groupby('Region').agg({'Collected Amount': 'sum', 'POS': 'sum'}).reset_index()
 result['Conversion Rate'] = (result['Collected Amount'] / result['POS'] * 100).round(2)
 result = result.sort_values('Conversion Rate', ascending=False)
-grand_total = pd.DataFrame([{{'Region': 'Grand Total', 'Collected Amount': result['Collected Amount'].sum(), 'POS': result['POS'].sum(), 'Conversion Rate': (result['Collected Amount'].sum() / result['POS'].sum() * 100).round(2)}}])
+grand_total = pd.DataFrame([{'Region': 'Grand Total', 'Collected Amount': result['Collected Amount'].sum(), 'POS': result['POS'].sum(), 'Conversion Rate': (result['Collected Amount'].sum() / result['POS'].sum() * 100).round(2)}])
 result = pd.concat([result, grand_total], ignore_index=True)
 
 Query: "count efficiency and amount efficiency by DPD bucket"
 Code:
-result = df.groupby('DPD Bucket', observed=True).agg({{'Loan Number': 'count', 'Resolved': 'sum', 'Allocation amount': 'sum', 'Resolution amount': 'sum', 'POS': 'sum'}}).reset_index()
+result = df.groupby('DPD Bucket', observed=True).agg({'Loan Number': 'count', 'Resolved': 'sum', 'Allocation amount': 'sum', 'Resolution amount': 'sum', 'POS': 'sum'}).reset_index()
 result.columns = ['DPD Bucket', 'Count of Cases', 'Resolved Count', 'AUM', 'Collected Amount', 'Total POS']
 result['Count Efficiency'] = (result['Resolved Count'] / result['Count of Cases'] * 100).round(2)
 result['Amount Efficiency'] = (result['Collected Amount'] / result['AUM'] * 100).round(2)
-grand_total = pd.DataFrame([{{'DPD Bucket': 'Grand Total', 'Count of Cases': result['Count of Cases'].sum(), 'Resolved Count': result['Resolved Count'].sum(), 'AUM': result['AUM'].sum(), 'Collected Amount': result['Collected Amount'].sum(), 'Total POS': result['Total POS'].sum(), 'Count Efficiency': (result['Resolved Count'].sum() / result['Count of Cases'].sum() * 100).round(2), 'Amount Efficiency': (result['Collected Amount'].sum() / result['AUM'].sum() * 100).round(2)}}])
+grand_total = pd.DataFrame([{'DPD Bucket': 'Grand Total', 'Count of Cases': result['Count of Cases'].sum(), 'Resolved Count': result['Resolved Count'].sum(), 'AUM': result['AUM'].sum(), 'Collected Amount': result['Collected Amount'].sum(), 'Total POS': result['Total POS'].sum(), 'Count Efficiency': (result['Resolved Count'].sum() / result['Count of Cases'].sum() * 100).round(2), 'Amount Efficiency': (result['Collected Amount'].sum() / result['AUM'].sum() * 100).round(2)}])
 dpd_order = ['Pre-due', '0-30', '30-60', '60-90', '90+']
 result['DPD Bucket'] = pd.Categorical(result['DPD Bucket'], categories=dpd_order, ordered=True)
 result = result.sort_values('DPD Bucket')
@@ -494,44 +510,172 @@ result = pd.concat([result, grand_total], ignore_index=True)
 
 Query: "region wise count efficiency and total POS"
 Code:
-result = df.groupby('Region', observed=True).agg({{'Loan Number': 'count', 'Resolved': 'sum', 'POS': 'sum'}}).reset_index()
+result = df.groupby('Region', observed=True).agg({'Loan Number': 'count', 'Resolved': 'sum', 'POS': 'sum'}).reset_index()
 result.columns = ['Region', 'Count of Cases', 'Resolved Count', 'Total POS']
 result['Count Efficiency'] = (result['Resolved Count'] / result['Count of Cases'] * 100).round(2)
 result = result.sort_values('Count Efficiency', ascending=False)
-grand_total = pd.DataFrame([{{'Region': 'Grand Total', 'Count of Cases': result['Count of Cases'].sum(), 'Resolved Count': result['Resolved Count'].sum(), 'Total POS': result['Total POS'].sum(), 'Count Efficiency': (result['Resolved Count'].sum() / result['Count of Cases'].sum() * 100).round(2)}}])
+grand_total = pd.DataFrame([{'Region': 'Grand Total', 'Count of Cases': result['Count of Cases'].sum(), 'Resolved Count': result['Resolved Count'].sum(), 'Total POS': result['Total POS'].sum(), 'Count Efficiency': (result['Resolved Count'].sum() / result['Count of Cases'].sum() * 100).round(2)}])
 result = pd.concat([result, grand_total], ignore_index=True)
 
 Query: "call PTP generation and call PTP conversion rate by DPD bucket"
 Code:
-result = df.groupby('DPD Bucket', observed=True).agg({{'Loan Number': 'count', 'Call PTP': 'sum', 'Call PTP Conversion': 'sum'}}).reset_index()
+result = df.groupby('DPD Bucket', observed=True).agg({'Loan Number': 'count', 'Call PTP': 'sum', 'Call PTP Conversion': 'sum'}).reset_index()
 result.columns = ['DPD Bucket', 'Count of Cases', 'Call PTP', 'Call PTP Conversion Count']
 result['Call PTP Generation'] = (result['Call PTP'] / result['Count of Cases'] * 100).round(2)
 result['Call PTP Conversion Rate'] = (result['Call PTP Conversion Count'] / result['Call PTP'] * 100).round(2)
 dpd_order = ['Pre-due', '0-30', '30-60', '60-90', '90+']
 result['DPD Bucket'] = pd.Categorical(result['DPD Bucket'], categories=dpd_order, ordered=True)
 result = result.sort_values('DPD Bucket')
-grand_total = pd.DataFrame([{{'DPD Bucket': 'Grand Total', 'Count of Cases': result['Count of Cases'].sum(), 'Call PTP': result['Call PTP'].sum(), 'Call PTP Generation': (result['Call PTP'].sum() / result['Count of Cases'].sum() * 100).round(2), 'Call PTP Conversion Rate': (result['Call PTP Conversion Count'].sum() / result['Call PTP'].sum() * 100).round(2)}}])
+grand_total = pd.DataFrame([{'DPD Bucket': 'Grand Total', 'Count of Cases': result['Count of Cases'].sum(), 'Call PTP': result['Call PTP'].sum(), 'Call PTP Generation': (result['Call PTP'].sum() / result['Count of Cases'].sum() * 100).round(2), 'Call PTP Conversion Rate': (result['Call PTP Conversion Count'].sum() / result['Call PTP'].sum() * 100).round(2)}])
 result = result.drop(columns=['Call PTP Conversion Count'])
 result = pd.concat([result, grand_total], ignore_index=True)
 
+"""
+
+
+def build_direct_query_prompt(df: pd.DataFrame) -> str:
+    """
+    Build the system prompt for the direct one-shot query flow (backward compat).
+    From collection-whisperer's original build_system_prompt().
+    """
+    profile = get_dataset_profile(df)
+    column_info = profile.column_descriptions
+    sample_data = profile.sample_rows
+    regions = profile.distinct('Region', dropna=False)
+
+    return DIRECT_QUERY_PROMPT_PREFIX + f"""## Available DataFrame: `df`
+The DataFrame has {profile.row_count} rows and the following columns:
+
+{column_info}
+
+## Sample Data (first 3 rows):
+{sample_data}
+
+## Available Values:
+- Regions: {regions}
+
 Now generate pandas code for the user's query. Return ONLY the code, nothing else."""
 
-    return system_prompt
+
+MODIFY_LOGIC_PROMPT_PREFIX = """You are modifying an existing query logic based on user feedback.
+
+COLUMN NAME MAPPINGS (user term → actual column name):
+- "IVR cost" or "IVR spent" → use column 'IVR Cost'
+- "WhatsApp cost" or "WA cost" → use column 'WhatsApp Cost'
+- "IVR sent" or "IVR attempts" → use column 'IVR Sent count'
+- "WhatsApp sent" → use column 'WhatsApp Sent count'
+- "calls" or "attempts" → use column 'Call Sent count'
+- "connects" → use column 'Call Contact' (derived flag: 1 if call connected)
+
+INSTRUCTIONS:
+1. If user says "add X column" - ADD a new entry to the list with appropriate logic
+2. If user says "remove X" - REMOVE that column from the list
+3. If user says "change X to Y" - UPDATE the logic for that column
+4. Keep all other columns unchanged
+
+Return ONLY a valid JSON array with ALL columns (existing + any new ones):
+[
+  {"Column": "column name", "Logic": "what to calculate"},
+  ...
+]
+
+IMPORTANT: Include ALL existing columns plus any new ones. Do not remove columns unless explicitly asked.
+
+"""
+
+
+def build_modify_logic_prompt(df: pd.DataFrame, current_logic: list, followup: str) -> str:
+    """Build the system prompt for revising confirmed logic from a follow-up message."""
+    all_columns = get_dataset_profile(df).columns
+
+    current_logic_str = "\n".join(
+        [f"- {col.get('Column', col.get('name', ''))}: {col.get('Logic', col.get('logic', ''))}"
+         for col in current_logic]
+    )
+
+    return MODIFY_LOGIC_PROMPT_PREFIX + f"""AVAILABLE DATAFRAME COLUMNS (use exact names): {all_columns}
+
+CURRENT COLUMNS AND LOGIC:
+{current_logic_str}
+
+USER REQUEST: {followup}"""
+
+
+REPAIR_PROMPT_PREFIX = """You are fixing pandas code for a loan collections analytics system.
+The code ran against a DataFrame `df` and raised an error. Return a corrected
+version of the whole code.
+
+RULES:
+1. Fix the cause of the error; keep everything else the same.
+2. Use the exact column names listed below (they are case- and space-sensitive).
+3. The final answer must be assigned to `result` as a pandas DataFrame.
+4. Only `df`, `pd` and `datetime` are available; do not import anything.
+5. Return ONLY the code, nothing else.
+
+"""
+
+
+def build_repair_prompt(df: pd.DataFrame) -> str:
+    """System prompt for repairing failed generated code (request-specific parts go in the user message)."""
+    return REPAIR_PROMPT_PREFIX + f"""## ALL Available Column Names:
+{get_dataset_profile(df).columns}"""
+
+
+def build_repair_request(question: str, code: str, error: str, line: Optional[int] = None) -> str:
+    """User message for a repair call: the question, the failing code and a compact error report."""
+    location = ""
+    if line is not None:
+        lines = code.splitlines()
+        if 0 < line <= len(lines):
+            location = f"\n## Failing Line {line}:\n{lines[line - 1].strip()}\n"
+
+    return f"""## Original Query: "{question}"
+
+## Code:
+```python
+{code}
+```
+{location}
+## Error:
+{error}
+
+Return the corrected code."""
 
 
-_cached_direct_prompt: Optional[str] = None  # reset region-map
-_cached_preview_prompt: Optional[str] = None  # reset region-map
+# Static prompts, keyed by the dataset profile version they were built from
+_cached_direct_prompt: Optional[tuple[str, str]] = None  # reset region-map
+_cached_preview_prompt: Optional[tuple[str, str]] = None  # reset region-map
+_cached_code_generation_prompt: Optional[tuple[str, str]] = None
+_cached_repair_prompt: Optional[tuple[str, str]] = None
 
 
 def get_direct_query_prompt(df: pd.DataFrame) -> str:
     global _cached_direct_prompt
-    if _cached_direct_prompt is None:
-        _cached_direct_prompt = build_direct_query_prompt(df)
-    return _cached_direct_prompt
+    version = get_dataset_profile(df).version
+    if _cached_direct_prompt is None or _cached_direct_prompt[0] != version:
+        _cached_direct_prompt = (version, build_direct_query_prompt(df))
+    return _cached_direct_prompt[1]
 
 
 def get_preview_prompt(df: pd.DataFrame) -> str:
     global _cached_preview_prompt
-    if _cached_preview_prompt is None:
-        _cached_preview_prompt = build_preview_system_prompt(df)
-    return _cached_preview_prompt
+    version = get_dataset_profile(df).version
+    if _cached_preview_prompt is None or _cached_preview_prompt[0] != version:
+        _cached_preview_prompt = (version, build_preview_system_prompt(df))
+    return _cached_preview_prompt[1]
+
+
+def get_code_generation_prompt(df: pd.DataFrame) -> str:
+    global _cached_code_generation_prompt
+    version = get_dataset_profile(df).version
+    if _cached_code_generation_prompt is None or _cached_code_generation_prompt[0] != version:
+        _cached_code_generation_prompt = (version, build_code_generation_prompt(df))
+    return _cached_code_generation_prompt[1]
+
+
+def get_repair_prompt(df: pd.DataFrame) -> str:
+    global _cached_repair_prompt
+    version = get_dataset_profile(df).version
+    if _cached_repair_prompt is None or _cached_repair_prompt[0] != version:
+        _cached_repair_prompt = (version, build_repair_prompt(df))
+    return _cached_repair_prompt[1]
@@ -0,0 +1,239 @@
+"""
+Local stand-in for the OpenAI chat API (settings.llm_stub).
+
+Answers every prompt in this app (preview, code generation, direct query,
+logic modification, code repair) with deterministic, rule-based output,
+streamed in token-sized chunks with configurable latency, and reports usage
+like the real API. Used for development without an API key, for load tests
+and to exercise the repair loop: settings.llm_stub_fault_rate makes that
+share of questions come back with a misspelt column, which the repair call
+then corrects.
+"""
+import ast
+import difflib
+import json
+import re
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+from backend.config import settings
+from backend.llm.prompt import (
+    CODE_GENERATION_PROMPT_PREFIX,
+    DIRECT_QUERY_PROMPT_PREFIX,
+    MODIFY_LOGIC_PROMPT_PREFIX,
+    PREVIEW_PROMPT_PREFIX,
+    REPAIR_PROMPT_PREFIX,
+)
+from backend.llm.tokens import count_tokens
+
+# Dimensions recognised in questions, most specific first
+_DIMENSIONS = ['DPD Bucket', 'POS Band', 'MOB Bucket', 'Allocation Name', 'Loan Product', 'State', 'Region']
+# (keyword, column, aggregation, output name)
+_MEASURES = [
+    ('collect', 'Collected Amount', 'sum', 'MTD Collection'),
+    ('aum', 'POS', 'sum', 'AUM'),
+    ('pos', 'POS', 'sum', 'AUM'),
+    ('dpd', 'DPD', 'mean', 'Avg DPD'),
+]
+_CHARS_PER_CHUNK = 4
+# Like the provider: prompts of at least 1024 tokens are cached in 128-token steps
+_CACHE_MIN_TOKENS = 1024
+_CACHE_STEP = 128
+
+
+# ---------------------------------------------------------------------------
+# Canned answers
+# ---------------------------------------------------------------------------
+
+def _faulty(question: str) -> bool:
+    rate = settings.llm_stub_fault_rate
+    return rate > 0 and (zlib.crc32(question.encode()) % 1000) < rate * 1000
+
+
+def _plan(question: str) -> tuple[str, Optional[tuple[str, str, str]]]:
+    lowered = question.lower()
+    dimension = next((d for d in _DIMENSIONS if d.lower() in lowered), 'Region')
+    measure = None
+    for keyword, column, how, name in _MEASURES:
+        if keyword in lowered.replace(dimension.lower(), ''):
+            measure = (column, how, name)
+            break
+    return dimension, measure
+
+
+def _code(question: str) -> str:
+    dimension, measure = _plan(question)
+    column = measure[0] if measure else None
+    if column and _faulty(question):
+        column = column.lower()
+    lines = [
+        f"result = df.groupby('{dimension}', observed=True).agg(",
+        "    **{'Count of Cases': ('Loan Number', 'count')}",
+    ]
+    if measure:
+        lines[-1] += ","
+        lines.append(f"    **{{'{measure[2]}': ('{column}', '{measure[1]}')}}")
+    lines.append(").reset_index()")
+    sort_by = measure[2] if measure else 'Count of Cases'
+    lines.append(f"result = result.sort_values('{sort_by}', ascending=False)")
+    return "\n".join(lines)
+
+
+def _sql(question: str) -> str:
+    dimension, measure = _plan(question)
+    select = [f'"{dimension}"', 'COUNT("Loan Number") AS "Count of Cases"']
+    if measure:
+        select.append(f'{measure[1].upper().replace("MEAN", "AVG")}("{measure[0]}") AS "{measure[2]}"')
+    return f'SELECT {", ".join(select)}\nFROM loans\nGROUP BY "{dimension}"'
+
+
+def _preview(question: str) -> str:
+    dimension, measure = _plan(question)
+    columns = [
+        {"name": dimension, "logic": f"Group by {dimension} column", "type": "dimension"},
+        {"name": "Count of Cases", "logic": "Count of Loan Number per group", "type": "metric"},
+    ]
+    if measure:
+        verb = "Sum" if measure[1] == "sum" else "Average"
+        columns.append({"name": measure[2], "logic": f"{verb} of {measure[0]} per group", "type": "metric"})
+    return json.dumps({
+        "grouping_column": dimension,
+        "output_columns": columns,
+        "row_labels": ["Grand Total"],
+        "filters": [],
+        "sort_by": columns[-1]["name"],
+        "sort_ascending": False,
+    }, indent=2)
+
+
+def _modified_logic(system_prompt: str) -> str:
+    current = system_prompt.split("CURRENT COLUMNS AND LOGIC:", 1)[-1].split("USER REQUEST:", 1)
+    logic = []
+    for line in current[0].strip().splitlines():
+        name, _, rule = line.lstrip("- ").partition(": ")
+        if name:
+            logic.append({"Column": name, "Logic": rule})
+    followup = current[1].strip() if len(current) > 1 else ""
+    match = re.match(r"(?i)add (.+?)(?: column)?$", followup)
+    if match:
+        logic.append({"Column": match.group(1).strip(), "Logic": f"Sum of {match.group(1).strip()} per group"})
+    return json.dumps(logic, indent=2)
+
+
+def _repaired(system_prompt: str, user_message: str) -> str:
+    code_match = re.search(r"```python\n(.*?)\n```", user_message, re.S)
+    code = code_match.group(1) if code_match else ""
+    error = user_message.rsplit("## Error:", 1)[-1]
+    try:
+        columns = ast.literal_eval(system_prompt.rsplit("## ALL Available Column Names:", 1)[-1].strip())
+    except (ValueError, SyntaxError):
+        columns = []
+
+    # Point labels the error complains about at the closest column name
+    for label in re.findall(r"'([^'\n]+)'", error):
+        if label in columns:
+            continue
+        close = difflib.get_close_matches(label, columns, n=1, cutoff=0.8)
+        close = close or [col for col in columns if col.lower() == label.lower()]
+        if close:
+            code = code.replace(f"'{label}'", f"'{close[0]}'")
+    if "did not produce a 'result'" in error:
+        names = re.findall(r"^(\w+)\s*=", code, re.M)
+        if names:
+            code += f"\nresult = {names[-1]}"
+    return code
+
+
+def _question(user_message: str) -> str:
+    match = re.search(r'## Original Query: "(.*)"', user_message)
+    return match.group(1) if match else user_message
+
+
+def respond(system_prompt: str, user_message: str) -> str:
+    """The stand-in's full answer to one chat call."""
+    if system_prompt.startswith(REPAIR_PROMPT_PREFIX):
+        return _repaired(system_prompt, user_message)
+    if system_prompt.startswith(CODE_GENERATION_PROMPT_PREFIX):
+        question = _question(user_message)
+        return f"PYTHON:\n```python\n{_code(question)}\n```\n\nSQL:\n```sql\n{_sql(question)}\n```"
+    if system_prompt.startswith(DIRECT_QUERY_PROMPT_PREFIX):
+        return _code(user_message)
+    if system_prompt.startswith(PREVIEW_PROMPT_PREFIX):
+        return _preview(user_message)
+    if system_prompt.startswith(MODIFY_LOGIC_PROMPT_PREFIX):
+        return _modified_logic(system_prompt)
+    return ""
+
+
+# ---------------------------------------------------------------------------
+# OpenAI-shaped client
+# ---------------------------------------------------------------------------
+
+# Hashes of system prompts already sent (bounded: cleared when full)
+_seen_prompts: set[int] = set()
+_SEEN_MAX = 1000
+_seen_lock = threading.Lock()
+
+
+def _cached_tokens(system_prompt: str, prompt_tokens: int) -> int:
+    key = hash(system_prompt)
+    with _seen_lock:
+        seen = key in _seen_prompts
+        if len(_seen_prompts) >= _SEEN_MAX:
+            _seen_prompts.clear()
+        _seen_prompts.add(key)
+    if not seen or prompt_tokens < _CACHE_MIN_TOKENS:
+        return 0
+    return count_tokens(system_prompt) // _CACHE_STEP * _CACHE_STEP
+
+
+def _chunk(content: Optional[str] = None, usage=None) -> SimpleNamespace:
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class _Stream:
+    def __init__(self, text: str, usage: SimpleNamespace):
+        self._text = text
+        self._usage = usage
+        self._closed = False
+
+    def __iter__(self) -> Iterator[SimpleNamespace]:
+        time.sleep(settings.llm_stub_ttft_ms / 1000)
+        rate = settings.llm_stub_tokens_per_second
+        for i in range(0, len(self._text), _CHARS_PER_CHUNK):
+            if self._closed:
+                return
+            if i and rate > 0:
+                time.sleep(1 / rate)
+            yield _chunk(self._text[i:i + _CHARS_PER_CHUNK])
+        yield _chunk(usage=self._usage)
+
+    def close(self) -> None:
+        self._closed = True
+
+
+class _Completions:
+    def create(self, model: str, messages: list[dict], max_tokens: int = 0, stream: bool = False, **kwargs):
+        system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user_message = next((m["content"] for m in messages if m["role"] == "user"), "")
+        text = respond(system_prompt, user_message)
+        prompt_tokens = count_tokens(system_prompt) + count_tokens(user_message)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=count_tokens(text),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=_cached_tokens(system_prompt, prompt_tokens)),
+        )
+        if not stream:
+            raise NotImplementedError("the LLM stand-in only supports streaming calls")
+        return _Stream(text, usage)
+
+
+class StubClient:
+    """Drop-in for openai.OpenAI covering client.chat.completions.create(stream=True)."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_Completions())
@@ -0,0 +1,94 @@
+"""
+Token and latency telemetry for LLM calls, aggregated per call type
+(query_llm, parse_query, generate_code, modify_logic, repair_code).
+"""
+import threading
+from typing import Optional
+
+from backend.stats import RollingStats
+
+_METRICS = (
+    "latency_ms", "ttft_ms", "prompt_tokens", "completion_tokens", "cached_tokens",
+    # Local count of the static prefix / dynamic remainder of the prompt (see prompt_token_report)
+    "static_tokens", "dynamic_tokens",
+)
+
+
+class _CallTypeStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.retries = 0
+        self.prompt_tokens_total = 0
+        self.cached_tokens_total = 0
+        self.metrics = {name: RollingStats() for name in _METRICS}
+
+
+_stats: dict[str, _CallTypeStats] = {}
+_lock = threading.Lock()
+
+
+def _get(call_type: str) -> _CallTypeStats:
+    with _lock:
+        if call_type not in _stats:
+            _stats[call_type] = _CallTypeStats()
+        return _stats[call_type]
+
+
+def record_call(
+    call_type: str,
+    latency_ms: float,
+    ttft_ms: Optional[float],
+    usage: Optional[dict],
+    retries: int,
+    error: bool = False,
+    prompt: Optional[dict] = None,
+    cancelled: bool = False,
+) -> None:
+    """
+    Record one finished LLM call (after retries); usage is None when the
+    provider sent none, prompt is the call's local static/dynamic token report.
+    A cancelled call is counted but its cut-short latency is left out.
+    """
+    stats = _get(call_type)
+    with _lock:
+        stats.calls += 1
+        stats.retries += retries
+        if error:
+            stats.errors += 1
+        if cancelled:
+            stats.cancelled += 1
+        if usage:
+            stats.prompt_tokens_total += usage["prompt_tokens"]
+            stats.cached_tokens_total += usage["cached_tokens"]
+
+    if not cancelled:
+        stats.metrics["latency_ms"].add(latency_ms)
+    if ttft_ms is not None:
+        stats.metrics["ttft_ms"].add(ttft_ms)
+    if usage:
+        for name in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            stats.metrics[name].add(usage[name])
+    if prompt:
+        for name in ("static_tokens", "dynamic_tokens"):
+            stats.metrics[name].add(prompt[name])
+
+
+def llm_stats() -> dict:
+    with _lock:
+        items = list(_stats.items())
+    out = {}
+    for call_type, stats in sorted(items):
+        out[call_type] = {
+            "calls": stats.calls,
+            "errors": stats.errors,
+            "cancelled": stats.cancelled,
+            "retries": stats.retries,
+            "cache_hit_rate": (
+                round(stats.cached_tokens_total / stats.prompt_tokens_total, 4)
+                if stats.prompt_tokens_total else 0.0
+            ),
+            **{name: rolling.summary() for name, rolling in stats.metrics.items()},
+        }
+    return out
@@ -0,0 +1,54 @@
+"""
+Local token accounting for prompts.
+
+Uses tiktoken when it is installed; otherwise falls back to a ~4 characters
+per token estimate (close enough to compare prompt layouts, not to bill).
+"""
+from functools import lru_cache
+from typing import Optional
+
+from backend.config import settings
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # Imported on first use: it is only needed once prompts are measured
+    try:
+        import tiktoken
+    except ImportError:  # optional dependency
+        return None
+    try:
+        return tiktoken.encoding_for_model(settings.openai_model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def token_method() -> str:
+    return "tiktoken" if _encoding() is not None else "estimate"
+
+
+@lru_cache(maxsize=64)
+def count_tokens(text: str) -> int:
+    """Token count of text; cached because static prompt parts repeat on every call."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def prompt_token_report(system_prompt: str, user_message: str, static_prefix: Optional[str] = None) -> dict:
+    """
+    Split a call's prompt tokens into the byte-stable static prefix (cacheable
+    by the provider across every request) and the dynamic remainder.
+    """
+    static = static_prefix if static_prefix and system_prompt.startswith(static_prefix) else ""
+    static_tokens = count_tokens(static) if static else 0
+    dynamic_tokens = count_tokens(system_prompt[len(static):]) + count_tokens(user_message)
+    total = static_tokens + dynamic_tokens
+    return {
+        "static_tokens": static_tokens,
+        "dynamic_tokens": dynamic_tokens,
+        "total_tokens": total,
+        "static_share": round(static_tokens / total, 4) if total else 0.0,
+        "method": token_method(),
+    }
@@ -1,16 +1,21 @@
 from contextlib import asynccontextmanager
 
+# Imported before fastapi and the routers: its import time is the process
+# start that /readyz reports ready_ms and uptime against
+from backend import startup
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.config import settings
-from backend.data.loader import get_dataframe
-from backend.routers import query, metrics, export
+from backend.routers import query, jobs, metrics, export, results, debug, health
+from backend.timing import ServerTimingMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    get_dataframe()
+    # Blocks until the data is loaded, unless settings.background_startup
+    await startup.start()
     yield
 
 
@@ -29,7 +34,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(query.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
 app.include_router(metrics.router, prefix="/api")
 app.include_router(export.router, prefix="/api")
+app.include_router(results.router, prefix="/api")
+app.include_router(debug.router, prefix="/api")
+# Platform probes, outside /api
+app.include_router(health.router)
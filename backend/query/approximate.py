@@ -0,0 +1,261 @@
+"""
+Approximate answers from a stratified sample of the snapshot.
+
+The generated code runs on a proportional (self-weighting) Region x DPD
+Bucket sample instead of the full frame. Columns that are totals (sums,
+counts) are scaled up by population rows / sample rows; ratios and averages
+(Amount Efficiency, Connect Coverage, Avg DPD) are estimated as they are.
+Which is which is found by running the code on the sample stacked on itself
+(totals double, ratios and averages do not) and on the sample plus every
+other row (ratios and averages move). Columns that fit neither, such as
+distinct counts and extremes, cannot be estimated from a sample: they come
+back as computed on it, without an interval and with a warning.
+
+Every numeric value gets a 95% confidence interval from a delete-a-group
+jackknife over the sample's replicate groups (Student t with groups - 1
+degrees of freedom, since there are only a handful of replicates).
+"""
+import ast
+import math
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import settings
+from backend.data.sampling import ApproximateSample, get_approximate_sample
+from backend.query.columns import plan_columns
+from backend.query.executor import dry_run_pandas_code, execute_pandas_code, prepare_code
+from backend.stats import RollingStats
+
+CONFIDENCE = 0.95
+# Two-sided 95% Student t quantiles by degrees of freedom (normal beyond 30)
+_T95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+_runs = {"approximate": 0, "exact": 0, "row_level": 0}
+_approximate_ms = RollingStats()
+_lock = threading.Lock()
+
+
+def _numeric_columns(result: pd.DataFrame) -> list:
+    return [
+        col for col in result.columns
+        if pd.api.types.is_numeric_dtype(result[col]) and not pd.api.types.is_bool_dtype(result[col])
+    ]
+
+
+def _keyed(result: pd.DataFrame, numeric: list) -> Optional[pd.DataFrame]:
+    """result indexed by its label (non-numeric) columns, or None to align by position."""
+    labels = [col for col in result.columns if col not in numeric]
+    if labels:
+        keyed = result.set_index(labels)
+    elif not isinstance(result.index, pd.RangeIndex):
+        keyed = result
+    else:
+        return None
+    return keyed if keyed.index.is_unique else None
+
+
+def _lined_up(result: pd.DataFrame, other: pd.DataFrame, numeric: list) -> bool:
+    """Same shape, columns and labels (row for row)."""
+    if other.shape != result.shape or list(other.columns) != list(result.columns):
+        return False
+    labels = [col for col in result.columns if col not in numeric]
+    return not labels or result[labels].reset_index(drop=True).equals(other[labels].reset_index(drop=True))
+
+
+def _same(a: pd.Series, b: pd.Series) -> bool:
+    return bool(np.array_equal(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True))
+
+
+def _classify(result: pd.DataFrame, doubled: pd.DataFrame, reweighted: Optional[pd.DataFrame],
+              numeric: list) -> Optional[tuple[list, list, list]]:
+    """
+    (additive, averages, other) numeric columns; None if the results don't line up.
+    Totals double when every row is counted twice; ratios and averages stay the
+    same, but move when only some rows are counted twice. Distinct counts and
+    extremes (nunique, max, min, median) move in neither run, and anything else
+    (e.g. a count that grows but does not double) has no estimator here.
+    """
+    if not _lined_up(result, doubled, numeric):
+        return None
+    if reweighted is not None and not _lined_up(result, reweighted, numeric):
+        reweighted = None
+    additive, averages, other = [], [], []
+    for col in numeric:
+        single = result[col].to_numpy(dtype=float)
+        twice = doubled[col].to_numpy(dtype=float)
+        if np.allclose(twice, 2 * single, rtol=1e-9, equal_nan=True) and not np.allclose(single, 0):
+            additive.append(col)
+        elif _same(result[col], doubled[col]) and reweighted is not None and not _same(result[col], reweighted[col]):
+            averages.append(col)
+        else:
+            other.append(col)
+    return additive, averages, other
+
+
+def _scaled(result: pd.DataFrame, additive: list, factor: float) -> pd.DataFrame:
+    scaled = result.copy()
+    for col in additive:
+        values = scaled[col] * factor
+        if pd.api.types.is_integer_dtype(scaled[col]):
+            values = values.round().astype(scaled[col].dtype)
+        scaled[col] = values
+    return scaled
+
+
+def _narrowed(code: str, sample: ApproximateSample) -> pd.DataFrame:
+    """The sample restricted to the columns the code references (the runs below copy it ~12 times)."""
+    if not settings.prune_unused_columns:
+        return sample.frame
+    try:
+        kept, _ = plan_columns(ast.parse(prepare_code(code)), sample.frame)
+    except SyntaxError:
+        return sample.frame
+    return sample.frame if kept is None else sample.frame[kept]
+
+
+def _replicate(code: str, sample: ApproximateSample, columns: pd.DataFrame, group: int,
+               additive: list) -> Optional[pd.DataFrame]:
+    frame = sample.without_group(group, columns)
+    try:
+        result = dry_run_pandas_code(code, frame)
+    except Exception:
+        return None
+    return _scaled(result, additive, sample.population_rows / len(frame)) if len(frame) else None
+
+
+def _intervals(code: str, sample: ApproximateSample, columns: pd.DataFrame, estimate: pd.DataFrame,
+               numeric: list, additive: list, other: list) -> dict:
+    """
+    Jackknife confidence interval ([lo, hi] or None) of every numeric value, in
+    row order. Columns in `other` get none, and neither does a ratio or average
+    whose replicates all agree (a zero-width interval would claim certainty).
+    """
+    keyed = _keyed(estimate, numeric)
+    replicates = []
+    for group in range(sample.groups):
+        replicate = _replicate(code, sample, columns, group, additive)
+        if replicate is None or list(replicate.columns) != list(estimate.columns):
+            continue
+        if keyed is not None:
+            aligned = _keyed(replicate, numeric)
+            if aligned is None:
+                continue
+            replicates.append(aligned.reindex(keyed.index)[numeric].to_numpy(dtype=float))
+        elif len(replicate) == len(estimate):
+            replicates.append(replicate[numeric].to_numpy(dtype=float))
+
+    if len(replicates) < 2:
+        return {str(col): [None] * len(estimate) for col in numeric}
+    stacked = np.stack(replicates)
+    g = len(replicates)
+    # Delete-a-group jackknife variance; rows missing from any replicate get no interval
+    variance = (g - 1) / g * ((stacked - stacked.mean(axis=0)) ** 2).sum(axis=0)
+    t = _T95[g - 2] if g - 1 <= len(_T95) else 1.96
+    half_width = t * np.sqrt(variance)
+    values = estimate[numeric].to_numpy(dtype=float)
+
+    intervals = {}
+    for j, col in enumerate(numeric):
+        if col in other:
+            intervals[str(col)] = [None] * len(estimate)
+            continue
+        column = []
+        for value, half in zip(values[:, j], half_width[:, j]):
+            if math.isfinite(value) and math.isfinite(half) and (half > 0 or col in additive):
+                column.append([round(value - half, 4), round(value + half, 4)])
+            else:
+                column.append(None)
+        intervals[str(col)] = column
+    return intervals
+
+
+def _run_or_empty(code: str, frame: pd.DataFrame, result: pd.DataFrame) -> pd.DataFrame:
+    try:
+        return dry_run_pandas_code(code, frame)
+    except Exception:
+        return result.iloc[0:0]
+
+
+def _report(start: float, kind: str, sample: Optional[ApproximateSample], **fields) -> dict:
+    ms = round((time.perf_counter() - start) * 1000, 2)
+    with _lock:
+        _runs[kind] += 1
+    _approximate_ms.add(ms)
+    report = {
+        "exact": kind == "exact",
+        "row_level": kind == "row_level",
+        "sample_rows": len(sample.frame) if sample else 0,
+        "population_rows": sample.population_rows if sample else 0,
+        "scale": round(sample.scale, 4) if sample else 1.0,
+        "scaled_columns": [],
+        "unscaled_columns": [],
+        "unestimated_columns": [],
+        "warnings": [],
+        "confidence": None,
+        "method": None,
+        "intervals": {},
+        "ms": ms,
+        "refine_job_id": None,
+    }
+    report.update(fields)
+    return report
+
+
+def execute_approximate(code: str, df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Estimate the result of code on df from its approximate-mode sample.
+    Returns (estimated result, report). Frames no larger than the sample are
+    executed exactly; row-level results (lists of loans) come back unscaled,
+    as the sampled rows, without intervals.
+    """
+    start = time.perf_counter()
+    if len(df) <= settings.approx_sample_rows:
+        return execute_pandas_code(code, df), _report(start, "exact", None)
+
+    sample = get_approximate_sample(df)
+    columns = _narrowed(code, sample)
+    try:
+        result = dry_run_pandas_code(code, columns)
+    except (KeyError, AttributeError):
+        if columns is sample.frame:
+            raise
+        columns = sample.frame
+        result = dry_run_pandas_code(code, columns)
+    numeric = _numeric_columns(result)
+    doubled = _run_or_empty(code, pd.concat([columns, columns], ignore_index=True), result)
+    reweighted = _run_or_empty(code, pd.concat([columns, columns.iloc[::2]], ignore_index=True), result)
+    classes = _classify(result, doubled, reweighted, numeric)
+    if classes is None:
+        return result, _report(start, "row_level", sample, unscaled_columns=[str(col) for col in numeric])
+    additive, averages, other = classes
+
+    estimate = _scaled(result, additive, sample.scale)
+    warnings = [
+        f"'{col}' is not a total, ratio or average (e.g. a distinct count, minimum, maximum or median); "
+        "it is shown as computed on the sample, which can be far from the exact value"
+        for col in other
+    ]
+    return estimate, _report(
+        start, "approximate", sample,
+        scaled_columns=[str(col) for col in additive],
+        unscaled_columns=[str(col) for col in averages + other],
+        unestimated_columns=[str(col) for col in other],
+        warnings=warnings,
+        confidence=CONFIDENCE,
+        method=f"delete-a-group jackknife ({sample.groups} groups)",
+        intervals=_intervals(code, sample, columns, estimate, numeric, additive, other),
+    )
+
+
+def approximate_stats() -> dict:
+    with _lock:
+        runs = dict(_runs)
+    return {**runs, "ms": _approximate_ms.summary()}
@@ -0,0 +1,22 @@
+import re
+
+
+def normalize_question(question: str) -> str:
+    """Key used to dedupe batch questions: case- and whitespace-insensitive."""
+    return re.sub(r'\s+', ' ', question).strip().lower()
+
+
+def dedupe_questions(questions: list[str]) -> dict[str, list[int]]:
+    """
+    Map each distinct question (first spelling wins) to the batch indexes that
+    asked it, preserving first-seen order.
+    """
+    first_spelling: dict[str, str] = {}
+    indexes: dict[str, list[int]] = {}
+    for i, question in enumerate(questions):
+        key = normalize_question(question)
+        if key not in first_spelling:
+            first_spelling[key] = question
+            indexes[question] = []
+        indexes[first_spelling[key]].append(i)
+    return indexes
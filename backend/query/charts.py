@@ -0,0 +1,127 @@
+"""
+Chart-data stage: the series a chart actually draws, reduced server-side.
+
+Results with hundreds of States or Agents otherwise reach the browser as
+hundreds of bars. For categorical charts (bar, horizontal_bar, pie) the
+top settings.chart_max_categories rows by the first summable y column are
+kept in their original order and the rest are folded into one "Other" row
+(summable columns are summed, rates / averages are left empty since they
+cannot be added up). Temporal line charts are downsampled to settings.chart_max_points
+points with Largest-Triangle-Three-Buckets, which keeps peaks and troughs.
+
+The full table is untouched: it is still returned (or paged from
+/api/results/{result_id}).
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import settings
+from backend.query.executor import is_rate_column
+from backend.query.serialize import column_to_list
+
+OTHER_LABEL = "Other"
+_CATEGORICAL = ("bar", "horizontal_bar", "pie")
+
+
+def _chart_rows(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty or len(df.columns) == 0:
+        return df
+    total = df.iloc[:, 0].astype(str).str.contains('Grand Total', na=False).to_numpy()
+    return df[~total] if total.any() else df
+
+
+def _values(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=float)
+
+
+def _records(df: pd.DataFrame, columns: list[str], positions: np.ndarray) -> list[dict]:
+    """Row dicts of the given columns at the given positions (JSON-safe values)."""
+    values = {str(col): column_to_list(df[col].iloc[positions]) for col in columns}
+    return [dict(zip(values, row)) for row in zip(*values.values())]
+
+
+def top_n_with_other(df: pd.DataFrame, x_key: str, y_keys: list[str], n: int) -> list[dict]:
+    """
+    Records of the n largest rows by the first summable y column (else the
+    first one), in their original order, plus an "Other" row for the rest.
+    """
+    rank_by = next((key for key in y_keys if not is_rate_column(key)), y_keys[0])
+    ranking = np.nan_to_num(np.abs(_values(df[rank_by])), nan=-1.0)
+    keep = np.zeros(len(df), dtype=bool)
+    keep[np.argsort(-ranking, kind='stable')[:n]] = True
+
+    other = {x_key: f"{OTHER_LABEL} ({len(df) - n})"}
+    for key in y_keys:
+        other[key] = None if is_rate_column(key) else float(np.nansum(_values(df[key])[~keep]))
+    return _records(df, [x_key] + y_keys, np.flatnonzero(keep)) + [other]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Positions of the points Largest-Triangle-Three-Buckets keeps (always first and last)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float), nan=0.0)
+    # threshold - 2 buckets over the points between the first and the last
+    # (edges ends at n - 1: the last point is the bucket after the final one)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    sizes = np.diff(np.append(edges, n))
+    mean_x = np.add.reduceat(x, edges) / sizes
+    mean_y = np.add.reduceat(y, edges) / sizes
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    ax, ay = x[0], y[0]
+    for b in range(threshold - 2):
+        start, end = edges[b], edges[b + 1]
+        area = np.abs((ax - mean_x[b + 1]) * (y[start:end] - ay) - (ax - x[start:end]) * (mean_y[b + 1] - ay))
+        chosen = start + int(np.argmax(area))
+        keep[b + 1] = chosen
+        ax, ay = x[chosen], y[chosen]
+    return keep
+
+
+def _x_positions(series: pd.Series) -> np.ndarray:
+    """Numeric x for the triangle areas: dates as ns, numbers as is, anything else by position."""
+    if pd.api.types.is_datetime64_any_dtype(series) and series.notna().all():
+        return series.astype('int64').to_numpy(dtype=float)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype=float)
+        if np.isfinite(values).all():
+            return values
+    return np.arange(len(series), dtype=float)
+
+
+def reduce_chart_data(df: Optional[pd.DataFrame], chart: Optional[dict]) -> Optional[dict]:
+    """
+    {"data", "method", "points", "total_points"} for a chart whose series is
+    too long to draw as is; None when the chart can use the result rows.
+    """
+    if df is None or not chart or not chart.get("y_keys"):
+        return None
+    x_key, y_keys = chart["x_key"], chart["y_keys"]
+    if x_key not in df.columns or any(key not in df.columns for key in y_keys):
+        return None
+    rows = _chart_rows(df)
+
+    if chart["chart_type"] in _CATEGORICAL and len(rows) > settings.chart_max_categories:
+        data = top_n_with_other(rows, x_key, y_keys, settings.chart_max_categories)
+        method = "top_n"
+    elif chart["chart_type"] == "line" and len(rows) > settings.chart_max_points:
+        positions = lttb_indices(
+            _x_positions(rows[x_key]), _values(rows[y_keys[0]]), settings.chart_max_points
+        )
+        data = _records(rows, [x_key] + y_keys, positions)
+        method = "lttb"
+    else:
+        return None
+
+    return {
+        "data": data,
+        "method": method,
+        "points": len(data),
+        "total_points": len(rows),
+    }
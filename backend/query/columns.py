@@ -0,0 +1,449 @@
+"""
+Static column-usage analysis of generated code.
+
+Generated code usually touches a handful of the dataset's columns but is
+handed a copy of all of them. plan_columns() works out which columns the
+code can reach (string constants such as subscripts, groupby keys and agg
+dicts, plus attribute access like df.POS) so it can run on a pruned frame.
+
+Pruning is only safe when no result depends on the columns that were
+dropped. The analysis follows every value that still carries the full
+width of `df` (the frame itself, row filters of it, its rows and groups)
+and gives up, keeping the full frame, on anything it cannot account for:
+whole-frame reductions, df.columns, passing the frame to a function,
+dynamically built column names, eval/getattr, or the frame ending up in
+`result`.
+"""
+import ast
+import threading
+from typing import Optional
+
+import pandas as pd
+from pandas.core.dtypes.cast import find_common_type
+
+# Widths of an expression's value
+_NARROW, _WIDE, _GROUPBY, _ROWS = range(4)
+
+# Methods of a full-width frame that return a full-width frame (row
+# selection, ordering, renaming); their arguments must be narrow
+_PRESERVING = {
+    "copy", "head", "tail", "sort_values", "sort_index", "query", "reset_index", "set_index",
+    "fillna", "nlargest", "nsmallest", "sample", "assign", "rename", "astype", "round",
+    "where", "mask", "replace", "drop", "merge", "join",
+}
+# Full-width methods that are only column-independent when given these keywords
+_NEEDS_KEYWORD = {
+    "dropna": ("subset", _WIDE),
+    "drop_duplicates": ("subset", _WIDE),
+    "duplicated": ("subset", _NARROW),
+    "value_counts": ("subset", _NARROW),
+    "pivot_table": ("values", _NARROW),
+    "melt": ("value_vars", _NARROW),
+}
+_NARROW_ATTRS = {"index", "empty"}
+_GROUPBY_NARROW = {"size", "ngroup", "ngroups", "groups", "indices"}
+_DYNAMIC_NAMES = {"eval", "exec", "getattr", "globals", "locals", "vars", "__import__"}
+
+_stats = {
+    "runs": 0, "pruned": 0, "full_frame": 0, "retried_full": 0,
+    "columns_kept": 0, "columns_total": 0, "bytes_saved": 0,
+}
+_fallback_reasons: dict[str, int] = {}
+_stats_lock = threading.Lock()
+
+
+class _FullFrame(Exception):
+    """The code may depend on columns it does not name."""
+
+
+def _is_str(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def _is_str_list(node: ast.AST) -> bool:
+    return isinstance(node, (ast.List, ast.Tuple)) and all(_is_str(elt) for elt in node.elts)
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.expr]:
+    for kw in call.keywords:
+        if kw.arg == name:
+            return kw.value
+    return None
+
+
+class _Analyzer:
+    """Tracks which names hold full-width values and checks every use of them."""
+
+    def __init__(self, frame_name: str, columns: list[str]):
+        self.columns = set(columns)
+        self.wide = {frame_name}
+        self.groupbys: set[str] = set()
+        self.dynamic_strings = False
+
+    # -- expressions -------------------------------------------------------
+
+    def width(self, node: ast.AST) -> int:
+        if isinstance(node, ast.Name):
+            if node.id in _DYNAMIC_NAMES:
+                raise _FullFrame(f"uses {node.id}()")
+            if node.id in self.groupbys:
+                return _GROUPBY
+            return _WIDE if node.id in self.wide else _NARROW
+        if isinstance(node, ast.Subscript):
+            return self._subscript(node)
+        if isinstance(node, ast.Attribute):
+            return self._attribute(node)
+        if isinstance(node, ast.Call):
+            return self._call(node)
+        if isinstance(node, ast.Lambda):
+            return self.narrow(node.body)
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.expr):
+                self.narrow(child)
+            elif isinstance(child, ast.comprehension):
+                self._bind_iteration(child.target, child.iter)
+                for cond in child.ifs:
+                    self.narrow(cond)
+            elif isinstance(child, ast.keyword):
+                self.narrow(child.value)
+        return _NARROW
+
+    def narrow(self, node: ast.AST) -> int:
+        """Width of node, which must not carry the full frame."""
+        width = self.width(node)
+        if width != _NARROW:
+            raise _FullFrame(f"full frame used at line {getattr(node, 'lineno', '?')}")
+        return width
+
+    def _attribute(self, node: ast.Attribute) -> int:
+        width = self.width(node.value)
+        if width == _NARROW:
+            return _NARROW
+        # Column access by attribute (df.POS); method lookups are handled in _call
+        if node.attr in self.columns and width != _ROWS:
+            return _NARROW
+        if width == _WIDE and node.attr in _NARROW_ATTRS:
+            return _NARROW
+        if width == _GROUPBY and node.attr in _GROUPBY_NARROW:
+            return _NARROW
+        raise _FullFrame(f".{node.attr} of the full frame")
+
+    def _subscript(self, node: ast.Subscript) -> int:
+        value, key = node.value, node.slice
+        if isinstance(value, ast.Attribute) and value.attr in ("loc", "iloc", "at", "iat", "shape"):
+            if self.width(value.value) == _WIDE:
+                return self._indexer(value.attr, key)
+        width = self.width(value)
+        if width == _NARROW:
+            self.narrow(key)
+            return _NARROW
+        if width == _ROWS:
+            raise _FullFrame("indexing an iterator of rows")
+        if _is_str(key) or _is_str_list(key):
+            return _NARROW
+        if width == _GROUPBY:
+            raise _FullFrame("groupby selection by a computed key")
+        if isinstance(key, ast.Slice):
+            return _WIDE
+        self.narrow(key)
+        if isinstance(key, (ast.Compare, ast.BoolOp, ast.UnaryOp)) or not self.dynamic_strings:
+            # Boolean mask, or a variable that can only hold a column name written in the code
+            return _WIDE
+        raise _FullFrame("frame indexed by a computed key alongside dynamically built strings")
+
+    def _indexer(self, indexer: str, key: ast.expr) -> int:
+        if indexer == "shape":
+            if isinstance(key, ast.Constant) and key.value == 0:
+                return _NARROW
+            raise _FullFrame("shape of the full frame")
+        if indexer in ("iat",) or (indexer == "iloc" and isinstance(key, ast.Tuple)):
+            raise _FullFrame("positional column access")
+        if indexer == "iloc":
+            self.narrow(key)
+            return _WIDE
+        if isinstance(key, ast.Tuple) and len(key.elts) == 2:
+            rows, cols = key.elts
+            self.narrow(rows)
+            if _is_str(cols) or _is_str_list(cols):
+                return _NARROW
+            if isinstance(cols, ast.Slice) and cols.lower is None and cols.upper is None:
+                return _WIDE
+            raise _FullFrame(f".{indexer} with computed columns")
+        if indexer == "at":
+            raise _FullFrame(".at without a column label")
+        self.narrow(key)
+        return _WIDE
+
+    def _call(self, node: ast.Call) -> int:
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == "len" and len(node.args) == 1 and not node.keywords:
+            if self.width(node.args[0]) in (_WIDE, _GROUPBY):
+                return _NARROW
+        if not isinstance(func, ast.Attribute):
+            return self._generic_call(node)
+        owner = self.width(func.value)
+        if owner == _WIDE:
+            return self._frame_method(func.attr, node)
+        if owner == _GROUPBY:
+            return self._groupby_method(func.attr, node)
+        return self._generic_call(node)
+
+    def _generic_call(self, node: ast.Call) -> int:
+        if isinstance(node.func, ast.Attribute):
+            self.narrow(node.func.value)
+            if node.func.attr == "format":
+                self.dynamic_strings = True
+        else:
+            self.narrow(node.func)
+        for arg in node.args:
+            self.narrow(arg.value if isinstance(arg, ast.Starred) else arg)
+        for kw in node.keywords:
+            self.narrow(kw.value)
+        return _NARROW
+
+    def _arguments(self, node: ast.Call, wide_lambdas: bool = False) -> None:
+        for arg in list(node.args) + [kw.value for kw in node.keywords]:
+            if isinstance(arg, ast.Lambda) and wide_lambdas:
+                self._wide_lambda(arg)
+            else:
+                self.narrow(arg)
+
+    def _wide_lambda(self, node: ast.Lambda) -> None:
+        """A lambda called with full-width values (rows, groups): its parameter is wide, its result must not be."""
+        self.wide.update(arg.arg for arg in node.args.args)
+        self.narrow(node.body)
+
+    def _frame_method(self, method: str, node: ast.Call) -> int:
+        if method in _PRESERVING:
+            self._arguments(node, wide_lambdas=(method == "assign"))
+            return _WIDE
+        if method in _NEEDS_KEYWORD:
+            keyword, width = _NEEDS_KEYWORD[method]
+            if _keyword(node, keyword) is None:
+                raise _FullFrame(f".{method}() without {keyword}=")
+            self._arguments(node)
+            return width
+        if method == "groupby":
+            self._arguments(node)
+            return _GROUPBY
+        if method == "iterrows":
+            return _ROWS
+        if method == "apply":
+            axis = _keyword(node, "axis")
+            if (
+                isinstance(axis, ast.Constant) and axis.value in (1, "columns")
+                and node.args and isinstance(node.args[0], ast.Lambda)
+            ):
+                self._arguments(node, wide_lambdas=True)
+                return _NARROW
+        raise _FullFrame(f".{method}() on the full frame")
+
+    def _groupby_method(self, method: str, node: ast.Call) -> int:
+        if method in _GROUPBY_NARROW:
+            self._arguments(node)
+            return _NARROW
+        if method in ("agg", "aggregate"):
+            named = not node.args and node.keywords
+            if named or (len(node.args) == 1 and isinstance(node.args[0], ast.Dict)):
+                self._arguments(node)
+                return _NARROW
+        if method in ("apply", "filter") and node.args and isinstance(node.args[0], ast.Lambda):
+            self._arguments(node, wide_lambdas=True)
+            return _NARROW if method == "apply" else _WIDE
+        if method == "get_group":
+            self._arguments(node)
+            return _WIDE
+        raise _FullFrame(f"groupby.{method}() over every column")
+
+    # -- statements ----------------------------------------------------------
+
+    def _bind(self, target: ast.expr, width: int) -> None:
+        if isinstance(target, ast.Name):
+            if width == _WIDE:
+                self.wide.add(target.id)
+            elif width == _GROUPBY:
+                self.groupbys.add(target.id)
+            elif width == _ROWS:
+                raise _FullFrame("iterator of rows bound to a name")
+            return
+        if width != _NARROW:
+            raise _FullFrame("full frame unpacked")
+        if isinstance(target, (ast.Tuple, ast.List)):
+            return
+        self._store(target)
+
+    def _store(self, target: ast.expr) -> None:
+        """Assignment into an existing object: df['new'] = ..., df.loc[mask, 'c'] = ..."""
+        if isinstance(target, ast.Subscript):
+            value = target.value
+            if isinstance(value, ast.Attribute) and value.attr in ("loc", "at") and self.width(value.value) == _WIDE:
+                key = target.slice
+                if isinstance(key, ast.Tuple) and len(key.elts) == 2 and (_is_str(key.elts[1]) or _is_str_list(key.elts[1])):
+                    self.narrow(key.elts[0])
+                    return
+                raise _FullFrame("assignment to computed columns")
+            self.width(value)
+            self.narrow(target.slice)
+        elif isinstance(target, ast.Attribute):
+            if self.width(target.value) != _NARROW:
+                raise _FullFrame(f"assignment to .{target.attr} of the full frame")
+        elif isinstance(target, ast.Starred):
+            raise _FullFrame("starred assignment")
+
+    def _bind_iteration(self, target: ast.expr, iterable: ast.expr) -> None:
+        width = self.width(iterable)
+        if width == _NARROW:
+            self._bind(target, _NARROW)
+            return
+        # for key, rows in df.groupby(...) / for i, row in df.iterrows()
+        if width in (_ROWS, _GROUPBY) and isinstance(target, ast.Tuple) and len(target.elts) == 2:
+            key, value = target.elts
+            if isinstance(key, ast.Name) and isinstance(value, ast.Name):
+                self.wide.add(value.id)
+                return
+        raise _FullFrame("iteration over the full frame")
+
+    def statement(self, node: ast.stmt) -> None:
+        if isinstance(node, ast.Assign):
+            width = self.width(node.value)
+            for target in node.targets:
+                self._bind(target, width)
+        elif isinstance(node, ast.Expr):
+            # The value is discarded (e.g. df.sort_values(..., inplace=True))
+            self.width(node.value)
+        elif isinstance(node, ast.AugAssign):
+            if self.width(node.target) != _NARROW:
+                raise _FullFrame("in-place operation on the full frame")
+            self.narrow(node.value)
+        elif isinstance(node, ast.AnnAssign):
+            if node.value is not None:
+                self._bind(node.target, self.width(node.value))
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            self._bind_iteration(node.target, node.iter)
+            self.block(node.body + node.orelse)
+        elif isinstance(node, ast.Delete):
+            for target in node.targets:
+                self._store(target)
+        elif isinstance(node, (ast.Import, ast.ImportFrom, ast.Pass, ast.Break, ast.Continue, ast.Global, ast.Nonlocal)):
+            pass
+        else:
+            for field, value in ast.iter_fields(node):
+                if isinstance(value, ast.expr):
+                    self.narrow(value)
+                elif isinstance(value, list):
+                    for item in value:
+                        if isinstance(item, ast.stmt):
+                            self.statement(item)
+                        elif isinstance(item, ast.expr):
+                            self.narrow(item)
+                        elif isinstance(item, ast.withitem):
+                            self.narrow(item.context_expr)
+                        elif isinstance(item, ast.ExceptHandler):
+                            if item.type is not None:
+                                self.narrow(item.type)
+                            self.block(item.body)
+
+    def block(self, body: list[ast.stmt]) -> None:
+        for stmt in body:
+            self.statement(stmt)
+
+
+def _referenced(tree: ast.Module, columns: list[str]) -> set[str]:
+    strings, attrs = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            strings.add(node.value)
+        elif isinstance(node, ast.Attribute):
+            attrs.add(node.attr)
+    # Substrings cover query()/eval() expressions and labels; extra columns are harmless
+    return {col for col in columns if col in attrs or any(col in s for s in strings)}
+
+
+def _has_dynamic_strings(tree: ast.Module) -> bool:
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            return True
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Mod)):
+            if _is_str(node.left) or _is_str(node.right):
+                return True
+    return False
+
+
+def _used_columns(tree: ast.Module, columns: list[str], frame_name: str) -> list[str]:
+    """Columns the code can reach; raises _FullFrame when that cannot be decided statically."""
+    analyzer = _Analyzer(frame_name, columns)
+    analyzer.dynamic_strings = _has_dynamic_strings(tree)
+    # Names become wide as assignments are seen; repeat until that settles
+    while True:
+        before = (set(analyzer.wide), set(analyzer.groupbys), analyzer.dynamic_strings)
+        analyzer.block(tree.body)
+        if (analyzer.wide, analyzer.groupbys, analyzer.dynamic_strings) == before:
+            break
+    if "result" in analyzer.wide or "result" in analyzer.groupbys:
+        raise _FullFrame("result is the full frame")
+    referenced = _referenced(tree, columns)
+    return [col for col in columns if col in referenced]
+
+
+def _row_wise(tree: ast.Module) -> bool:
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and node.attr == "iterrows":
+            return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "apply":
+            if _keyword(node, "axis") is not None:
+                return True
+    return False
+
+
+def plan_columns(tree: ast.Module, df: pd.DataFrame, frame_name: str = "df") -> tuple[Optional[list[str]], str]:
+    """
+    Columns of df the code needs, or None to keep the full frame, with the
+    reason. Row-wise code (apply(axis=1), iterrows) sees rows upcast to the
+    frame's common dtype, so it is only pruned when that dtype is unchanged.
+    """
+    columns = df.columns.tolist()
+    if not df.columns.is_unique or not all(isinstance(col, str) for col in columns):
+        return None, "non-string or duplicate column labels"
+    try:
+        kept = _used_columns(tree, columns, frame_name)
+    except _FullFrame as exc:
+        return None, str(exc)
+    except RecursionError:
+        return None, "code too deeply nested"
+    if len(kept) == len(columns):
+        return None, "all columns referenced"
+    if _row_wise(tree) and find_common_type(list(df.dtypes[kept])) != find_common_type(list(df.dtypes)):
+        return None, "row-wise code would see a different row dtype"
+    return kept, "pruned"
+
+
+def record_plan(kept: Optional[list[str]], total: int, reason: str, bytes_saved: int = 0) -> None:
+    with _stats_lock:
+        _stats["runs"] += 1
+        if kept is None:
+            _stats["full_frame"] += 1
+            _fallback_reasons[reason] = _fallback_reasons.get(reason, 0) + 1
+        else:
+            _stats["pruned"] += 1
+            _stats["columns_kept"] += len(kept)
+            _stats["columns_total"] += total
+            _stats["bytes_saved"] += bytes_saved
+
+
+def record_retry() -> None:
+    with _stats_lock:
+        _stats["retried_full"] += 1
+
+
+def pruning_stats() -> dict:
+    """How often generated code ran on a pruned frame, columns kept and bytes not copied."""
+    with _stats_lock:
+        stats = dict(_stats)
+        reasons = dict(sorted(_fallback_reasons.items(), key=lambda item: -item[1]))
+    stats["pruned_rate"] = round(stats["pruned"] / stats["runs"], 4) if stats["runs"] else 0.0
+    stats["avg_columns_kept_share"] = (
+        round(stats["columns_kept"] / stats["columns_total"], 4) if stats["columns_total"] else 0.0
+    )
+    stats["mb_saved"] = round(stats.pop("bytes_saved") / 1024 / 1024, 1)
+    stats["full_frame_reasons"] = reasons
+    return stats
@@ -1,15 +1,26 @@
+import ast
 import textwrap
+import time
+import tracemalloc
 from typing import Optional
 
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from backend.config import settings
+from backend.data.loader import get_dataframe
+from backend.data.profile import get_dataset_profile
+from backend.data.rollups import match_rollup
+from backend.query.columns import plan_columns, record_plan, record_retry
+from backend.query.optimizer import HELPERS, optimize_tree
+from backend.query.predicates import FRAME_KEY_NAME, mask_cache_key, rewrite_predicates
+from backend.query.predicates import HELPERS as PREDICATE_HELPERS
 
-def execute_pandas_code(code: str, df: pd.DataFrame) -> pd.DataFrame:
+
+def prepare_code(code: str) -> str:
     """
-    Execute LLM-generated pandas code in a controlled namespace.
-    Returns the result DataFrame.
+    Normalize LLM-generated code before execution.
     Merged from AI-data (textwrap.dedent, tab normalization) and collection-whisperer.
     """
     # Clean the code - remove markdown backticks if present
@@ -19,21 +30,38 @@ def execute_pandas_code(code: str, df: pd.DataFrame) -> pd.DataFrame:
     code = textwrap.dedent(code)
 
     # Normalize tabs to spaces
-    code = code.replace('\t', '    ')
+    return code.replace('\t', '    ')
+
+
+class ResultError(ValueError):
+    """Generated code did not leave a DataFrame (or Series) in `result`."""
+
+
+class GeneratedExit(RuntimeError):
+    """Generated code raised SystemExit or KeyboardInterrupt (e.g. exit())."""
+
+
+def _exec(compiled, namespace: dict) -> None:
+    try:
+        exec(compiled, namespace)
+    except (SystemExit, KeyboardInterrupt) as e:
+        # An ordinary error, so it cannot stop a worker thread or the server
+        raise GeneratedExit(f"Generated code raised {type(e).__name__}").with_traceback(e.__traceback__) from None
+
 
+def _namespace(df: pd.DataFrame, copy: bool = True) -> dict:
     # Create controlled namespace with only df and pd
-    namespace = {
-        'df': df.copy(),
+    return {
+        'df': df.copy() if copy else df,
         'pd': pd,
         'datetime': datetime,
     }
 
-    # Execute the code
-    exec(code, namespace)
 
+def _result_frame(namespace: dict) -> pd.DataFrame:
     # Get the result
     if 'result' not in namespace:
-        raise ValueError("Generated code did not produce a 'result' DataFrame")
+        raise ResultError("Generated code did not produce a 'result' DataFrame")
 
     result = namespace['result']
 
@@ -41,11 +69,198 @@ def execute_pandas_code(code: str, df: pd.DataFrame) -> pd.DataFrame:
         if isinstance(result, pd.Series):
             result = result.to_frame()
         else:
-            raise ValueError("Result is not a DataFrame")
+            raise ResultError("Result is not a DataFrame")
 
     return result
 
 
+def _optimized_tree(code: str, namespace: dict, frame_key: Optional[str] = None) -> tuple[ast.Module, list[str]]:
+    """
+    Parse code and apply the vectorizing rewrites, adding their helpers to
+    namespace. With a frame_key (the frame is the loaded snapshot), filter
+    predicates are also routed through the mask cache.
+    """
+    tree = ast.parse(code)
+    rewrites = optimize_tree(tree) if settings.optimize_generated_code else []
+    if rewrites:
+        namespace.update(HELPERS)
+    if frame_key is not None and settings.cache_predicates and rewrite_predicates(tree):
+        namespace.update(PREDICATE_HELPERS)
+        namespace[FRAME_KEY_NAME] = frame_key
+        rewrites.append("predicate_cache")
+    return tree, rewrites
+
+
+# Errors a pruned frame raises if the code reaches a column the analysis missed
+_PRUNING_ERRORS = (KeyError, AttributeError)
+
+
+def _column_bytes(df: pd.DataFrame) -> dict[str, int]:
+    if df is get_dataframe():
+        return get_dataset_profile().column_bytes
+    return df.memory_usage(deep=True, index=False).to_dict()
+
+
+def _plan_frame(code: str, df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """df restricted to the columns the code references, when that is provably safe."""
+    total = len(df.columns)
+    if not settings.prune_unused_columns:
+        return df, {"kept": total, "total": total, "reason": "disabled"}
+    kept, reason = plan_columns(ast.parse(code), df)
+    if kept is None:
+        record_plan(None, total, reason)
+        return df, {"kept": total, "total": total, "reason": reason}
+    sizes = _column_bytes(df)
+    bytes_saved = sum(sizes.values()) - sum(sizes[col] for col in kept)
+    record_plan(kept, total, reason, bytes_saved)
+    return df[kept], {
+        "kept": len(kept),
+        "total": total,
+        "reason": reason,
+        "mb_saved": round(bytes_saved / 1024 / 1024, 2),
+    }
+
+
+def _execute(code: str, df: pd.DataFrame, frame_key: Optional[str] = None, copy: bool = True) -> pd.DataFrame:
+    namespace = _namespace(df, copy)
+    tree, _ = _optimized_tree(code, namespace, frame_key)
+
+    # Execute the code
+    _exec(compile(tree, '<generated>', 'exec'), namespace)
+
+    return _result_frame(namespace)
+
+
+def execute_pandas_code(code: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Execute LLM-generated pandas code in a controlled namespace, on only the
+    columns it references when that is safe.
+    Returns the result DataFrame.
+    """
+    code = prepare_code(code)
+    key = mask_cache_key(df)
+    frame, _ = _plan_frame(code, df)
+    try:
+        # A pruned frame is already detached from df (a copy, or a copy-on-write
+        # view under pandas 3), so only the full frame needs copying
+        return _execute(code, frame, key, copy=frame is df)
+    except _PRUNING_ERRORS:
+        if frame is df:
+            raise
+        record_retry()
+        return _execute(code, df, key)
+
+
+def error_line(exc: BaseException) -> Optional[int]:
+    """Line of the generated code where exc was raised (None if it was not raised there)."""
+    if isinstance(exc, SyntaxError):
+        return exc.lineno
+    line = None
+    tb = exc.__traceback__
+    while tb is not None:
+        if tb.tb_frame.f_code.co_filename == '<generated>':
+            line = tb.tb_lineno
+        tb = tb.tb_next
+    return line
+
+
+def dry_run_pandas_code(code: str, sample: pd.DataFrame) -> pd.DataFrame:
+    """Execute generated code on a small sample frame (not pruned: it is already cheap to copy)."""
+    return _execute(prepare_code(code), sample)
+
+
+_PROFILE_CODE_CHARS = 100
+
+
+def _statement_source(code: str, node: ast.stmt) -> str:
+    source = ast.get_source_segment(code, node) or ''
+    first_line = source.splitlines()[0] if source else ''
+    if len(first_line) > _PROFILE_CODE_CHARS or '\n' in source:
+        first_line = first_line[:_PROFILE_CODE_CHARS] + ' ...'
+    return first_line
+
+
+def _profile(
+    code: str, df: pd.DataFrame, top_n: int, frame_key: Optional[str], copy: bool = True,
+) -> tuple[pd.DataFrame, dict]:
+    namespace = _namespace(df, copy)
+    tree, rewrites = _optimized_tree(code, namespace, frame_key)
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    statements = []
+    total_start = time.perf_counter()
+    try:
+        for node in tree.body:
+            compiled = compile(ast.Module(body=[node], type_ignores=[]), '<generated>', 'exec')
+            tracemalloc.reset_peak()
+            mem_before, _ = tracemalloc.get_traced_memory()
+            start = time.perf_counter()
+            _exec(compiled, namespace)
+            ms = (time.perf_counter() - start) * 1000
+            mem_after, peak = tracemalloc.get_traced_memory()
+            statements.append({
+                "line": node.lineno,
+                "end_line": node.end_lineno,
+                "code": _statement_source(code, node),
+                "ms": round(ms, 2),
+                "mem_delta_kb": round((mem_after - mem_before) / 1024, 1),
+                "peak_kb": round((peak - mem_before) / 1024, 1),
+            })
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    total_ms = (time.perf_counter() - total_start) * 1000
+
+    hotspots = sorted(statements, key=lambda st: st["ms"], reverse=True)[:top_n]
+    exec_ms = sum(st["ms"] for st in statements)
+    for st in hotspots:
+        st["share"] = round(st["ms"] / exec_ms, 4) if exec_ms else 0.0
+
+    report = {
+        "total_ms": round(total_ms, 2),
+        "statements": len(statements),
+        "hotspots": hotspots,
+        "rewrites": rewrites,
+    }
+    return _result_frame(namespace), report
+
+
+def profile_pandas_code(code: str, df: pd.DataFrame, top_n: int = 5) -> tuple[pd.DataFrame, dict]:
+    """
+    Execute generated code one top-level statement at a time, recording wall
+    time and traced memory (net change and peak) per statement.
+    Returns (result, report) where report lists the top_n slowest statements,
+    the optimizer rewrites applied and the column pruning. tracemalloc slows
+    execution down and is process-wide, so this is opt-in.
+    """
+    code = prepare_code(code)
+    key = mask_cache_key(df)
+    frame, columns = _plan_frame(code, df)
+    try:
+        result, report = _profile(code, frame, top_n, key, copy=frame is df)
+    except _PRUNING_ERRORS:
+        if frame is df:
+            raise
+        record_retry()
+        result, report = _profile(code, df, top_n, key)
+        columns = {"kept": len(df.columns), "total": len(df.columns), "reason": "retried on the full frame"}
+    report["columns"] = columns
+    return result, report
+
+
+def is_rate_column(name: str) -> bool:
+    """Ratio / percentage / average columns (not summable across rows)."""
+    name = str(name).lower()
+    return (
+        'rate' in name or 'conversion' in name or '%' in name
+        or 'efficiency' in name or 'coverage' in name or 'connectivity' in name
+        or 'generation' in name or 'intensity' in name
+        or name.startswith('avg ')
+    )
+
+
 def detect_chart_type(df: pd.DataFrame, question: str) -> Optional[dict]:
     """
     Analyze result DataFrame shape and content to determine best chart type.
@@ -61,13 +276,7 @@ def detect_chart_type(df: pd.DataFrame, question: str) -> Optional[dict]:
         c for c in display_df.columns
         if display_df[c].dtype in ('float64', 'int64', 'Float64', 'Int64')
     ]
-    rate_cols = [
-        c for c in numeric_cols
-        if 'rate' in c.lower() or 'conversion' in c.lower() or '%' in c.lower()
-        or 'efficiency' in c.lower() or 'coverage' in c.lower() or 'connectivity' in c.lower()
-        or 'generation' in c.lower() or 'intensity' in c.lower()
-        or c.lower().startswith('avg ')
-    ]
+    rate_cols = [c for c in numeric_cols if is_rate_column(c)]
     # Exclude intermediate/helper columns from chart (counts, totals, raw aggregates)
     helper_keywords = ('count of cases', 'total cases', 'resolved count', 'aum', 'collected amount',
                         'total pos', 'call ptp', 'ivr ptp', 'whatsapp ptp', 'tara call ptp')
@@ -79,7 +288,8 @@ def detect_chart_type(df: pd.DataFrame, question: str) -> Optional[dict]:
     is_temporal = any(
         kw in category_col.lower()
         for kw in ('date', 'month', 'week', 'year', 'day')
-    )
+    ) or pd.api.types.is_datetime64_any_dtype(display_df[category_col]) \
+        or isinstance(display_df[category_col].dtype, pd.PeriodDtype)
 
     if num_rows <= 1 and len(numeric_cols) >= 1 and len(numeric_cols) <= 2:
         return {
@@ -97,25 +307,31 @@ def detect_chart_type(df: pd.DataFrame, question: str) -> Optional[dict]:
             "title": question,
         }
 
-    if num_rows > 20:
-        all_chart_cols = rate_cols[:4] + amount_cols[:6]
-        if not all_chart_cols:
+    # Time series stay lines however long (the chart-data stage downsamples them)
+    if is_temporal:
+        y_keys = (rate_cols[:2] if rate_cols else amount_cols[:4])
+        if not y_keys:
             return {
                 "chart_type": "table_only",
                 "x_key": "",
                 "y_keys": [],
                 "title": question,
             }
-        return {
-            "chart_type": "horizontal_bar",
+        chart = {
+            "chart_type": "line",
             "x_key": category_col,
-            "y_keys": all_chart_cols,
+            "y_keys": y_keys,
             "title": question,
         }
+        # Day / week / month series of a rolled-up date column can be re-grained from /api/trends
+        rollup = match_rollup(display_df, category_col)
+        if rollup is not None:
+            chart["rollup"] = rollup
+        return chart
 
-    if is_temporal:
-        y_keys = (rate_cols[:2] if rate_cols else amount_cols[:4])
-        if not y_keys:
+    if num_rows > 20:
+        all_chart_cols = rate_cols[:4] + amount_cols[:6]
+        if not all_chart_cols:
             return {
                 "chart_type": "table_only",
                 "x_key": "",
@@ -123,9 +339,9 @@ def detect_chart_type(df: pd.DataFrame, question: str) -> Optional[dict]:
                 "title": question,
             }
         return {
-            "chart_type": "line",
+            "chart_type": "horizontal_bar",
             "x_key": category_col,
-            "y_keys": y_keys,
+            "y_keys": all_chart_cols,
             "title": question,
         }
 
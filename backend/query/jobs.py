@@ -0,0 +1,197 @@
+"""
+In-process background job queue for long-running queries.
+
+Jobs are queued by priority (high < normal < low, FIFO within a priority)
+and run on a fixed pool of worker threads, so heavy questions never hold an
+HTTP connection open. Finished jobs are kept for a retention period and then
+dropped.
+"""
+import itertools
+import queue
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from backend.config import settings
+from backend.query.pipeline import PipelineCancelled, PipelineContext, outcome_payload
+from backend.stats import RollingStats
+from backend.timing import record_job
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, workers: int, max_queued: int, retention_seconds: float):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._threads: list[threading.Thread] = []
+        self.wait_ms = RollingStats()
+        self.run_ms = RollingStats()
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"query-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED and now - job["finished_at"] > self.retention_seconds
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def queued_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["status"] == "queued")
+
+    def submit(self, kind: str, run: Callable[[PipelineContext], dict], priority: str = "normal",
+               orient: str = "records", include_sql: bool = False, question: str = "") -> dict:
+        """Queue a pipeline run; `run(ctx)` must return a pipeline outcome."""
+        self._purge_expired()
+        if self.queued_count() >= self.max_queued:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} queued)")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "question": question,
+            "priority": priority,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "wait_ms": None,
+            "run_ms": None,
+            "timings": {},
+            "error": None,
+            "payload": None,
+            "_run": run,
+            "_orient": orient,
+            "_include_sql": include_sql,
+            "_cancel": threading.Event(),
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+        self._queue.put((PRIORITIES.get(priority, PRIORITIES["normal"]), next(self._seq), job["job_id"]))
+        self._ensure_workers()
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        self._purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or signal a running one to stop at its next stage."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return False
+            job["_cancel"].set()
+            if job["status"] == "queued":
+                job["status"] = "cancelled"
+                job["finished_at"] = time.time()
+        return True
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position among queued jobs, in the order workers will pick them."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return None
+            with self._queue.mutex:
+                pending = sorted(self._queue.queue)
+            queued_ids = [jid for _, _, jid in pending if self._jobs.get(jid, {}).get("status") == "queued"]
+        return queued_ids.index(job_id) + 1 if job_id in queued_ids else None
+
+    def _work(self) -> None:
+        while True:
+            _, _, job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != "queued":
+                    continue
+                job["status"] = "running"
+                job["started_at"] = time.time()
+                job["wait_ms"] = round((job["started_at"] - job["submitted_at"]) * 1000, 2)
+            self.wait_ms.add(job["wait_ms"])
+
+            ctx = PipelineContext(cancel_event=job["_cancel"])
+            status, payload, error = "failed", None, None
+            try:
+                outcome = job["_run"](ctx)
+                with ctx.stage("serialize"):
+                    payload = outcome_payload(outcome, job["_orient"], job["_include_sql"])
+                status = "succeeded" if outcome["success"] else "failed"
+                error = outcome["error"]
+            except PipelineCancelled:
+                status = "cancelled"
+            except BaseException as e:
+                # Anything escaping the run (even SystemExit) fails the job, not the worker
+                error = str(e) or type(e).__name__
+
+            finished_at = time.time()
+            with self._lock:
+                job.update(
+                    status=status,
+                    payload=payload,
+                    error=error,
+                    timings=ctx.timings,
+                    finished_at=finished_at,
+                    run_ms=round((finished_at - job["started_at"]) * 1000, 2),
+                )
+            self.run_ms.add(job["run_ms"])
+            record_job(job["kind"], ctx.timings, job["run_ms"])
+
+    def stats(self) -> dict:
+        self._purge_expired()
+        with self._lock:
+            by_status: dict[str, int] = {}
+            depth = {name: 0 for name in PRIORITIES}
+            for job in self._jobs.values():
+                by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+                if job["status"] == "queued":
+                    depth[job["priority"]] = depth.get(job["priority"], 0) + 1
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "retention_seconds": self.retention_seconds,
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "jobs_by_status": by_status,
+            "wait_ms": self.wait_ms.summary(),
+            "run_ms": self.run_ms.summary(),
+        }
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                workers=settings.job_workers,
+                max_queued=settings.job_max_queued,
+                retention_seconds=settings.job_retention_seconds,
+            )
+    return _job_queue
@@ -0,0 +1,498 @@
+"""
+Pre-execution rewrites of slow pandas idioms in generated code.
+
+The LLM often writes row-wise code that pandas can do column-wise:
+
+- row_apply:     X.apply(lambda row: <arithmetic on row['Col']>, axis=1)
+- iterrows:      for i, row in X.iterrows(): ... row['Col'] ...
+- loop_filter:   for v in ...: ... X[X['Col'] == v] ...
+- group_reduce:  X.groupby(...).apply(lambda g: g['Col'].sum())
+
+Each match is replaced by a call to a runtime helper that takes the fast
+path only when it provably gives the same result (same values, dtype and
+index) and otherwise runs the original expression. Anything unrecognised is
+left untouched.
+"""
+import ast
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+REWRITES = ("row_apply", "iterrows", "loop_filter", "group_reduce")
+
+_counters = {name: {"rewritten": 0, "fast_path": 0, "fallback": 0} for name in REWRITES}
+_counters_lock = threading.Lock()
+
+
+def _count(rewrite: str, outcome: str) -> None:
+    with _counters_lock:
+        _counters[rewrite][outcome] += 1
+
+
+def optimizer_stats() -> dict:
+    """Per rewrite: how often it was applied to code, and how often the fast path ran or fell back."""
+    with _counters_lock:
+        return {name: dict(counts) for name, counts in _counters.items()}
+
+
+# ---------------------------------------------------------------------------
+# Runtime helpers (injected into the execution namespace)
+# ---------------------------------------------------------------------------
+
+# Rows of the original apply() re-run to confirm the vectorized result
+_CHECK_ROWS = 32
+# Key dtypes whose groupby keys hash exactly like the values compared with ==
+_GROUP_KEY_KINDS = "biuO"
+_REDUCTIONS = ("sum", "mean", "median", "min", "max", "count")
+# Reductions whose float result depends on summation order
+_ORDER_SENSITIVE = ("sum", "mean")
+
+
+def _row_source(frame: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """
+    The referenced columns with the dtype apply(axis=1) would see. An
+    all-numeric frame is interleaved to one common dtype per row (so ints
+    become floats next to a float column). Rows of a mixed frame are object
+    arrays holding Python ints and bools, which never overflow (and add up
+    as numbers), so integer and bool columns are computed as object there.
+    """
+    source = frame[columns]
+    dtypes = list(frame.dtypes)
+    if all(isinstance(d, np.dtype) and d.kind in "iuf" for d in dtypes):
+        common = np.result_type(*dtypes)
+        return source.astype(common)
+    python_scalars = {
+        col: object for col in columns
+        if isinstance(source[col].dtype, np.dtype) and source[col].dtype.kind in "iub"
+    }
+    return source.astype(python_scalars) if python_scalars else source
+
+
+def fast_row_apply(
+    frame,
+    func: Callable,
+    vectorized: Callable,
+    denominators: list[Callable],
+    columns: list[str],
+):
+    """frame.apply(func, axis=1) computed as vectorized(frame columns) when equivalent."""
+    def fallback():
+        _count("row_apply", "fallback")
+        return frame.apply(func, axis=1)
+
+    if not isinstance(frame, pd.DataFrame) or frame.empty or not frame.columns.is_unique:
+        return fallback()
+    try:
+        source = _row_source(frame, columns)
+        # Row-wise Python arithmetic raises on division by zero; keep that behaviour
+        if any((den(source) == 0).any() for den in denominators):
+            return fallback()
+        result = vectorized(source)
+    except Exception:
+        return fallback()
+    if not isinstance(result, pd.Series) or not result.index.equals(frame.index):
+        return fallback()
+    # apply() infers the dtype of the values it collects; do the same for object arithmetic
+    result = result.rename(None)
+    if result.dtype == object:
+        result = result.infer_objects()
+
+    expected = frame.head(_CHECK_ROWS).apply(func, axis=1)
+    if not expected.equals(result.head(_CHECK_ROWS)) or expected.dtype != result.dtype:
+        return fallback()
+    _count("row_apply", "fast_path")
+    return result
+
+
+def fast_iterrows(frame, keys: list[str]):
+    """
+    (index, row) pairs like frame.iterrows(), with row a dict of the referenced
+    columns. Values come from frame.values, exactly as iterrows builds its rows.
+    """
+    if not isinstance(frame, pd.DataFrame) or not frame.columns.is_unique or any(k not in frame.columns for k in keys):
+        _count("iterrows", "fallback")
+        return frame.iterrows()
+    _count("iterrows", "fast_path")
+    positions = [(key, frame.columns.get_loc(key)) for key in keys]
+    return (
+        (label, {key: values[pos] for key, pos in positions})
+        for label, values in zip(frame.index, frame.values)
+    )
+
+
+class GroupedRows:
+    """Lazily built value -> row positions lookup replacing frame[frame[col] == value] in a loop."""
+
+    def __init__(self, frame, column: str):
+        self.frame = frame
+        self.column = column
+        self._indices: Optional[dict] = None
+        self._usable: Optional[bool] = None
+
+    def _build(self) -> None:
+        frame, column = self.frame, self.column
+        self._usable = (
+            isinstance(frame, pd.DataFrame)
+            and frame.columns.is_unique
+            and column in frame.columns
+            and frame[column].dtype.kind in _GROUP_KEY_KINDS
+        )
+        if self._usable:
+            try:
+                self._indices = frame.groupby(column, sort=False, dropna=True, observed=True).indices
+            except Exception:
+                self._usable = False
+
+    def rows(self, value, original: Callable):
+        if self._usable is None:
+            self._build()
+        if not self._usable or not pd.api.types.is_scalar(value) or isinstance(value, (float, np.floating)):
+            # Float keys can compare equal without hashing alike (e.g. -0.0 vs 0.0); keep the mask
+            _count("loop_filter", "fallback")
+            return original()
+        _count("loop_filter", "fast_path")
+        positions = self._indices.get(value)
+        if positions is None:
+            positions = np.array([], dtype=np.intp)
+        return self.frame.take(positions)
+
+
+def fast_group_reduce(grouped, column: str, how: str, func: Callable):
+    """grouped.apply(lambda g: g[column].<how>()) as grouped[column].<how>()."""
+    def fallback():
+        _count("group_reduce", "fallback")
+        return grouped.apply(func)
+
+    obj = getattr(grouped, "obj", None)
+    if (
+        not isinstance(grouped, pd.core.groupby.DataFrameGroupBy)
+        or not isinstance(obj, pd.DataFrame)
+        or obj.empty
+        or column not in obj.columns
+        or column in grouped.exclusions
+        or not obj.columns.is_unique
+        # apply() collects the per-group scalars into a numpy dtype; a grouped
+        # nullable (extension) column would keep its own dtype instead
+        or not isinstance(obj[column].dtype, np.dtype)
+    ):
+        return fallback()
+    _count("group_reduce", "fast_path")
+    if how in _ORDER_SENSITIVE:
+        # The cythonized kernels sum floats in a different order; reduce each
+        # group's Series instead so the result matches apply() bit for bit
+        return grouped[column].agg(lambda s: getattr(s, how)()).rename(None)
+    return getattr(grouped[column], how)().rename(None)
+
+
+HELPERS = {
+    "__opt_row_apply": fast_row_apply,
+    "__opt_iterrows": fast_iterrows,
+    "__opt_grouped_rows": GroupedRows,
+    "__opt_group_reduce": fast_group_reduce,
+}
+
+
+# ---------------------------------------------------------------------------
+# AST rewriting
+# ---------------------------------------------------------------------------
+
+def _str_subscript_of(node: ast.AST, name: str) -> Optional[str]:
+    """'Col' if node is name['Col'] (load), else None."""
+    if (
+        isinstance(node, ast.Subscript)
+        and isinstance(node.value, ast.Name) and node.value.id == name
+        and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)
+    ):
+        return node.slice.value
+    return None
+
+
+_ARITH_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_DIVISION_OPS = (ast.Div, ast.FloorDiv, ast.Mod)
+
+
+def _is_row_arithmetic(node: ast.AST, row: str, columns: list[str]) -> bool:
+    """Arithmetic over row['Col'] and numeric constants only."""
+    col = _str_subscript_of(node, row)
+    if col is not None:
+        columns.append(col)
+        return True
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.USub, ast.UAdd)) and _is_row_arithmetic(node.operand, row, columns)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, _ARITH_OPS):
+        if isinstance(node.op, ast.Pow):
+            # Only small non-negative integer powers behave the same for ints
+            exp = node.right
+            if not (isinstance(exp, ast.Constant) and type(exp.value) is int and 0 <= exp.value <= 3):
+                return False
+        return _is_row_arithmetic(node.left, row, columns) and _is_row_arithmetic(node.right, row, columns)
+    return False
+
+
+class _RowToFrame(ast.NodeTransformer):
+    def __init__(self, row: str, frame: str):
+        self.row = row
+        self.frame = frame
+
+    def visit_Subscript(self, node):
+        if _str_subscript_of(node, self.row) is not None:
+            return ast.Subscript(value=ast.Name(self.frame, ast.Load()), slice=node.slice, ctx=ast.Load())
+        return self.generic_visit(node)
+
+
+def _lambda(arg: Optional[str], body: ast.expr) -> ast.Lambda:
+    args = [ast.arg(arg)] if arg else []
+    return ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=args, kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body=body,
+    )
+
+
+def _call(helper: str, args: list[ast.expr]) -> ast.Call:
+    return ast.Call(func=ast.Name(helper, ast.Load()), args=args, keywords=[])
+
+
+def _const_list(values: list[str]) -> ast.List:
+    return ast.List(elts=[ast.Constant(v) for v in values], ctx=ast.Load())
+
+
+def _single_lambda_arg(node: ast.AST) -> Optional[str]:
+    if not isinstance(node, ast.Lambda):
+        return None
+    a = node.args
+    if a.posonlyargs or a.kwonlyargs or a.vararg or a.kwarg or a.defaults or len(a.args) != 1:
+        return None
+    return a.args[0].arg
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Subscript, ast.Attribute)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+# Methods that mutate the object they are called on
+_MUTATING_METHODS = ("insert", "pop", "update")
+
+
+def _stores(body: list[ast.stmt]) -> set[str]:
+    """Names rebound or possibly mutated in body (assignments, item/attribute stores, in-place calls)."""
+    stored = set()
+    for stmt in body:
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                stored.add(node.id)
+            elif isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                stored.add(_root_name(node))
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                if node.func.attr in _MUTATING_METHODS or any(k.arg == "inplace" for k in node.keywords):
+                    stored.add(_root_name(node.func.value))
+    stored.discard(None)
+    return stored
+
+
+def _aliases(tree: ast.AST) -> dict[str, set[str]]:
+    """Names bound to each other by plain `a = b` assignments, each mapped to its whole group."""
+    groups: dict[str, set[str]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Name):
+            names = {node.value.id} | {t.id for t in node.targets if isinstance(t, ast.Name)}
+            group = set().union(*(groups.get(name, {name}) for name in names))
+            for name in group:
+                groups[name] = group
+    return groups
+
+
+def _loop_filter_match(node: ast.AST, target: str) -> Optional[tuple[str, str]]:
+    """(frame, column) if node is frame[frame['column'] == target] (either operand order)."""
+    if not (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and isinstance(node.ctx, ast.Load)):
+        return None
+    frame = node.value.id
+    cmp = node.slice
+    if not (isinstance(cmp, ast.Compare) and len(cmp.ops) == 1 and isinstance(cmp.ops[0], ast.Eq)):
+        return None
+    left, right = cmp.left, cmp.comparators[0]
+    for side, other in ((left, right), (right, left)):
+        col = _str_subscript_of(side, frame)
+        if col is not None and isinstance(other, ast.Name) and other.id == target:
+            return frame, col
+    return None
+
+
+class _Optimizer(ast.NodeTransformer):
+    def __init__(self, aliases: dict[str, set[str]]):
+        self.applied: list[str] = []
+        self.aliases = aliases
+        self._groups = 0
+
+    # -- X.apply(lambda row: arithmetic, axis=1) / X.groupby(...).apply(lambda g: g['C'].sum())
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and func.attr == "apply" and len(node.args) == 1):
+            return node
+        return self._row_apply(node) or self._group_reduce(node) or node
+
+    def _row_apply(self, node: ast.Call) -> Optional[ast.Call]:
+        kws = {k.arg: k.value for k in node.keywords}
+        axis = kws.get("axis")
+        if set(kws) != {"axis"} or not (isinstance(axis, ast.Constant) and axis.value in (1, "columns")):
+            return None
+        lam = node.args[0]
+        row = _single_lambda_arg(lam)
+        columns: list[str] = []
+        if row is None or not _is_row_arithmetic(lam.body, row, columns) or not columns:
+            return None
+
+        to_frame = _RowToFrame(row, "__f")
+        vectorized = _lambda("__f", to_frame.visit(_copy(lam.body)))
+        denominators = [
+            _lambda("__f", to_frame.visit(_copy(n.right)))
+            for n in ast.walk(lam.body)
+            if isinstance(n, ast.BinOp) and isinstance(n.op, _DIVISION_OPS)
+        ]
+        self.applied.append("row_apply")
+        return _call("__opt_row_apply", [
+            node.func.value, lam, vectorized,
+            ast.List(elts=denominators, ctx=ast.Load()),
+            _const_list(list(dict.fromkeys(columns))),
+        ])
+
+    def _group_reduce(self, node: ast.Call) -> Optional[ast.Call]:
+        if node.keywords:
+            return None
+        grouped = node.func.value
+        if not (
+            isinstance(grouped, ast.Call)
+            and isinstance(grouped.func, ast.Attribute) and grouped.func.attr == "groupby"
+            and {k.arg for k in grouped.keywords} <= {"observed", "sort", "dropna"}
+        ):
+            return None
+        lam = node.args[0]
+        g = _single_lambda_arg(lam)
+        body = lam.body if g else None
+        if not (
+            isinstance(body, ast.Call) and not body.args and not body.keywords
+            and isinstance(body.func, ast.Attribute) and body.func.attr in _REDUCTIONS
+        ):
+            return None
+        col = _str_subscript_of(body.func.value, g)
+        if col is None:
+            return None
+        self.applied.append("group_reduce")
+        return _call("__opt_group_reduce", [grouped, ast.Constant(col), ast.Constant(body.func.attr), lam])
+
+    # -- for loops: iterrows and repeated equality filters
+    def visit_For(self, node):
+        self.generic_visit(node)
+        self._iterrows(node)
+        prelude = self._loop_filters(node)
+        return prelude + [node] if prelude else node
+
+    def _iterrows(self, node: ast.For) -> None:
+        it, target = node.iter, node.target
+        if not (
+            isinstance(it, ast.Call) and not it.args and not it.keywords
+            and isinstance(it.func, ast.Attribute) and it.func.attr == "iterrows"
+            and isinstance(target, ast.Tuple) and len(target.elts) == 2
+            and all(isinstance(e, ast.Name) for e in target.elts)
+        ):
+            return
+        row = target.elts[1].id
+        if row in _stores(node.body + node.orelse):
+            return
+        keys: list[str] = []
+        subscripted = set()
+        for stmt in node.body + node.orelse:
+            for n in ast.walk(stmt):
+                col = _str_subscript_of(n, row)
+                if col is not None and isinstance(n.ctx, ast.Load):
+                    keys.append(col)
+                    subscripted.add(id(n.value))
+        uses = [
+            n for stmt in node.body + node.orelse for n in ast.walk(stmt)
+            if isinstance(n, ast.Name) and n.id == row
+        ]
+        # The row must only ever be read as row['Col']
+        if any(id(n) not in subscripted for n in uses):
+            return
+        node.iter = _call("__opt_iterrows", [it.func.value, _const_list(list(dict.fromkeys(keys)))])
+        self.applied.append("iterrows")
+
+    def _loop_filters(self, node: ast.For) -> list[ast.stmt]:
+        if not isinstance(node.target, ast.Name):
+            return []
+        target = node.target.id
+        stored = _stores(node.body)
+        # A store through one name changes every frame bound to it
+        stored |= {alias for name in stored for alias in self.aliases.get(name, ())}
+        if target in stored:
+            return []
+        replacer = _LoopFilterReplacer(self, target, stored)
+        node.body = [replacer.visit(stmt) for stmt in node.body]
+        for stmt in replacer.prelude:
+            ast.copy_location(stmt, node)
+        return replacer.prelude
+
+    def new_group_name(self) -> str:
+        name = f"__opt_groups_{self._groups}"
+        self._groups += 1
+        return name
+
+
+class _LoopFilterReplacer(ast.NodeTransformer):
+    """Replaces frame[frame['col'] == target] in a loop body with a grouped-rows lookup."""
+
+    def __init__(self, optimizer: _Optimizer, target: str, stored: set[str]):
+        self.optimizer = optimizer
+        self.target = target
+        self.stored = stored
+        self.prelude: list[ast.stmt] = []
+        self._lookups: dict[tuple[str, str], str] = {}
+
+    def visit_Lambda(self, node):
+        return node  # late-binding closures may run after the loop
+
+    def visit_FunctionDef(self, node):
+        return node
+
+    def visit_Subscript(self, node):
+        self.generic_visit(node)
+        match = _loop_filter_match(node, self.target)
+        if match is None or match[0] in self.stored:
+            return node
+        if match not in self._lookups:
+            name = self.optimizer.new_group_name()
+            self._lookups[match] = name
+            self.prelude.append(ast.Assign(
+                targets=[ast.Name(name, ast.Store())],
+                value=_call("__opt_grouped_rows", [ast.Name(match[0], ast.Load()), ast.Constant(match[1])]),
+            ))
+        self.optimizer.applied.append("loop_filter")
+        rows = ast.Attribute(value=ast.Name(self._lookups[match], ast.Load()), attr="rows", ctx=ast.Load())
+        return ast.Call(func=rows, args=[ast.Name(self.target, ast.Load()), _lambda(None, node)], keywords=[])
+
+
+def _copy(node: ast.AST) -> ast.AST:
+    return ast.parse(ast.unparse(node), mode="eval").body
+
+
+def optimize_tree(tree: ast.Module) -> list[str]:
+    """Rewrite tree in place; returns the names of the rewrites applied (in order)."""
+    optimizer = _Optimizer(_aliases(tree))
+    optimizer.visit(tree)
+    ast.fix_missing_locations(tree)
+    for name in optimizer.applied:
+        _count(name, "rewritten")
+    return optimizer.applied
+
+
+def optimize_code(code: str) -> tuple[str, list[str]]:
+    """Source-level variant of optimize_tree (for inspection and benchmarks)."""
+    tree = ast.parse(code)
+    applied = optimize_tree(tree)
+    return (ast.unparse(tree) if applied else code), applied
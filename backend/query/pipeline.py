@@ -0,0 +1,466 @@
+"""
+Query pipeline shared by the JSON, streaming (SSE) and background entry points.
+
+Each run goes through named stages (get_dataframe, prompt, llm, extract,
+dry_run, execute, chart, serialize); failed code goes through repair, dry_run
+and execute again. Approximate runs execute on a sample of the snapshot
+(see backend.query.approximate) and skip the dry run. A PipelineContext times every stage, forwards
+progress events to an optional callback and lets the caller cancel between
+stages or while LLM tokens are streaming.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from backend.config import settings
+from backend.data.loader import get_dataframe, get_dataset_version
+from backend.llm.client import query_llm, repair_code, request_code, extract_code
+from backend.llm.prompt import (
+    CODE_GENERATION_PROMPT_PREFIX,
+    DIRECT_QUERY_PROMPT_PREFIX,
+    REPAIR_PROMPT_PREFIX,
+    build_code_generation_request,
+    build_repair_request,
+    get_code_generation_prompt,
+    get_direct_query_prompt,
+    get_repair_prompt,
+)
+from backend.llm.tokens import prompt_token_report
+from backend.query.approximate import execute_approximate
+from backend.query.batch import normalize_question
+from backend.query.charts import reduce_chart_data
+from backend.query.executor import (
+    detect_chart_type, error_line, execute_pandas_code, prepare_code, profile_pandas_code,
+)
+from backend.query.predicates import mask_cache_key, warm_from_filters
+from backend.query.repair import format_error, record_repair
+from backend.query.serialize import frame_to_payload
+from backend.query.singleflight import SingleFlight
+from backend.query.store import save_result
+from backend.query.validation import record_full_run, validate_on_sample
+from backend.timing import record as record_timing
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a run when the caller cancelled it (e.g. client disconnected)."""
+
+
+class PipelineContext:
+    """Per-run stage timer, event sink and cancellation flag."""
+
+    def __init__(
+        self,
+        emit: Optional[Callable[[str, dict], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        stream_tokens: bool = False,
+        llm_limiter: Optional[threading.Semaphore] = None,
+        profile: bool = False,
+        approximate: bool = False,
+    ):
+        self._emit = emit
+        self.cancel_event = cancel_event or threading.Event()
+        self.stream_tokens = stream_tokens and emit is not None
+        self.llm_limiter = llm_limiter
+        # Profile the generated code statement by statement (see profile_pandas_code)
+        self.profile = profile
+        # Estimate the result from a sample instead of running on the full snapshot
+        self.approximate = approximate
+        self.timings: dict[str, float] = {}
+        self.started = time.perf_counter()
+        # True when this run shared the result of an identical in-flight run
+        self.coalesced = False
+        self.prompt_tokens: Optional[dict] = None
+
+    def emit(self, event: str, data: dict) -> None:
+        if self._emit is not None:
+            self._emit(event, data)
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event.is_set():
+            raise PipelineCancelled()
+
+    @contextmanager
+    def stage(self, name: str):
+        self.check_cancelled()
+        self.emit("stage", {"stage": name, "status": "started"})
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            yield
+            status = "completed"
+        finally:
+            ms = round((time.perf_counter() - start) * 1000, 2)
+            self.timings[name] = round(self.timings.get(name, 0.0) + ms, 2)
+            record_timing(name, ms)
+            self.emit("stage", {"stage": name, "status": status, "ms": ms})
+
+    @contextmanager
+    def llm_stage(self, name: str = "llm"):
+        """An LLM call stage, holding a slot of llm_limiter (if any) for its duration."""
+        if self.llm_limiter is None:
+            with self.stage(name):
+                yield
+            return
+        with self.llm_limiter:
+            with self.stage(name):
+                yield
+
+    def on_token(self) -> Optional[Callable[[str], None]]:
+        """Token callback for the LLM client, or None when not streaming tokens."""
+        if not self.stream_tokens:
+            return None
+
+        def handle(text: str) -> None:
+            self.check_cancelled()
+            self.emit("token", {"text": text})
+
+        return handle
+
+    def record_prompt(self, system_prompt: str, user_message: str, static_prefix: str) -> None:
+        """Measure the static/dynamic token split of the LLM call about to be made."""
+        self.prompt_tokens = prompt_token_report(system_prompt, user_message, static_prefix)
+        self.emit("prompt", self.prompt_tokens)
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+
+def _outcome(question: str, **fields: Any) -> dict:
+    outcome = {
+        "success": False,
+        "question": question,
+        "result": None,
+        "chart": None,
+        "chart_data": None,
+        "generated_code": "",
+        "sql_code": "",
+        "error": None,
+        "profile": None,
+        "validation": None,
+        "repair": None,
+        "approximate": None,
+        "result_id": None,
+    }
+    outcome.update(fields)
+    return outcome
+
+
+_inflight = SingleFlight(retry_on=(PipelineCancelled,))
+
+
+def _snapshot_key(df: pd.DataFrame) -> str:
+    """Dataset version for the loaded snapshot, or the frame identity for any other frame."""
+    if df is get_dataframe():
+        return get_dataset_version()
+    return f"frame-{id(df)}"
+
+
+def _coalesce(key: tuple, ctx: PipelineContext, run: Callable[[], dict]) -> dict:
+    """Run `run` unless an identical run is in flight, in which case await and share its outcome."""
+    if not settings.coalesce_requests:
+        return run()
+
+    def waiting():
+        ctx.emit("stage", {"stage": "coalesced", "status": "waiting"})
+
+    start = time.perf_counter()
+    outcome, shared = _inflight.do(key, run, on_wait=waiting, check=ctx.check_cancelled)
+    if shared:
+        ctx.coalesced = True
+        ms = round((time.perf_counter() - start) * 1000, 2)
+        ctx.timings["coalesced"] = ms
+        record_timing("coalesced", ms)
+        ctx.emit("stage", {"stage": "coalesced", "status": "completed", "ms": ms})
+    return outcome
+
+
+def coalescing_stats() -> dict:
+    return _inflight.stats()
+
+
+def _run_code(ctx: PipelineContext, df: pd.DataFrame, code: str) -> dict:
+    """The dry_run and execute stages for one version of the code."""
+    if ctx.approximate:
+        return _run_approximate(ctx, df, code)
+
+    with ctx.stage("dry_run"):
+        validation = validate_on_sample(code, df)
+    ctx.emit("validation", validation)
+    if validation["status"] == "failed":
+        # The full data would fail the same way; don't spend the full run on it
+        return {
+            "validation": validation, "error": validation["error"],
+            "error_type": validation["error_type"], "line": validation["line"],
+        }
+
+    profile = None
+    try:
+        with ctx.stage("execute"):
+            if ctx.profile:
+                result, profile = profile_pandas_code(code, df)
+            else:
+                result = execute_pandas_code(code, df)
+    except PipelineCancelled:
+        raise
+    except Exception as e:
+        record_full_run(validation["status"], succeeded=False)
+        return {"validation": validation, "error": str(e), "error_type": type(e).__name__, "line": error_line(e)}
+    record_full_run(validation["status"], succeeded=True)
+    return {"validation": validation, "error": None, "result": result, "profile": profile}
+
+
+def _run_approximate(ctx: PipelineContext, df: pd.DataFrame, code: str) -> dict:
+    """The execute stage on the approximate-mode sample (already small: no dry run)."""
+    try:
+        with ctx.stage("execute"):
+            result, approximate = execute_approximate(code, df)
+    except PipelineCancelled:
+        raise
+    except Exception as e:
+        return {"validation": None, "error": str(e), "error_type": type(e).__name__, "line": error_line(e)}
+    ctx.emit("approximate", {key: value for key, value in approximate.items() if key != "intervals"})
+    return {"validation": None, "error": None, "result": result, "profile": None, "approximate": approximate}
+
+
+def _repair(ctx: PipelineContext, df: pd.DataFrame, question: str, code: str, run: dict) -> tuple[str, dict, dict]:
+    """
+    Send failed code and its error back to the model until a version runs,
+    within settings.repair_max_attempts and settings.repair_budget_seconds.
+    Returns (last code tried, its run, repair report).
+    """
+    start = time.perf_counter()
+    system_prompt = get_repair_prompt(df)
+    errors: list[str] = []
+    stopped = None
+    while len(errors) < settings.repair_max_attempts:
+        if time.perf_counter() - start > settings.repair_budget_seconds:
+            stopped = "budget_exhausted"
+            break
+        error = format_error(run["error_type"], run["error"])
+        errors.append(error)
+        ctx.emit("repair", {"attempt": len(errors), "error": error})
+        request = build_repair_request(question, code, error, run["line"])
+        ctx.record_prompt(system_prompt, request, REPAIR_PROMPT_PREFIX)
+        try:
+            with ctx.llm_stage("repair"):
+                repaired = prepare_code(repair_code(request, system_prompt))
+        except PipelineCancelled:
+            raise
+        except Exception:
+            stopped = "llm_errors"
+            break
+        if repaired == code:
+            stopped = "unchanged_code"
+            break
+        code = repaired
+        run = _run_code(ctx, df, code)
+        if run["error"] is None:
+            break
+
+    report = {
+        "attempts": len(errors),
+        "succeeded": run["error"] is None,
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+        "errors": errors,
+        "stopped": stopped,
+    }
+    record_repair(report)
+    ctx.emit("repair", report)
+    return code, run, report
+
+
+def _execute(ctx: PipelineContext, df: pd.DataFrame, question: str, code: str, generated_code: str) -> dict:
+    """
+    Run the code (repairing it if it fails) and the chart stage.
+    Returns the outcome fields; generated_code is the code that was last run.
+    """
+    run = _run_code(ctx, df, code)
+    repair = None
+    if run["error"] is not None and settings.repair_max_attempts > 0:
+        code, run, repair = _repair(ctx, df, question, code, run)
+        generated_code = code
+
+    fields = {"generated_code": generated_code, "validation": run["validation"], "repair": repair}
+    if run.get("approximate") is not None:
+        fields["approximate"] = run["approximate"]
+    if run["error"] is not None:
+        return {**fields, "error": f"Execution error: {run['error']}"}
+
+    with ctx.stage("chart"):
+        chart = detect_chart_type(run["result"], question)
+    with ctx.stage("chart_data"):
+        chart_data = reduce_chart_data(run["result"], chart)
+    # Stored once per outcome: coalesced followers and every serialization share the id
+    result_id = save_result(run["result"])
+    return {
+        **fields, "success": True, "result": run["result"], "chart": chart, "chart_data": chart_data,
+        "profile": run["profile"], "result_id": result_id,
+    }
+
+
+def run_direct_query(
+    question: str,
+    ctx: Optional[PipelineContext] = None,
+    df: Optional[pd.DataFrame] = None,
+) -> dict:
+    """
+    Direct one-shot flow: question -> code -> result.
+    Pass `df` to run against a specific snapshot instead of the current one.
+    Identical concurrent questions on the same snapshot share one run.
+    """
+    ctx = ctx or PipelineContext()
+
+    with ctx.stage("get_dataframe"):
+        df = df if df is not None else get_dataframe()
+
+    key = ("direct", normalize_question(question), _snapshot_key(df), ctx.profile, ctx.approximate)
+    return _coalesce(key, ctx, lambda: _run_direct(question, ctx, df))
+
+
+def _run_direct(question: str, ctx: PipelineContext, df: pd.DataFrame) -> dict:
+    with ctx.stage("prompt"):
+        system_prompt = get_direct_query_prompt(df)
+        ctx.record_prompt(system_prompt, question, DIRECT_QUERY_PROMPT_PREFIX)
+
+    try:
+        with ctx.llm_stage():
+            generated_code = query_llm(question, system_prompt, on_token=ctx.on_token())
+    except PipelineCancelled:
+        raise
+    except Exception as e:
+        return _outcome(question, error=f"LLM error: {str(e)}")
+
+    with ctx.stage("extract"):
+        # Check if LLM indicated it cannot answer
+        if generated_code.strip().startswith('# CANNOT_ANSWER:'):
+            reason = generated_code.strip().replace('# CANNOT_ANSWER:', '').strip()
+            return _outcome(question, error=reason)
+        code = prepare_code(generated_code)
+
+    return _outcome(question, **_execute(ctx, df, question, code, generated_code))
+
+
+def run_confirm_query(
+    question: str,
+    confirmed_logic: list,
+    preview_data: dict,
+    ctx: Optional[PipelineContext] = None,
+) -> dict:
+    """
+    Second step of the preview/confirm flow: confirmed logic -> code + SQL -> result.
+    Identical concurrent confirms (question, logic, preview) share one run.
+    """
+    ctx = ctx or PipelineContext()
+
+    with ctx.stage("get_dataframe"):
+        df = get_dataframe()
+
+    key = (
+        "confirm",
+        normalize_question(question),
+        _snapshot_key(df),
+        ctx.profile,
+        ctx.approximate,
+        json.dumps(confirmed_logic, sort_keys=True, default=str),
+        json.dumps(preview_data, sort_keys=True, default=str),
+    )
+    return _coalesce(key, ctx, lambda: _run_confirm(question, confirmed_logic, preview_data, ctx, df))
+
+
+def _run_confirm(
+    question: str,
+    confirmed_logic: list,
+    preview_data: dict,
+    ctx: PipelineContext,
+    df: pd.DataFrame,
+) -> dict:
+    with ctx.stage("prompt"):
+        # Snapshot-stable system prompt; the confirmed logic goes in the user message
+        code_gen_prompt = get_code_generation_prompt(df)
+        code_gen_request = build_code_generation_request(question, confirmed_logic, preview_data)
+        ctx.record_prompt(code_gen_prompt, code_gen_request, CODE_GENERATION_PROMPT_PREFIX)
+        # The code will apply these filters: compute their masks while the LLM writes it
+        if not ctx.approximate:
+            warm_from_filters(preview_data.get('filters', []), df, mask_cache_key(df))
+
+    try:
+        with ctx.llm_stage():
+            response_text = request_code(code_gen_request, code_gen_prompt, on_token=ctx.on_token())
+        with ctx.stage("extract"):
+            generated = extract_code(response_text)
+    except PipelineCancelled:
+        raise
+    except Exception as e:
+        return _outcome(question, error=f"LLM error: {str(e)}")
+
+    python_code = generated.get('python', '')
+    sql_code = generated.get('sql', '')
+
+    return _outcome(question, sql_code=sql_code, **_execute(ctx, df, question, python_code, python_code))
+
+
+def run_generated_code(
+    question: str,
+    code: str,
+    ctx: Optional[PipelineContext] = None,
+    sql_code: str = "",
+    df: Optional[pd.DataFrame] = None,
+) -> dict:
+    """
+    Run already generated code (no LLM call) on the snapshot, e.g. to refine an
+    approximate answer to the exact one.
+    """
+    ctx = ctx or PipelineContext()
+
+    with ctx.stage("get_dataframe"):
+        df = df if df is not None else get_dataframe()
+
+    return _outcome(question, sql_code=sql_code, **_execute(ctx, df, question, code, code))
+
+
+def outcome_payload(
+    outcome: dict, orient: str = "records", include_sql: bool = False, max_rows: Optional[int] = None,
+) -> dict:
+    """
+    JSON body for a pipeline outcome, shaped like QueryResponse / ConfirmResponse.
+    Successful results are referenced by the result_id they were stored under;
+    with max_rows only the first rows are inlined (truncated=True).
+    """
+    result = outcome["result"]
+    truncated = False
+    if result is not None:
+        truncated = max_rows is not None and len(result) > max_rows
+        columns, data = frame_to_payload(result.iloc[:max_rows] if truncated else result, orient)
+        row_count = len(result)
+    else:
+        columns, data, row_count = [], ([] if orient == "records" else {}), 0
+
+    payload = {
+        "success": outcome["success"],
+        "question": outcome["question"],
+        "row_count": row_count,
+        "columns": columns,
+        "data": data,
+        "chart": outcome["chart"],
+        "generated_code": outcome["generated_code"],
+    }
+    if outcome["chart_data"] is not None:
+        payload["chart_data"] = outcome["chart_data"]
+    if include_sql:
+        payload["sql_code"] = outcome["sql_code"]
+    if outcome["profile"] is not None:
+        payload["profile"] = outcome["profile"]
+    if outcome["validation"] is not None:
+        payload["validation"] = outcome["validation"]
+    if outcome["repair"] is not None:
+        payload["repair"] = outcome["repair"]
+    if outcome["approximate"] is not None:
+        payload["approximate"] = outcome["approximate"]
+    payload["error"] = outcome["error"]
+    payload["result_id"] = outcome["result_id"]
+    payload["truncated"] = truncated
+    return payload
@@ -0,0 +1,379 @@
+"""
+Cache of row masks for filter predicates shared across queries.
+
+Different questions keep filtering on the same conditions ("South region",
+"DPD > 360", "Status == COLLECTED") and every snippet recomputes those masks
+over the whole snapshot. Simple predicates on the input frame are
+canonicalized to a key and their masks memoized per dataset version:
+
+- leaves:    df['Col'] <op> constant (either operand order), df['Col'].isin([...]),
+             .isna() / .notna() (and the isnull / notnull aliases),
+             .between(lo, hi) (stored as >= and <=)
+- compounds: a & b, a | b (operands sorted, so order does not matter), ~a
+
+The code is rewritten to fetch the mask through a helper, which rebuilds
+exactly the Series the expression would have produced. This is only done
+when the code never rebinds, mutates or aliases `df` (and runs no
+eval/exec), so every mask is computed over the unchanged snapshot rows.
+The confirm flow also warms the cache from preview_data['filters'] while
+the LLM writes the code.
+"""
+import ast
+import operator
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.cache import BudgetedLRUCache
+from backend.config import settings
+from backend.data.loader import get_dataframe, get_dataset_version
+from backend.query.columns import _DYNAMIC_NAMES
+from backend.query.optimizer import _MUTATING_METHODS, _call, _root_name, _str_subscript_of
+
+FRAME_NAME = "df"
+# Namespace name of the cache key of the frame being executed (None: don't cache)
+FRAME_KEY_NAME = "__pred_frame_key"
+
+_COMPARE_OPS = {
+    ast.Eq: "==", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=",
+}
+# The same comparison with its operands swapped
+_FLIPPED = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+_OPERATORS = {
+    "==": operator.eq, "!=": operator.ne, "<": operator.lt,
+    "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+_NULL_CHECKS = {"isna": "isna", "isnull": "isna", "notna": "notna", "notnull": "notna"}
+
+_counters = {"rewritten": 0, "warmed": 0, "uncacheable": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += n
+
+
+# ---------------------------------------------------------------------------
+# Mask cache and runtime helper
+# ---------------------------------------------------------------------------
+
+_cache: Optional[BudgetedLRUCache] = None
+_cache_version: Optional[str] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache(frame_key: str) -> BudgetedLRUCache:
+    """The mask cache, emptied when masks for another dataset version arrive."""
+    global _cache, _cache_version
+    with _cache_lock:
+        if _cache is None:
+            _cache = BudgetedLRUCache(
+                max_bytes=settings.predicate_cache_max_mb * 1024 * 1024,
+                sizeof=lambda entry: entry[0].nbytes,
+            )
+        if frame_key != _cache_version:
+            _cache.clear()
+            _cache_version = frame_key
+        return _cache
+
+
+def _compute(frame: pd.DataFrame, frame_key: Optional[str], key: tuple) -> pd.Series:
+    kind = key[0]
+    if kind == "cmp":
+        _, col, op, value = key
+        return _OPERATORS[op](frame[col], value)
+    if kind == "isin":
+        return frame[key[1]].isin(list(key[2]))
+    if kind in ("isna", "notna"):
+        return getattr(frame[key[1]], kind)()
+    if kind == "not":
+        return ~_series(frame, frame_key, key[1])
+    parts = [_series(frame, frame_key, part) for part in key[1:]]
+    return reduce(operator.and_ if kind == "and" else operator.or_, parts)
+
+
+def _series(frame: pd.DataFrame, frame_key: Optional[str], key: tuple) -> pd.Series:
+    if frame_key is None:
+        return _compute(frame, None, key)
+    cache = _get_cache(frame_key)
+    cached = cache.get((frame_key, key))
+    if cached is not None and len(cached[0]) == len(frame):
+        mask, name = cached
+        return pd.Series(mask, index=frame.index, name=name, copy=True)
+    series = _compute(frame, frame_key, key)
+    if series.dtype == np.bool_:
+        cache.put((frame_key, key), (series.to_numpy(copy=True), series.name))
+    else:
+        # Nullable booleans keep their missing values: not cached
+        _count("uncacheable")
+    return series
+
+
+def mask_cache_key(df: pd.DataFrame) -> Optional[str]:
+    """Cache key for masks over df: the dataset version for the loaded snapshot, else None."""
+    return get_dataset_version() if df is get_dataframe() else None
+
+
+def cached_mask(frame, frame_key: Optional[str], key: tuple):
+    """The Series the predicate `key` evaluates to on frame, from the cache when possible."""
+    return _series(frame, frame_key, key)
+
+
+HELPERS = {"__pred_mask": cached_mask}
+
+
+def clear_predicate_cache() -> None:
+    with _cache_lock:
+        if _cache is not None:
+            _cache.clear()
+
+
+def predicate_cache_stats() -> dict:
+    with _counters_lock:
+        counters = dict(_counters)
+    with _cache_lock:
+        cache = _cache
+    stats = cache.stats() if cache is not None else {"entries": 0, "hits": 0, "misses": 0, "hit_rate": 0.0}
+    return {**stats, **counters, "dataset_version": _cache_version}
+
+
+# ---------------------------------------------------------------------------
+# Canonical keys
+# ---------------------------------------------------------------------------
+
+def _constant(value) -> tuple[bool, object]:
+    """(usable, canonical value): ints and integral floats compare the same, bools are left alone."""
+    if isinstance(value, bool) or value is None:
+        return False, None
+    if isinstance(value, float):
+        if not np.isfinite(value):
+            return False, None
+        return True, int(value) if value.is_integer() else value
+    if isinstance(value, (int, str)):
+        return True, value
+    return False, None
+
+
+def _literal(node: ast.AST) -> tuple[bool, object]:
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        if isinstance(node.operand.value, (int, float)) and not isinstance(node.operand.value, bool):
+            return _constant(-node.operand.value)
+    if isinstance(node, ast.Constant):
+        return _constant(node.value)
+    return False, None
+
+
+def _combined(kind: str, parts: list[tuple]) -> tuple:
+    """and/or key with nested same-kind operands flattened, duplicates dropped and operands sorted."""
+    flat = []
+    for part in parts:
+        flat.extend(part[1:] if part[0] == kind else [part])
+    unique = sorted(set(flat), key=repr)
+    return unique[0] if len(unique) == 1 else (kind, *unique)
+
+
+def _between(col: str, low, high) -> tuple:
+    return _combined("and", [("cmp", col, ">=", low), ("cmp", col, "<=", high)])
+
+
+def _leaf_call(node: ast.Call) -> Optional[tuple]:
+    if not isinstance(node.func, ast.Attribute) or node.keywords:
+        return None
+    col = _str_subscript_of(node.func.value, FRAME_NAME)
+    method = node.func.attr
+    if col is None:
+        return None
+    if method in _NULL_CHECKS and not node.args:
+        return (_NULL_CHECKS[method], col)
+    if method == "isin" and len(node.args) == 1 and isinstance(node.args[0], (ast.List, ast.Tuple, ast.Set)):
+        values = [_literal(elt) for elt in node.args[0].elts]
+        if values and all(ok for ok, _ in values):
+            return ("isin", col, tuple(sorted({v for _, v in values}, key=repr)))
+    if method == "between" and len(node.args) == 2:
+        (low_ok, low), (high_ok, high) = _literal(node.args[0]), _literal(node.args[1])
+        if low_ok and high_ok:
+            return _between(col, low, high)
+    return None
+
+
+def predicate_key(node: ast.AST) -> Optional[tuple]:
+    """Canonical key of a predicate expression on df, or None if it is not one."""
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARE_OPS:
+        op = _COMPARE_OPS[type(node.ops[0])]
+        left, right = node.left, node.comparators[0]
+        for side, other, side_op in ((left, right, op), (right, left, _FLIPPED[op])):
+            col = _str_subscript_of(side, FRAME_NAME)
+            ok, value = _literal(other)
+            if col is not None and ok:
+                return ("cmp", col, side_op, value)
+        return None
+    if isinstance(node, ast.Call):
+        return _leaf_call(node)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        inner = predicate_key(node.operand)
+        return ("not", inner) if inner is not None else None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        left, right = predicate_key(node.left), predicate_key(node.right)
+        if left is None or right is None:
+            return None
+        return _combined("and" if isinstance(node.op, ast.BitAnd) else "or", [left, right])
+    return None
+
+
+# ---------------------------------------------------------------------------
+# AST rewriting
+# ---------------------------------------------------------------------------
+
+def _frame_untouched(tree: ast.Module) -> bool:
+    """
+    df is never rebound, mutated, shadowed or passed around whole (so it stays
+    the snapshot), and no eval/exec/globals() can do so out of sight.
+    """
+    parents = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+    for node in ast.walk(tree):
+        if isinstance(node, ast.arg) and node.arg == FRAME_NAME:
+            return False
+        if isinstance(node, ast.Name) and node.id in _DYNAMIC_NAMES:
+            return False
+        if isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            if _root_name(node) == FRAME_NAME:
+                return False
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            mutating = node.func.attr in _MUTATING_METHODS or any(k.arg == "inplace" for k in node.keywords)
+            if mutating and _root_name(node.func.value) == FRAME_NAME:
+                return False
+        if isinstance(node, ast.Name) and node.id == FRAME_NAME:
+            if not isinstance(node.ctx, ast.Load):
+                return False
+            parent = parents.get(node)
+            # df[...] / df.attr are fine; len(df) too; anything else may alias the frame
+            if isinstance(parent, (ast.Subscript, ast.Attribute)) and parent.value is node:
+                continue
+            if isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == "len":
+                continue
+            return False
+    return True
+
+
+class _PredicateRewriter(ast.NodeTransformer):
+    def __init__(self):
+        self.keys: list[tuple] = []
+
+    def _rewrite(self, node):
+        key = predicate_key(node)
+        if key is None:
+            return self.generic_visit(node)
+        self.keys.append(key)
+        return _call("__pred_mask", [
+            ast.Name(FRAME_NAME, ast.Load()), ast.Name(FRAME_KEY_NAME, ast.Load()), ast.Constant(key),
+        ])
+
+    visit_Compare = _rewrite
+    visit_Call = _rewrite
+    visit_UnaryOp = _rewrite
+    visit_BinOp = _rewrite
+
+
+def rewrite_predicates(tree: ast.Module) -> list[tuple]:
+    """Route the predicates on df in tree through the mask cache; returns their keys."""
+    if not _frame_untouched(tree):
+        return []
+    rewriter = _PredicateRewriter()
+    rewriter.visit(tree)
+    ast.fix_missing_locations(tree)
+    if rewriter.keys:
+        _count("rewritten", len(rewriter.keys))
+    return rewriter.keys
+
+
+# ---------------------------------------------------------------------------
+# Warming from preview filters
+# ---------------------------------------------------------------------------
+
+_FILTER_RE = re.compile(
+    r'^\s*(?P<col>.+?)\s*(?P<op>==|!=|>=|<=|=|>|<|\bnot in\b|\bin\b|\bis not null\b|\bis null\b)\s*(?P<value>.*?)\s*$',
+    re.IGNORECASE,
+)
+_QUOTES = "'\""
+
+
+def _filter_value(raw: str, numeric: bool) -> tuple[bool, object]:
+    raw = raw.strip().strip(_QUOTES)
+    if not numeric:
+        return (True, raw) if raw else (False, None)
+    try:
+        return _constant(float(raw.replace(',', '')))
+    except ValueError:
+        return False, None
+
+
+def filter_key(text: str, df: pd.DataFrame) -> Optional[tuple]:
+    """
+    Canonical key of a preview filter such as "Region = South", "DPD > 360",
+    "Status == COLLECTED", "Region in (East, West)" or "Agent Name is not null".
+    None for anything else (including unknown columns).
+    """
+    match = _FILTER_RE.match(text)
+    if not match:
+        return None
+    columns = {str(col).lower(): col for col in df.columns}
+    col = columns.get(match.group('col').strip().strip(_QUOTES).lower())
+    if col is None:
+        return None
+    op = match.group('op').lower()
+    if op in ("is null", "is not null"):
+        return ("isna" if op == "is null" else "notna", col) if not match.group('value') else None
+
+    numeric = pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+    if op in ("in", "not in"):
+        items = [_filter_value(item, numeric) for item in match.group('value').strip('()[] ').split(',')]
+        if not items or not all(ok for ok, _ in items):
+            return None
+        key = ("isin", col, tuple(sorted({v for _, v in items}, key=repr)))
+        return ("not", key) if op == "not in" else key
+    ok, value = _filter_value(match.group('value'), numeric)
+    if not ok:
+        return None
+    return ("cmp", col, "==" if op == "=" else op, value)
+
+
+def _warm(keys: list[tuple], df: pd.DataFrame, frame_key: str) -> None:
+    for key in keys:
+        try:
+            cached_mask(df, frame_key, key)
+        except Exception:
+            continue
+        _count("warmed")
+
+
+_warmer: Optional[ThreadPoolExecutor] = None
+
+
+def warm_from_filters(filters: list, df: pd.DataFrame, frame_key: Optional[str]) -> list[tuple]:
+    """
+    Compute the masks of the recognisable preview filters in the background
+    (typically while the LLM is generating the code that applies them).
+    Returns the keys queued.
+    """
+    global _warmer
+    if not settings.cache_predicates or frame_key is None:
+        return []
+    keys = [key for key in (filter_key(str(text), df) for text in filters or []) if key is not None]
+    if not keys:
+        return []
+    if len(keys) > 1:
+        keys.append(_combined("and", keys))
+    with _cache_lock:
+        if _warmer is None:
+            _warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predicate-warm")
+    _warmer.submit(_warm, keys, df, frame_key)
+    return keys
@@ -0,0 +1,53 @@
+"""
+Bookkeeping for the self-repair loop in the query pipeline: when generated
+code fails, the pipeline sends it back to the model with a compact error
+report (see build_repair_request) within settings.repair_max_attempts and
+settings.repair_budget_seconds. This module formats the error and keeps
+success rates and the latency the loop adds.
+"""
+import threading
+from typing import Optional
+
+from backend.stats import RollingStats
+
+# Error messages are cut to this length in repair prompts
+_MAX_ERROR_CHARS = 500
+
+_stats = {
+    "runs": 0, "repaired": 0, "unrepaired": 0, "attempts": 0,
+    "budget_exhausted": 0, "unchanged_code": 0, "llm_errors": 0,
+}
+# Successful repairs by the attempt that fixed them
+_repaired_at: dict[int, int] = {}
+_added_ms = RollingStats()
+_lock = threading.Lock()
+
+
+def format_error(error_type: Optional[str], message: str) -> str:
+    text = f"{error_type}: {message}" if error_type else message
+    return text if len(text) <= _MAX_ERROR_CHARS else text[:_MAX_ERROR_CHARS] + " ..."
+
+
+def record_repair(report: dict) -> None:
+    with _lock:
+        _stats["runs"] += 1
+        _stats["attempts"] += report["attempts"]
+        if report["succeeded"]:
+            _stats["repaired"] += 1
+            _repaired_at[report["attempts"]] = _repaired_at.get(report["attempts"], 0) + 1
+        else:
+            _stats["unrepaired"] += 1
+        if report["stopped"] in ("budget_exhausted", "unchanged_code", "llm_errors"):
+            _stats[report["stopped"]] += 1
+    _added_ms.add(report["ms"])
+
+
+def repair_stats() -> dict:
+    """Repair success rate, attempts, why loops stopped early and the latency they added (ms)."""
+    with _lock:
+        stats = dict(_stats)
+        repaired_at = dict(sorted(_repaired_at.items()))
+    stats["success_rate"] = round(stats["repaired"] / stats["runs"], 4) if stats["runs"] else 0.0
+    stats["repaired_at_attempt"] = repaired_at
+    stats["added_ms"] = _added_ms.summary()
+    return stats
@@ -0,0 +1,254 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import Response
+from pydantic_core import to_jsonable_python
+
+
+def _durations(values: list) -> list:
+    """ISO 8601 durations ("P1DT2H"), as pydantic encodes timedelta; None stays None."""
+    return to_jsonable_python(values)
+
+
+def _clean_scalar(val: Any) -> Any:
+    """Convert a single numpy/pandas scalar to a native JSON-safe value."""
+    if val is None or val is pd.NaT or val is pd.NA:
+        return None
+    # Before np.integer: timedelta64 is a numpy signed integer type
+    if isinstance(val, np.timedelta64):
+        return None if np.isnat(val) else _durations(pd.Timedelta(val))
+    if isinstance(val, np.integer):
+        return int(val)
+    if isinstance(val, np.floating):
+        return None if np.isnan(val) else float(val)
+    if isinstance(val, np.bool_):
+        return bool(val)
+    if isinstance(val, pd.Timestamp):
+        return val.isoformat()
+    if isinstance(val, timedelta):
+        return _durations(val)
+    if isinstance(val, float) and np.isnan(val):
+        return None
+    return val
+
+
+def _datetime_column(series: pd.Series) -> list:
+    if series.dt.tz is not None:
+        return [_clean_scalar(v) for v in series.tolist()]
+    values = series.to_numpy(dtype='datetime64[ns]')
+    nat = np.isnat(values)
+    out = np.datetime_as_string(values, unit='s').astype(object)
+    # Like Timestamp.isoformat(): fractional digits only on the values that have them
+    fraction = values.view('int64') % 1_000_000_000
+    for unit, mask in (('us', fraction % 1000 == 0), ('ns', fraction % 1000 != 0)):
+        mask &= (fraction != 0) & ~nat
+        if mask.any():
+            out[mask] = np.datetime_as_string(values[mask], unit=unit)
+    out[nat] = None
+    return out.tolist()
+
+
+def column_to_list(series: pd.Series) -> list:
+    """
+    Convert a whole column to a list of native Python values in one pass.
+    NaN/NaT/NA become None, datetimes become ISO strings (matching
+    sanitize_for_json) and timedeltas ISO durations (as pydantic wrote them).
+    """
+    dtype = series.dtype
+    kind = getattr(dtype, 'kind', 'O')
+
+    if isinstance(dtype, np.dtype) and kind in 'biu':
+        return series.to_numpy().tolist()
+
+    if isinstance(dtype, np.dtype) and kind == 'f':
+        values = series.to_numpy()
+        nan_mask = np.isnan(values)
+        if not nan_mask.any():
+            return values.tolist()
+        out = values.astype(object)
+        out[nan_mask] = None
+        return out.tolist()
+
+    if kind == 'M':
+        return _datetime_column(series)
+
+    if kind == 'm':
+        out = series.to_numpy(dtype=object, copy=True)
+        out[series.isna().to_numpy()] = None
+        return _durations(out.tolist())
+
+    out = series.to_numpy(dtype=object, copy=True)
+    out[series.isna().to_numpy()] = None
+    values = out.tolist()
+    if any(isinstance(v, (np.generic, pd.Timestamp, timedelta)) for v in values):
+        values = [_clean_scalar(v) for v in values]
+    return values
+
+
+def frame_to_columns(df: pd.DataFrame) -> dict[str, list]:
+    """Columnar payload: {column name: [values...]} with JSON-safe values."""
+    return {str(col): column_to_list(df.iloc[:, i]) for i, col in enumerate(df.columns)}
+
+
+def frame_to_records(df: pd.DataFrame) -> list[dict]:
+    """Row payload equivalent to sanitize_for_json(df.to_dict(orient='records'))."""
+    columns = frame_to_columns(df)
+    keys = list(columns.keys())
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+
+def frame_to_payload(df: pd.DataFrame, orient: str = "records") -> tuple[list[str], Any]:
+    """Return (column names, data) for a query response in the requested orientation."""
+    columns = [str(c) for c in df.columns]
+    if orient == "columns":
+        return columns, frame_to_columns(df)
+    return columns, frame_to_records(df)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.isoformat()
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    if isinstance(obj, timedelta):
+        return _durations(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode with orjson; NaN/Infinity are written as null."""
+    return orjson.dumps(
+        obj,
+        default=_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with orjson.
+    Returning this from an endpoint bypasses response_model re-validation, so
+    callers are responsible for building payloads that match the declared schema.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ---------------------------------------------------------------------------
+# Binary result formats (Arrow IPC stream / Parquet)
+# ---------------------------------------------------------------------------
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# Arrow bodies are IPC streams; application/vnd.apache.arrow.file (the random
+# access file format, which stream bodies are not) is left to fall back to JSON
+_BINARY_MEDIA_TYPES = {
+    ARROW_STREAM_MEDIA_TYPE: "arrow",
+    "application/x-arrow": "arrow",
+    PARQUET_MEDIA_TYPE: "parquet",
+    "application/x-parquet": "parquet",
+}
+
+
+def negotiate_binary_format(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick "arrow" or "parquet" from an Accept header, or None for JSON.
+    Media ranges are honoured in q-value order; anything unrecognised means JSON.
+    """
+    if not accept:
+        return None
+    ranked = []
+    for i, part in enumerate(accept.split(',')):
+        media_type, *params = [p.strip() for p in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranked.append((-q, i, media_type.lower()))
+    for neg_q, _, media_type in sorted(ranked):
+        if neg_q == 0:
+            break
+        if media_type in _BINARY_MEDIA_TYPES:
+            return _BINARY_MEDIA_TYPES[media_type]
+        if media_type in ("application/json", "*/*", "application/*"):
+            return None
+    return None
+
+
+def frame_to_arrow_table(df: pd.DataFrame, metadata: Optional[dict[str, Any]] = None):
+    """
+    Build a pyarrow Table straight from the result frame.
+    Object columns that Arrow cannot infer a single type for (e.g. numbers mixed
+    with a 'Grand Total' label) are encoded as strings.
+    """
+    import pyarrow as pa
+
+    frame = df.copy(deep=False)
+    frame.columns = [str(c) for c in frame.columns]
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        for col in frame.columns:
+            if frame[col].dtype == object:
+                mask = frame[col].isna()
+                frame[col] = frame[col].astype(str).where(~mask, None)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+
+    if metadata:
+        schema_meta = dict(table.schema.metadata or {})
+        schema_meta[b'dpdgpt'] = dumps(metadata)
+        table = table.replace_schema_metadata(schema_meta)
+    return table
+
+
+def frame_to_arrow_ipc(df: pd.DataFrame, metadata: Optional[dict[str, Any]] = None) -> bytes:
+    """Encode a result frame as an Arrow IPC stream."""
+    import pyarrow as pa
+
+    table = frame_to_arrow_table(df, metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_to_parquet(df: pd.DataFrame, metadata: Optional[dict[str, Any]] = None) -> bytes:
+    """Encode a result frame as Parquet bytes (snappy-compressed)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = frame_to_arrow_table(df, metadata)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression='snappy')
+    return sink.getvalue().to_pybytes()
+
+
+def binary_frame_response(
+    df: pd.DataFrame,
+    fmt: str,
+    metadata: Optional[dict[str, Any]] = None,
+    filename: Optional[str] = None,
+) -> Response:
+    """
+    Response carrying the frame as Arrow IPC or Parquet.
+    Query metadata (question, chart, generated code) is stored in the Arrow
+    schema metadata under the 'dpdgpt' key; the row count is also sent as a header.
+    """
+    if fmt == "parquet":
+        body, media_type, ext = frame_to_parquet(df, metadata), PARQUET_MEDIA_TYPE, "parquet"
+    else:
+        body, media_type, ext = frame_to_arrow_ipc(df, metadata), ARROW_STREAM_MEDIA_TYPE, "arrow"
+
+    headers = {"X-Row-Count": str(len(df)), "Vary": "Accept"}
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}.{ext}"
+    return Response(content=body, media_type=media_type, headers=headers)
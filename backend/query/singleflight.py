@@ -0,0 +1,89 @@
+"""
+Coalescing of identical in-flight work ("singleflight").
+
+The first caller for a key becomes the leader and runs the function; callers
+arriving with the same key while it runs wait for and share its result
+instead of repeating the LLM call and execution.
+"""
+import threading
+from typing import Any, Callable, Hashable, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, retry_on: tuple = ()):
+        # Leader exceptions of these types are not shared; followers retry instead
+        # (e.g. the leader's client disconnected and its run was cancelled).
+        self._retry_on = retry_on
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        on_wait: Optional[Callable[[], None]] = None,
+        check: Optional[Callable[[], None]] = None,
+    ) -> tuple[Any, bool]:
+        """
+        Run fn() once per concurrent key. Returns (value, shared) where shared is
+        True for followers. Followers call on_wait once when they start waiting and
+        check() periodically while waiting; an exception from check() abandons the wait.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.leaders += 1
+                    leader = True
+                else:
+                    call.followers += 1
+                    self.followers += 1
+                    leader = False
+
+            if leader:
+                try:
+                    call.value = fn()
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._calls.pop(key, None)
+                    call.done.set()
+                return call.value, False
+
+            if on_wait is not None:
+                on_wait()
+            while not call.done.wait(0.25):
+                if check is not None:
+                    check()
+            if call.error is None:
+                return call.value, True
+            if isinstance(call.error, self._retry_on):
+                continue
+            raise call.error
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+            waiting = sum(c.followers for c in self._calls.values())
+        total = self.leaders + self.followers
+        return {
+            "in_flight": in_flight,
+            "waiting_followers": waiting,
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_rate": round(self.followers / total, 4) if total else 0.0,
+        }
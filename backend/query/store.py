@@ -0,0 +1,115 @@
+import re
+import uuid
+from typing import Optional
+
+import pandas as pd
+
+from backend.cache import BudgetedLRUCache
+from backend.config import settings
+
+
+def _frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+_store: Optional[BudgetedLRUCache] = None
+
+
+def get_result_store() -> BudgetedLRUCache:
+    global _store
+    if _store is None:
+        _store = BudgetedLRUCache(
+            max_bytes=settings.result_store_max_mb * 1024 * 1024,
+            sizeof=_frame_bytes,
+            ttl_seconds=settings.result_store_ttl_seconds,
+        )
+    return _store
+
+
+def save_result(df: pd.DataFrame) -> Optional[str]:
+    """Keep a query result server-side; returns its id, or None if it exceeds the budget."""
+    result_id = uuid.uuid4().hex
+    if not get_result_store().put(result_id, df):
+        return None
+    return result_id
+
+
+def get_result(result_id: str) -> Optional[pd.DataFrame]:
+    return get_result_store().get(result_id)
+
+
+def delete_result(result_id: str) -> bool:
+    return get_result_store().pop(result_id)
+
+
+_FILTER_RE = re.compile(r'^(?P<col>.+?)\s*(?P<op>!=|>=|<=|=|>|<)\s*(?P<value>.*)$')
+
+
+def _split_grand_total(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Separate a trailing 'Grand Total' row so it stays last after sorting."""
+    if df.empty or len(df.columns) == 0:
+        return df, df.iloc[0:0]
+    is_total = df.iloc[:, 0].astype(str).str.contains('Grand Total', na=False)
+    return df[~is_total], df[is_total]
+
+
+def _apply_filter(df: pd.DataFrame, expr: str) -> pd.DataFrame:
+    match = _FILTER_RE.match(expr)
+    if not match or match.group('col') not in df.columns:
+        raise ValueError(f"Invalid filter: {expr!r}. Use 'Column=value' (ops: = != > >= < <=)")
+    col, op, raw = match.group('col'), match.group('op'), match.group('value').strip()
+    series = df[col]
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"Filter value for numeric column {col!r} must be a number: {raw!r}")
+    else:
+        series = series.astype(str)
+        value = raw
+
+    ops = {
+        '=': series == value,
+        '!=': series != value,
+        '>': series > value,
+        '>=': series >= value,
+        '<': series < value,
+        '<=': series <= value,
+    }
+    return df[ops[op]]
+
+
+def query_result(
+    df: pd.DataFrame,
+    filters: Optional[list[str]] = None,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+) -> pd.DataFrame:
+    """
+    Filter, search and sort a stored result. The Grand Total row is kept as the
+    last row when sorting, and dropped once rows are filtered out (it no longer
+    matches the visible rows).
+    """
+    rows, grand_total = _split_grand_total(df)
+
+    narrowed = False
+    for expr in filters or []:
+        rows = _apply_filter(rows, expr)
+        narrowed = True
+
+    if search:
+        text = rows.astype(str)
+        hit = text.apply(lambda col: col.str.contains(search, case=False, regex=False)).any(axis=1)
+        rows = rows[hit]
+        narrowed = True
+
+    if sort_by:
+        if sort_by not in rows.columns:
+            raise ValueError(f"Unknown sort column: {sort_by!r}")
+        rows = rows.sort_values(sort_by, ascending=ascending, kind='stable')
+
+    if narrowed or grand_total.empty:
+        return rows
+    return pd.concat([rows, grand_total])
@@ -0,0 +1,139 @@
+"""
+Dry run of generated code on a stratified sample of the snapshot.
+
+Catches broken code (syntax errors, imports, unknown columns) in
+milliseconds, before the full-data execution. Outcomes:
+
+- passed:        ran on the sample; the full run goes ahead
+- failed:        an error the full data would raise too; the full run is skipped
+- inconclusive:  an error that may be specific to the sample (empty
+                 filters, missing labels, a name only assigned inside a loop
+                 over rows the sample lacks, no `result` or no columns,
+                 division by zero); the full run decides
+- skipped:       validation disabled, or the frame is too small to be worth it
+"""
+import re
+import threading
+import time
+
+import pandas as pd
+
+from backend.config import settings
+from backend.data.sampling import get_validation_sample
+from backend.query.executor import dry_run_pandas_code, error_line
+from backend.stats import RollingStats
+
+STATUSES = ("passed", "failed", "inconclusive", "skipped")
+
+# Errors that do not depend on which rows are present. NameError,
+# AttributeError and ResultError can: a loop over an empty filter never
+# assigns its names, and methods and results differ with the dtypes and
+# shapes the rows produce.
+_DATA_INDEPENDENT = (SyntaxError, ImportError)
+# groupby()[...] reports missing columns as "Column not found: <label>"
+_COLUMN_NOT_FOUND = re.compile(r'^Columns? not found: ')
+# Frames this small are executed directly
+_MIN_ROWS_FACTOR = 4
+
+_counts = {status: 0 for status in STATUSES}
+# Full runs that failed after the dry run passed / was inconclusive
+_full_failures = {"passed": 0, "inconclusive": 0}
+_dry_run_ms = RollingStats()
+_lock = threading.Lock()
+
+
+def _is_known_label(label: str, df: pd.DataFrame) -> bool:
+    """Whether label is a column or a value of any string column of the full frame."""
+    if label in df.columns:
+        return True
+    for col in df.columns:
+        series = df[col]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        if (series == label).any():
+            return True
+    return False
+
+
+def _classify(exc: Exception, df: pd.DataFrame) -> str:
+    if isinstance(exc, _DATA_INDEPENDENT):
+        return "failed"
+    if isinstance(exc, KeyError):
+        # A label that is neither a column nor a value anywhere in the data
+        # is missing from the full run too
+        labels = [_COLUMN_NOT_FOUND.sub('', label) for label in re.findall(r"'([^']*)'", str(exc))]
+        if labels and not any(_is_known_label(label, df) for label in labels):
+            return "failed"
+    return "inconclusive"
+
+
+def _warnings(result: pd.DataFrame, sample: pd.DataFrame, df: pd.DataFrame) -> list[str]:
+    warnings = []
+    if not result.columns.is_unique:
+        warnings.append("duplicate column names in result")
+    if len(result) >= len(sample) and len(df) > len(sample):
+        warnings.append(f"row-level result: about {len(df):,} rows on the full data")
+    return warnings
+
+
+def _report(status: str, start: float, sample_rows: int, **fields) -> dict:
+    ms = round((time.perf_counter() - start) * 1000, 2)
+    with _lock:
+        _counts[status] += 1
+    if status != "skipped":
+        _dry_run_ms.add(ms)
+    report = {
+        "status": status,
+        "ms": ms,
+        "sample_rows": sample_rows,
+        "error": None,
+        "error_type": None,
+        "line": None,
+        "result_shape": None,
+        "warnings": [],
+    }
+    report.update(fields)
+    return report
+
+
+def validate_on_sample(code: str, df: pd.DataFrame) -> dict:
+    """Dry-run code on a stratified sample of df; returns the validation report."""
+    start = time.perf_counter()
+    if not settings.validate_on_sample or len(df) <= settings.validation_sample_rows * _MIN_ROWS_FACTOR:
+        return _report("skipped", start, 0)
+
+    sample = get_validation_sample(df)
+    try:
+        result = dry_run_pandas_code(code, sample)
+    except Exception as e:
+        return _report(_classify(e, df), start, len(sample), error=str(e), error_type=type(e).__name__, line=error_line(e))
+
+    if len(result.columns) == 0:
+        return _report("inconclusive", start, len(sample), error="Result has no columns",
+                       error_type="ResultError", result_shape=[len(result), 0])
+    return _report(
+        "passed", start, len(sample),
+        result_shape=[len(result), len(result.columns)],
+        warnings=_warnings(result, sample, df),
+    )
+
+
+def record_full_run(status: str, succeeded: bool) -> None:
+    """Track full executions that failed although the dry run let them through."""
+    if not succeeded and status in _full_failures:
+        with _lock:
+            _full_failures[status] += 1
+
+
+def validation_stats() -> dict:
+    with _lock:
+        counts = dict(_counts)
+        full_failures = dict(_full_failures)
+    validated = sum(counts[status] for status in ("passed", "failed", "inconclusive"))
+    return {
+        **counts,
+        "failed_rate": round(counts["failed"] / validated, 4) if validated else 0.0,
+        "full_failures_after_pass": full_failures["passed"],
+        "full_failures_after_inconclusive": full_failures["inconclusive"],
+        "dry_run_ms": _dry_run_ms.summary(),
+    }
@@ -0,0 +1,172 @@
+import io
+import queue
+import threading
+import zlib
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+GZIP_MEDIA_TYPE = "application/gzip"
+
+# Rows converted per slice of the frame; bounds the Python objects alive at once.
+_ROW_CHUNK = 20_000
+# Rows per CSV chunk; small enough that the first bytes go out quickly.
+_CSV_CHUNK = 5_000
+# Chunks buffered between the workbook writer thread and the response.
+_QUEUE_DEPTH = 8
+
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = _CSV_CHUNK) -> Iterator[bytes]:
+    """CSV bytes, one chunk per slice of rows (header in the first chunk)."""
+    if df.empty:
+        yield df.to_csv(index=False).encode('utf-8')
+        return
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=(start == 0)).encode('utf-8')
+
+
+def iter_gzip(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def _excel_columns(chunk: pd.DataFrame) -> list[list]:
+    columns = []
+    for i in range(chunk.shape[1]):
+        series = chunk.iloc[:, i]
+        if series.dtype.kind == 'M':
+            if series.dt.tz is not None:
+                series = series.dt.tz_localize(None)
+            values = series.astype(object).where(series.notna(), None).tolist()
+        else:
+            values = series.to_numpy(dtype=object, copy=True)
+            values[series.isna().to_numpy()] = None
+            values = [v.item() if isinstance(v, np.generic) else v for v in values]
+        columns.append(values)
+    return columns
+
+
+def _write_workbook(df: pd.DataFrame, fileobj, sheet_name: str) -> None:
+    """Write df with a write-only (constant memory) openpyxl workbook."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_name)
+
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    for start in range(0, len(df), _ROW_CHUNK):
+        for row in zip(*_excel_columns(df.iloc[start:start + _ROW_CHUNK])):
+            ws.append(row)
+
+    wb.save(fileobj)
+
+
+class _ExportCancelled(Exception):
+    pass
+
+
+class _QueueWriter(io.RawIOBase):
+    """Non-seekable file object that hands written bytes to a bounded queue."""
+
+    def __init__(self, q: "queue.Queue", chunk_size: int, cancelled: threading.Event):
+        self._q = q
+        self._chunk_size = chunk_size
+        self._cancelled = cancelled
+        self._buf = bytearray()
+        self._discarding = False
+
+    def writable(self) -> bool:
+        return True
+
+    def _put(self, item: bytes) -> None:
+        while True:
+            if self._cancelled.is_set():
+                # Drop anything written during cleanup (e.g. ZipFile.__del__)
+                self._discarding = True
+                raise _ExportCancelled()
+            try:
+                self._q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, b) -> int:
+        if self._discarding:
+            return len(b)
+        self._buf += b
+        if len(self._buf) >= self._chunk_size:
+            self._put(bytes(self._buf))
+            self._buf.clear()
+        return len(b)
+
+    def flush(self) -> None:
+        if self._buf and not self._discarding:
+            self._put(bytes(self._buf))
+            self._buf.clear()
+
+
+def iter_xlsx(df: pd.DataFrame, sheet_name: str = 'Query Results', chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Stream an .xlsx workbook. The workbook is written in a background thread
+    straight into a bounded queue, so bytes reach the client while the zip
+    container is still being produced and memory stays flat.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=_QUEUE_DEPTH)
+    cancelled = threading.Event()
+    done = object()
+    error: list[BaseException] = []
+
+    def produce():
+        writer = _QueueWriter(q, chunk_size, cancelled)
+        try:
+            _write_workbook(df, writer, sheet_name)
+            writer.flush()
+        except _ExportCancelled:
+            return
+        except BaseException as e:
+            error.append(e)
+        try:
+            writer._put(done)
+        except _ExportCancelled:
+            pass
+
+    threading.Thread(target=produce, name='xlsx-export', daemon=True).start()
+
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        # Client went away (or we finished): let a blocked producer exit
+        cancelled.set()
+
+    if error:
+        raise error[0]
+
+
+def export_stream(df: pd.DataFrame, fmt: str) -> tuple[Iterator[bytes], str, str]:
+    """Return (byte iterator, media type, file extension) for an export format."""
+    if fmt == 'csv':
+        return iter_csv(df), CSV_MEDIA_TYPE, 'csv'
+    if fmt == 'csv.gz':
+        return iter_gzip(iter_csv(df)), GZIP_MEDIA_TYPE, 'csv.gz'
+    return iter_xlsx(df), XLSX_MEDIA_TYPE, 'xlsx'
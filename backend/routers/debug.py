@@ -0,0 +1,106 @@
+from fastapi import APIRouter
+
+from backend.data.channels import flag_store_stats
+from backend.data.loader import get_dataframe
+from backend.data.rollups import rollup_stats
+from backend.llm.prompt import (
+    CODE_GENERATION_PROMPT_PREFIX,
+    DIRECT_QUERY_PROMPT_PREFIX,
+    PREVIEW_PROMPT_PREFIX,
+    get_code_generation_prompt,
+    get_direct_query_prompt,
+    get_preview_prompt,
+)
+from backend.llm.telemetry import llm_stats
+from backend.llm.tokens import prompt_token_report
+from backend.query.approximate import approximate_stats
+from backend.query.columns import pruning_stats
+from backend.query.optimizer import optimizer_stats
+from backend.query.pipeline import coalescing_stats
+from backend.query.predicates import predicate_cache_stats
+from backend.query.repair import repair_stats
+from backend.query.validation import validation_stats
+from backend.timing import TimedRoute, endpoint_timings
+
+router = APIRouter(prefix="/debug", route_class=TimedRoute)
+
+
+@router.get("/coalescing")
+async def get_coalescing_stats():
+    """In-flight and lifetime counts of coalesced (shared) query runs."""
+    return coalescing_stats()
+
+
+@router.get("/prompts")
+def get_prompt_layout():
+    """Static-prefix vs. snapshot token split of each system prompt (user message excluded)."""
+    df = get_dataframe()
+    prompts = {
+        "preview": (get_preview_prompt(df), PREVIEW_PROMPT_PREFIX),
+        "direct": (get_direct_query_prompt(df), DIRECT_QUERY_PROMPT_PREFIX),
+        "code_generation": (get_code_generation_prompt(df), CODE_GENERATION_PROMPT_PREFIX),
+    }
+    return {
+        name: prompt_token_report(system_prompt, "", prefix)
+        for name, (system_prompt, prefix) in prompts.items()
+    }
+
+
+@router.get("/llm")
+async def get_llm_stats():
+    """Per call type: calls, errors, retries, cache hit rate and latency/TTFT/token percentiles."""
+    return llm_stats()
+
+
+@router.get("/timings")
+async def get_timings():
+    """Per-endpoint p50/p95/p99 of total request time and of each stage (ms)."""
+    return endpoint_timings()
+
+
+@router.get("/optimizer")
+async def get_optimizer_stats():
+    """Per rewrite: times applied to generated code and fast-path vs. fallback runs."""
+    return optimizer_stats()
+
+
+@router.get("/pruning")
+async def get_pruning_stats():
+    """How often generated code ran on a pruned frame, and why it kept the full frame otherwise."""
+    return pruning_stats()
+
+
+@router.get("/validation")
+async def get_validation_stats():
+    """Dry-run outcomes (passed/failed/inconclusive/skipped), misses and dry-run latency."""
+    return validation_stats()
+
+
+@router.get("/repair")
+async def get_repair_stats():
+    """Self-repair loop: success rate, attempts, early stops and added latency."""
+    return repair_stats()
+
+
+@router.get("/approximate")
+async def get_approximate_stats():
+    """Approximate-mode runs (sampled, exact on small frames, row-level) and their latency."""
+    return approximate_stats()
+
+
+@router.get("/predicates")
+async def get_predicate_cache_stats():
+    """Filter-mask cache: entries, memory, hit rate, predicates rewritten and warmed from previews."""
+    return predicate_cache_stats()
+
+
+@router.get("/flags")
+def get_flag_store_stats():
+    """Packed flag store: flags, rows and bytes against the int64 columns it mirrors."""
+    return flag_store_stats()
+
+
+@router.get("/rollups")
+def get_rollup_stats():
+    """Precomputed date rollups: rows per (date column, grain) table and their memory."""
+    return rollup_stats()
@@ -1,28 +1,40 @@
-from io import BytesIO
+from datetime import datetime
+from typing import Optional
 
 import pandas as pd
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import Response, StreamingResponse
 
+from backend.query.serialize import negotiate_binary_format, binary_frame_response
+from backend.query.writers import export_stream
 from backend.schemas import ExportRequest
+from backend.timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
-@router.post("/export")
-async def export_excel(req: ExportRequest):
-    df = pd.DataFrame(req.data, columns=req.columns)
+def export_frame(df: pd.DataFrame, accept: Optional[str] = None, fmt: str = "xlsx") -> Response:
+    """
+    Streamed download of a frame as xlsx, csv or csv.gz, or Arrow/Parquet when
+    the Accept header asks for it.
+    """
+    basename = f"query_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Query Results')
-    output.seek(0)
+    binary_format = negotiate_binary_format(accept)
+    if binary_format:
+        return binary_frame_response(df, binary_format, filename=basename)
 
-    from datetime import datetime
-    filename = f"query_result_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    chunks, media_type, ext = export_stream(df, fmt)
+    filename = f"{basename}.{ext}"
 
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        chunks,
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
+
+
+@router.post("/export")
+async def export_excel(req: ExportRequest, request: Request):
+    df = pd.DataFrame(req.data, columns=req.columns)
+    return export_frame(df, request.headers.get('accept'), req.format)
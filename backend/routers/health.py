@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+
+from backend.query.serialize import FastJSONResponse
+from backend.startup import readiness
+
+router = APIRouter()
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving requests."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """Readiness: data loaded and warm-up finished (503 until then, with the startup phase)."""
+    ready, report = readiness()
+    return FastJSONResponse(report, status_code=200 if ready else 503)
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException
+
+from backend.query.jobs import QueueFullError, get_job_queue
+from backend.query.pipeline import run_direct_query, run_confirm_query
+from backend.query.serialize import FastJSONResponse
+from backend.schemas import JobSubmitRequest, JobStatusResponse
+from backend.timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+def _status(job: dict) -> JobStatusResponse:
+    return JobStatusResponse(
+        queue_position=get_job_queue().position(job["job_id"]),
+        **{k: v for k, v in job.items() if not k.startswith('_') and k != 'payload'},
+    )
+
+
+def _load(job_id: str) -> dict:
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.post("/jobs", response_model=JobStatusResponse, status_code=202)
+async def submit_job(req: JobSubmitRequest):
+    if req.kind == "confirm":
+        def run(ctx):
+            return run_confirm_query(req.question, req.confirmed_logic, req.preview_data, ctx)
+    else:
+        def run(ctx):
+            return run_direct_query(req.question, ctx)
+
+    try:
+        job = get_job_queue().submit(
+            req.kind, run,
+            priority=req.priority,
+            orient=req.orient,
+            include_sql=req.kind == "confirm",
+            question=req.question,
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return _status(job)
+
+
+@router.get("/jobs/stats")
+async def job_stats():
+    return get_job_queue().stats()
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def job_status(job_id: str):
+    return _status(_load(job_id))
+
+
+@router.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = _load(job_id)
+    if job["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    if job["payload"] is None:
+        raise HTTPException(status_code=410, detail=job["error"] or f"Job {job['status']}")
+    return FastJSONResponse(job["payload"])
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    _load(job_id)
+    if not get_job_queue().cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return {"cancelled": job_id}
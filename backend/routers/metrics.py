@@ -1,15 +1,26 @@
-from fastapi import APIRouter
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
 
 import pandas as pd
 
+from backend.data.channels import channel_summary
 from backend.data.loader import get_dataframe
-from backend.schemas import MetricsResponse, RegionsResponse, RegionData, BucketsResponse, BucketData
+from backend.data.rollups import CASES, GRAINS, rolled_up_columns, trend
+from backend.schemas import (
+    MetricsResponse, RegionsResponse, RegionData, BucketsResponse, BucketData,
+    ChannelsResponse, ChannelData, TrendsResponse, TrendPoint,
+)
+from backend.timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
 
-router = APIRouter()
+# Plain def handlers: they run on the threadpool, so waiting for the snapshot
+# (still loading with settings.background_startup) never blocks the event loop.
 
 
 @router.get("/metrics", response_model=MetricsResponse)
-async def get_metrics():
+def get_metrics():
     df = get_dataframe()
 
     total_cases = len(df)
@@ -59,7 +70,7 @@ async def get_metrics():
 
 
 @router.get("/regions", response_model=RegionsResponse)
-async def get_regions():
+def get_regions():
     df = get_dataframe()
 
     if 'Region' not in df.columns:
@@ -90,7 +101,7 @@ async def get_regions():
 
 
 @router.get("/buckets", response_model=BucketsResponse)
-async def get_buckets():
+def get_buckets():
     df = get_dataframe()
 
     if 'DPD Bucket' not in df.columns:
@@ -121,3 +132,59 @@ async def get_buckets():
             ))
 
     return BucketsResponse(buckets=buckets, total_cases=total)
+
+
+@router.get("/channels", response_model=ChannelsResponse)
+def get_channels(by: Optional[str] = None):
+    """Attempt / connect coverage and PTP generation / conversion per channel, optionally per `by` column."""
+    try:
+        summaries = channel_summary(by)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown column: {by}")
+    return ChannelsResponse(by=by, channels=[ChannelData(**summary) for summary in summaries])
+
+
+@router.get("/trends", response_model=TrendsResponse)
+def get_trends(
+    date_column: Optional[str] = None,
+    grain: str = "month",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    """Collection and contact trend per day / week / month of a date column, from the precomputed rollups."""
+    if grain not in GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain must be one of {GRAINS}")
+    try:
+        table = trend(date_column, grain, start, end)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"No rollup for date column: {date_column}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def value(row, col, cast=float):
+        return cast(row[col]) if col in table.columns else cast(0)
+
+    points = [
+        TrendPoint(
+            period=period.strftime('%Y-%m-%d'),
+            cases=value(row, CASES, int),
+            aum=value(row, 'POS'),
+            collection=value(row, 'Collected Amount'),
+            resolved=value(row, 'Resolved', int),
+            attempted=value(row, 'Overall Attempted', int),
+            contacted=value(row, 'Overall Contactable', int),
+            ptp=value(row, 'Overall PTP', int),
+            amount_efficiency=value(row, 'Amount Efficiency'),
+            resolution_rate=value(row, 'Resolution Rate'),
+            connect_coverage=value(row, 'Connect Coverage'),
+            ptp_generation=value(row, 'PTP Generation'),
+        )
+        for period, row in table.iterrows()
+    ]
+    columns = rolled_up_columns()
+    return TrendsResponse(
+        date_column=date_column or (columns[0] if columns else None),
+        grain=grain,
+        date_columns=columns,
+        points=points,
+    )
@@ -1,84 +1,95 @@
-from fastapi import APIRouter
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from backend.config import settings
 from backend.data.loader import get_dataframe
-from backend.llm.prompt import get_direct_query_prompt, get_preview_prompt, build_code_generation_prompt
-from backend.llm.client import query_llm, parse_query, generate_code, modify_logic
-from backend.query.executor import execute_pandas_code, detect_chart_type, sanitize_for_json
+from backend.llm.prompt import get_preview_prompt
+from backend.llm.client import parse_query, modify_logic
+from backend.query.batch import dedupe_questions
+from backend.query.jobs import QueueFullError, get_job_queue
+from backend.query.pipeline import (
+    PipelineCancelled, PipelineContext, run_direct_query, run_confirm_query, run_generated_code,
+    outcome_payload,
+)
+from backend.query.serialize import FastJSONResponse, dumps, negotiate_binary_format, binary_frame_response
+from backend.timing import TimedRoute, timed
 from backend.schemas import (
-    QueryRequest, QueryResponse, ChartSpec,
+    QueryRequest, QueryResponse, BatchQueryRequest,
     PreviewRequest, PreviewResponse, OutputColumn,
     ConfirmRequest, ConfirmResponse,
     ModifyLogicRequest, ModifyLogicResponse,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
-# ---------------------------------------------------------------------------
-# Existing direct one-shot query (backward compat)
-# ---------------------------------------------------------------------------
+def _respond(outcome: dict, request: Request, orient: str, include_sql: bool, max_rows: Optional[int] = None):
+    """
+    JSON (or Arrow/Parquet, if negotiated) response for a pipeline outcome.
+    Encodes the whole result: call it through run_in_threadpool.
+    """
+    with timed("serialize"):
+        return _build_response(outcome, request, orient, include_sql, max_rows)
 
-@router.post("/query", response_model=QueryResponse)
-async def run_query(req: QueryRequest):
-    df = get_dataframe()
-    system_prompt = get_direct_query_prompt(df)
 
-    try:
-        generated_code = query_llm(req.question, system_prompt)
-    except Exception as e:
-        return QueryResponse(
-            success=False,
-            question=req.question,
-            row_count=0,
-            columns=[],
-            data=[],
-            chart=None,
-            generated_code="",
-            error=f"LLM error: {str(e)}",
-        )
+def _build_response(outcome: dict, request: Request, orient: str, include_sql: bool, max_rows: Optional[int] = None):
+    binary_format = negotiate_binary_format(request.headers.get('accept'))
+    if binary_format and outcome["success"]:
+        metadata = {
+            "question": outcome["question"],
+            "chart": outcome["chart"],
+            "chart_data": outcome["chart_data"],
+            "generated_code": outcome["generated_code"],
+            "result_id": outcome["result_id"],
+        }
+        if include_sql:
+            metadata["sql_code"] = outcome["sql_code"]
+        return binary_frame_response(outcome["result"], binary_format, metadata=metadata)
+
+    return FastJSONResponse(outcome_payload(outcome, orient, include_sql, max_rows))
 
-    # Check if LLM indicated it cannot answer
-    if generated_code.strip().startswith('# CANNOT_ANSWER:'):
-        reason = generated_code.strip().replace('# CANNOT_ANSWER:', '').strip()
-        return QueryResponse(
-            success=False,
-            question=req.question,
-            row_count=0,
-            columns=[],
-            data=[],
-            chart=None,
-            generated_code="",
-            error=reason,
-        )
 
+def _refine(outcome: dict, orient: str, include_sql: bool) -> dict:
+    """
+    Queue the exact run of a successful approximate answer's code as a
+    low-priority job and reference it from the outcome's approximate report.
+    """
+    approximate = outcome["approximate"]
+    if not outcome["success"] or approximate is None or approximate["exact"]:
+        return outcome
+    df = get_dataframe()
+    question, code, sql_code = outcome["question"], outcome["generated_code"], outcome["sql_code"]
     try:
-        result = execute_pandas_code(generated_code, df)
-    except Exception as e:
-        return QueryResponse(
-            success=False,
-            question=req.question,
-            row_count=0,
-            columns=[],
-            data=[],
-            chart=None,
-            generated_code=generated_code,
-            error=f"Execution error: {str(e)}",
+        job = get_job_queue().submit(
+            "refine",
+            lambda ctx: run_generated_code(question, code, ctx, sql_code=sql_code, df=df),
+            priority="low", orient=orient, include_sql=include_sql, question=question,
         )
+    except QueueFullError:
+        return outcome
+    # Coalesced runs share the outcome: copy before attaching this request's job
+    return {**outcome, "approximate": {**approximate, "refine_job_id": job["job_id"]}}
 
-    chart_spec_dict = detect_chart_type(result, req.question)
-    chart_spec = ChartSpec(**chart_spec_dict) if chart_spec_dict else None
 
-    data = sanitize_for_json(result.to_dict(orient='records'))
+# ---------------------------------------------------------------------------
+# Existing direct one-shot query (backward compat)
+# ---------------------------------------------------------------------------
 
-    return QueryResponse(
-        success=True,
-        question=req.question,
-        row_count=len(result),
-        columns=list(result.columns),
-        data=data,
-        chart=chart_spec,
-        generated_code=generated_code,
-    )
+@router.post("/query", response_model=QueryResponse)
+async def run_query(req: QueryRequest, request: Request):
+    ctx = PipelineContext(profile=req.profile, approximate=req.approximate)
+    outcome = await run_in_threadpool(run_direct_query, req.question, ctx)
+    if req.refine:
+        outcome = _refine(outcome, req.orient, include_sql=False)
+    return await run_in_threadpool(_respond, outcome, request, req.orient, False, req.max_rows)
 
 
 # ---------------------------------------------------------------------------
@@ -87,10 +98,14 @@ async def run_query(req: QueryRequest):
 
 @router.post("/query/preview", response_model=PreviewResponse)
 async def query_preview(req: PreviewRequest):
-    df = get_dataframe()
-    system_prompt = get_preview_prompt(df)
+    with timed("get_dataframe"):
+        # Off the event loop: the first call waits for the snapshot to load
+        df = await run_in_threadpool(get_dataframe)
+    with timed("prompt"):
+        system_prompt = get_preview_prompt(df)
 
-    preview_data = parse_query(req.question, system_prompt)
+    with timed("llm"):
+        preview_data = await run_in_threadpool(parse_query, req.question, system_prompt)
 
     return PreviewResponse(
         grouping_column=preview_data.get('grouping_column', ''),
@@ -110,68 +125,193 @@ async def query_preview(req: PreviewRequest):
 
 
 @router.post("/query/confirm", response_model=ConfirmResponse)
-async def query_confirm(req: ConfirmRequest):
-    df = get_dataframe()
-
-    # Build the code generation prompt with confirmed logic
-    code_gen_prompt = build_code_generation_prompt(
-        df, req.question, req.confirmed_logic, req.preview_data
+async def query_confirm(req: ConfirmRequest, request: Request):
+    ctx = PipelineContext(profile=req.profile, approximate=req.approximate)
+    outcome = await run_in_threadpool(
+        run_confirm_query, req.question, req.confirmed_logic, req.preview_data, ctx
     )
+    if req.refine:
+        outcome = _refine(outcome, req.orient, include_sql=True)
+    return await run_in_threadpool(_respond, outcome, request, req.orient, True, req.max_rows)
 
-    try:
-        generated = generate_code(
-            f"Generate code for: {req.question}",
-            code_gen_prompt,
-        )
-    except Exception as e:
-        return ConfirmResponse(
-            success=False,
-            question=req.question,
-            row_count=0,
-            columns=[],
-            data=[],
-            chart=None,
-            generated_code="",
-            sql_code="",
-            error=f"LLM error: {str(e)}",
+
+@router.post("/query/modify-logic", response_model=ModifyLogicResponse)
+async def query_modify_logic(req: ModifyLogicRequest):
+    with timed("get_dataframe"):
+        df = await run_in_threadpool(get_dataframe)
+
+    with timed("llm"):
+        updated = await run_in_threadpool(modify_logic, req.current_logic, req.followup, df)
+
+    return ModifyLogicResponse(updated_logic=updated)
+
+
+# ---------------------------------------------------------------------------
+# Server-Sent Events variants: stage progress, optional LLM tokens, final result
+# ---------------------------------------------------------------------------
+
+def _sse_message(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+async def _stream_pipeline(
+    request: Request, run, orient: str, include_sql: bool, stream_tokens: bool, profile: bool = False,
+    approximate: bool = False, refine: bool = False, max_rows: Optional[int] = None,
+):
+    """
+    Run a pipeline in a worker thread and relay its events as SSE.
+    Events: stage (started/completed with ms), token (if requested), result,
+    error, done. With refine, the result of an approximate run names the job
+    computing the exact answer. If the client disconnects the run is cancelled at the next
+    stage boundary or LLM token, which also closes the upstream LLM stream.
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    cancel = threading.Event()
+    finished = object()
+
+    def emit(event: str, data: dict) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def work():
+        ctx = PipelineContext(
+            emit=emit, cancel_event=cancel, stream_tokens=stream_tokens, profile=profile, approximate=approximate,
         )
+        try:
+            outcome = run(ctx)
+            if refine:
+                outcome = _refine(outcome, orient, include_sql)
+            with ctx.stage("serialize"):
+                payload = outcome_payload(outcome, orient, include_sql, max_rows)
+            emit("result", payload)
+            emit("done", {"total_ms": ctx.elapsed_ms(), "timings": ctx.timings})
+        except PipelineCancelled:
+            pass
+        except Exception as e:
+            emit("error", {"error": str(e)})
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, finished)
 
+    # copy_context: the worker's stages belong to this request's timings
+    worker = loop.run_in_executor(None, contextvars.copy_context().run, work)
     try:
-        result = execute_pandas_code(generated['python'], df)
-    except Exception as e:
-        return ConfirmResponse(
-            success=False,
-            question=req.question,
-            row_count=0,
-            columns=[],
-            data=[],
-            chart=None,
-            generated_code=generated.get('python', ''),
-            sql_code=generated.get('sql', ''),
-            error=f"Execution error: {str(e)}",
-        )
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                # Comment line keeps proxies from timing out an idle stream
+                yield b": keep-alive\n\n"
+                continue
+            if item is finished:
+                break
+            yield _sse_message(*item)
+    finally:
+        cancel.set()
+        await asyncio.shield(worker)
+
 
-    chart_spec_dict = detect_chart_type(result, req.question)
-    chart_spec = ChartSpec(**chart_spec_dict) if chart_spec_dict else None
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
-    data = sanitize_for_json(result.to_dict(orient='records'))
 
-    return ConfirmResponse(
-        success=True,
-        question=req.question,
-        row_count=len(result),
-        columns=list(result.columns),
-        data=data,
-        chart=chart_spec,
-        generated_code=generated.get('python', ''),
-        sql_code=generated.get('sql', ''),
+@router.post("/query/stream")
+async def run_query_stream(req: QueryRequest, request: Request, tokens: bool = False):
+    return StreamingResponse(
+        _stream_pipeline(
+            request,
+            lambda ctx: run_direct_query(req.question, ctx),
+            req.orient, include_sql=False, stream_tokens=tokens, profile=req.profile,
+            approximate=req.approximate, refine=req.refine, max_rows=req.max_rows,
+        ),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
     )
 
 
-@router.post("/query/modify-logic", response_model=ModifyLogicResponse)
-async def query_modify_logic(req: ModifyLogicRequest):
-    df = get_dataframe()
+@router.post("/query/confirm/stream")
+async def query_confirm_stream(req: ConfirmRequest, request: Request, tokens: bool = False):
+    return StreamingResponse(
+        _stream_pipeline(
+            request,
+            lambda ctx: run_confirm_query(req.question, req.confirmed_logic, req.preview_data, ctx),
+            req.orient, include_sql=True, stream_tokens=tokens, profile=req.profile,
+            approximate=req.approximate, refine=req.refine, max_rows=req.max_rows,
+        ),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
 
-    updated = modify_logic(req.current_logic, req.followup, df)
 
-    return ModifyLogicResponse(updated_logic=updated)
+# ---------------------------------------------------------------------------
+# Batch questions: concurrent LLM fan-out, NDJSON results as they finish
+# ---------------------------------------------------------------------------
+
+@router.post("/query/batch")
+async def run_query_batch(req: BatchQueryRequest, request: Request):
+    """
+    Answer a list of questions in one call. Duplicates (ignoring case and
+    whitespace) are answered once. LLM calls run concurrently up to
+    BATCH_LLM_CONCURRENCY and all code executes against the same snapshot.
+    Streams one NDJSON line per distinct question as it completes
+    ({"indexes": [...], ...QueryResponse}), then a summary line.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(req.questions) > settings.batch_max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.batch_max_questions} questions per batch",
+        )
+
+    unique = dedupe_questions(req.questions)
+    df = await run_in_threadpool(get_dataframe)
+    llm_limiter = threading.Semaphore(settings.batch_llm_concurrency)
+    cancel = threading.Event()
+
+    def answer(question: str) -> tuple[str, Optional[dict]]:
+        ctx = PipelineContext(cancel_event=cancel, llm_limiter=llm_limiter)
+        try:
+            outcome = run_direct_query(question, ctx, df=df)
+            with ctx.stage("serialize"):
+                payload = outcome_payload(outcome, req.orient)
+        except PipelineCancelled:
+            return question, None
+        except Exception as e:
+            payload = {"success": False, "question": question, "error": str(e)}
+        payload["timings"] = ctx.timings
+        return question, payload
+
+    async def lines():
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(
+            max_workers=min(len(unique), settings.batch_max_workers),
+            thread_name_prefix="query-batch",
+        )
+        tasks = [
+            loop.run_in_executor(pool, contextvars.copy_context().run, answer, question)
+            for question in unique
+        ]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                question, payload = await next_done
+                if payload is None:
+                    continue
+                succeeded += bool(payload.get("success"))
+                yield dumps({"indexes": unique[question], **payload}) + b"\n"
+                if await request.is_disconnected():
+                    break
+            yield dumps({
+                "done": True,
+                "questions": len(req.questions),
+                "unique_questions": len(unique),
+                "succeeded": succeeded,
+                "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            }) + b"\n"
+        finally:
+            cancel.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,75 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from backend.query.serialize import FastJSONResponse, frame_to_payload
+from backend.query.store import get_result, delete_result, query_result
+from backend.routers.export import export_frame
+from backend.schemas import ExportFormat, ResultOrient, ResultPageResponse
+from backend.timing import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+# Plain def handlers: they run on the threadpool, so filtering, sorting,
+# serializing and exporting a stored frame never blocks the event loop.
+
+
+def _load(result_id: str):
+    df = get_result(result_id)
+    if df is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return df
+
+
+@router.get("/results/{result_id}", response_model=ResultPageResponse)
+def get_result_page(
+    result_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=10000),
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+    filter: List[str] = Query([], description="Column=value (ops: = != > >= < <=); repeatable"),
+    search: Optional[str] = None,
+    orient: ResultOrient = "records",
+):
+    df = _load(result_id)
+    try:
+        view = query_result(df, filters=filter, search=search, sort_by=sort_by, ascending=ascending)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    columns, data = frame_to_payload(view.iloc[offset:offset + limit], orient)
+
+    return FastJSONResponse({
+        "result_id": result_id,
+        "total_rows": len(view),
+        "offset": offset,
+        "limit": limit,
+        "columns": columns,
+        "data": data,
+    })
+
+
+@router.get("/results/{result_id}/export")
+def export_result(
+    result_id: str,
+    request: Request,
+    sort_by: Optional[str] = None,
+    ascending: bool = True,
+    filter: List[str] = Query([]),
+    search: Optional[str] = None,
+    format: ExportFormat = "xlsx",
+):
+    df = _load(result_id)
+    try:
+        view = query_result(df, filters=filter, search=search, sort_by=sort_by, ascending=ascending)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return export_frame(view, request.headers.get('accept'), format)
+
+
+@router.delete("/results/{result_id}")
+def discard_result(result_id: str):
+    if not delete_result(result_id):
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return {"deleted": result_id}
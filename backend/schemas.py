@@ -1,15 +1,34 @@
 from __future__ import annotations
 
-from pydantic import BaseModel
-from typing import Any, List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, List, Literal, Optional, Union
 
 
 # ---------------------------------------------------------------------------
 # Existing schemas (from collection-whisperer, backward compat)
 # ---------------------------------------------------------------------------
 
+# "records" returns data as a list of row dicts; "columns" as {column: [values]}
+ResultOrient = Literal["records", "columns"]
+ResultData = Union[List[dict[str, Any]], dict[str, List[Any]]]
+
+
 class QueryRequest(BaseModel):
     question: str
+    orient: ResultOrient = "records"
+    # Time each statement of the generated code and return a hotspot report
+    profile: bool = False
+    # Answer from a stratified sample, with confidence intervals
+    approximate: bool = False
+    # With approximate: also queue the exact run as a low-priority job
+    refine: bool = False
+    # Inline at most this many rows (the full table stays at /api/results/{result_id})
+    max_rows: Optional[int] = Field(None, ge=0)
+
+
+class ChartRollup(BaseModel):
+    date_column: str
+    grain: str
 
 
 class ChartSpec(BaseModel):
@@ -17,6 +36,80 @@ class ChartSpec(BaseModel):
     x_key: str
     y_keys: List[str]
     title: str
+    # Temporal line charts: the precomputed rollup the series corresponds to
+    rollup: Optional[ChartRollup] = None
+
+
+class ChartData(BaseModel):
+    """Reduced chart series, when the result has too many rows to draw."""
+    data: List[dict[str, Any]]
+    method: Literal["top_n", "lttb"]
+    points: int
+    total_points: int
+
+
+class StatementProfile(BaseModel):
+    line: int
+    end_line: int
+    code: str
+    ms: float
+    share: float
+    mem_delta_kb: float
+    peak_kb: float
+
+
+class ColumnPruning(BaseModel):
+    kept: int
+    total: int
+    reason: str
+    mb_saved: Optional[float] = None
+
+
+class ExecutionProfile(BaseModel):
+    total_ms: float
+    statements: int
+    hotspots: List[StatementProfile]
+    rewrites: List[str] = []
+    columns: Optional[ColumnPruning] = None
+
+
+class ValidationReport(BaseModel):
+    status: Literal["passed", "failed", "inconclusive", "skipped"]
+    ms: float
+    sample_rows: int
+    error: Optional[str] = None
+    error_type: Optional[str] = None
+    line: Optional[int] = None
+    result_shape: Optional[List[int]] = None
+    warnings: List[str] = []
+
+
+class RepairReport(BaseModel):
+    attempts: int
+    succeeded: bool
+    ms: float
+    errors: List[str] = []
+    stopped: Optional[str] = None
+
+
+class ApproximateReport(BaseModel):
+    exact: bool
+    row_level: bool
+    sample_rows: int
+    population_rows: int
+    scale: float
+    scaled_columns: List[str] = []
+    unscaled_columns: List[str] = []
+    # Neither totals nor ratios / averages (distinct counts, extremes): no interval
+    unestimated_columns: List[str] = []
+    warnings: List[str] = []
+    confidence: Optional[float] = None
+    method: Optional[str] = None
+    # column -> [low, high] per result row (None where no interval could be estimated)
+    intervals: dict[str, List[Optional[List[float]]]] = {}
+    ms: float
+    # Background job computing the exact answer (GET /api/jobs/{id}/result)
+    refine_job_id: Optional[str] = None
 
 
 class QueryResponse(BaseModel):
@@ -24,10 +117,18 @@ class QueryResponse(BaseModel):
     question: str
     row_count: int
     columns: List[str]
-    data: List[dict[str, Any]]
+    data: ResultData
     chart: Optional[ChartSpec] = None
+    chart_data: Optional[ChartData] = None
     generated_code: str = ""
+    profile: Optional[ExecutionProfile] = None
+    validation: Optional[ValidationReport] = None
+    repair: Optional[RepairReport] = None
+    approximate: Optional[ApproximateReport] = None
     error: Optional[str] = None
+    result_id: Optional[str] = None
+    # True when data holds only the first max_rows of row_count rows
+    truncated: bool = False
 
 
 class MetricsResponse(BaseModel):
@@ -67,9 +168,59 @@ class BucketsResponse(BaseModel):
     total_cases: int
 
 
+class ChannelData(BaseModel):
+    channel: str
+    group: Optional[str] = None
+    cases: int
+    attempts: int
+    contacts: int
+    ptp: int
+    ptp_conversions: int
+    attempt_coverage: float
+    connect_coverage: float
+    ptp_generation: float
+    ptp_conversion_rate: float
+
+
+class ChannelsResponse(BaseModel):
+    by: Optional[str] = None
+    channels: List[ChannelData]
+
+
+class TrendPoint(BaseModel):
+    period: str
+    cases: int
+    aum: float
+    collection: float
+    resolved: int
+    attempted: int
+    contacted: int
+    ptp: int
+    amount_efficiency: float
+    resolution_rate: float
+    connect_coverage: float
+    ptp_generation: float
+
+
+class TrendsResponse(BaseModel):
+    date_column: Optional[str] = None
+    grain: str
+    date_columns: List[str]
+    points: List[TrendPoint]
+
+
+ExportFormat = Literal["xlsx", "csv", "csv.gz"]
+
+
 class ExportRequest(BaseModel):
     data: List[dict[str, Any]]
     columns: List[str]
+    format: ExportFormat = "xlsx"
+
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    orient: ResultOrient = "records"
 
 
 # ---------------------------------------------------------------------------
@@ -99,6 +250,11 @@ class ConfirmRequest(BaseModel):
     question: str
     confirmed_logic: List[dict[str, str]]
     preview_data: dict[str, Any]
+    orient: ResultOrient = "records"
+    profile: bool = False
+    approximate: bool = False
+    refine: bool = False
+    max_rows: Optional[int] = Field(None, ge=0)
 
 
 class ConfirmResponse(BaseModel):
@@ -106,11 +262,19 @@ class ConfirmResponse(BaseModel):
     question: str
     row_count: int
     columns: List[str]
-    data: List[dict[str, Any]]
+    data: ResultData
     chart: Optional[ChartSpec] = None
+    chart_data: Optional[ChartData] = None
     generated_code: str = ""
     sql_code: str = ""
+    profile: Optional[ExecutionProfile] = None
+    validation: Optional[ValidationReport] = None
+    repair: Optional[RepairReport] = None
+    approximate: Optional[ApproximateReport] = None
     error: Optional[str] = None
+    result_id: Optional[str] = None
+    # True when data holds only the first max_rows of row_count rows
+    truncated: bool = False
 
 
 class ModifyLogicRequest(BaseModel):
@@ -120,3 +284,45 @@ class ModifyLogicRequest(BaseModel):
 
 class ModifyLogicResponse(BaseModel):
     updated_logic: List[dict[str, str]]
+
+
+# ---------------------------------------------------------------------------
+# Server-side result store
+# ---------------------------------------------------------------------------
+
+class ResultPageResponse(BaseModel):
+    result_id: str
+    total_rows: int
+    offset: int
+    limit: int
+    columns: List[str]
+    data: ResultData
+
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+
+class JobSubmitRequest(BaseModel):
+    kind: Literal["query", "confirm"] = "query"
+    question: str
+    confirmed_logic: List[dict[str, str]] = []
+    preview_data: dict[str, Any] = {}
+    priority: Literal["high", "normal", "low"] = "normal"
+    orient: ResultOrient = "records"
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    question: str
+    priority: str
+    status: str
+    queue_position: Optional[int] = None
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    wait_ms: Optional[float] = None
+    run_ms: Optional[float] = None
+    timings: dict[str, float] = {}
+    error: Optional[str] = None
@@ -0,0 +1,92 @@
+"""
+Startup warm-up and readiness.
+
+The snapshot is loaded, and with settings.startup_warm the dataset profile,
+static prompts, tokenizer and LLM SDK import are prepared, either before the
+app accepts requests (default) or, with settings.background_startup, in a
+worker thread after the port is bound so platform health checks pass on
+cold deploys. /healthz answers as soon as the process serves; /readyz only once
+warm-up has finished. Requests arriving earlier wait for the data load.
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, Optional
+
+from backend.config import settings
+
+# Module import time, close to process start (backend.main imports this first)
+_started = time.perf_counter()
+
+_state = {"phase": "starting", "error": None, "steps": {}, "ready_ms": None}
+_lock = threading.Lock()
+_task: Optional[asyncio.Future] = None
+
+
+def _set(**fields) -> None:
+    with _lock:
+        _state.update(fields)
+
+
+def _step(name: str, fn: Callable[[], object]) -> None:
+    start = time.perf_counter()
+    fn()
+    with _lock:
+        _state["steps"][name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def _warm_prompts() -> None:
+    from backend.data.loader import get_dataframe
+    from backend.llm.prompt import (
+        get_code_generation_prompt, get_direct_query_prompt, get_preview_prompt, get_repair_prompt,
+    )
+    df = get_dataframe()
+    for build in (get_direct_query_prompt, get_preview_prompt, get_code_generation_prompt, get_repair_prompt):
+        build(df)
+
+
+def warm_up() -> None:
+    """Load the snapshot and (optionally) everything the first question needs."""
+    from backend.data.loader import get_dataframe
+    from backend.data.profile import get_dataset_profile
+    from backend.llm.client import preload_sdk
+    from backend.llm.tokens import token_method
+
+    try:
+        _set(phase="loading")
+        _step("data", get_dataframe)
+        if settings.startup_warm:
+            _set(phase="warming")
+            _step("profile", get_dataset_profile)
+            _step("prompts", _warm_prompts)
+            _step("tokenizer", token_method)
+            _step("llm_sdk", preload_sdk)
+    except Exception as e:
+        _set(phase="failed", error=f"{type(e).__name__}: {e}")
+        raise
+    _set(phase="ready", ready_ms=round((time.perf_counter() - _started) * 1000, 2))
+
+
+async def start() -> None:
+    """Run warm-up now, or schedule it on a worker thread with settings.background_startup."""
+    global _task
+    if not settings.background_startup:
+        warm_up()
+        return
+
+    def run() -> None:
+        try:
+            warm_up()
+        except Exception:
+            pass  # reported by /readyz
+
+    _task = asyncio.get_running_loop().run_in_executor(None, run)
+
+
+def readiness() -> tuple[bool, dict]:
+    """(ready, report) for /readyz."""
+    with _lock:
+        report = {**_state, "steps": dict(_state["steps"])}
+    report["background"] = settings.background_startup
+    report["uptime_ms"] = round((time.perf_counter() - _started) * 1000, 2)
+    return report["phase"] == "ready", report
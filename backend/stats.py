@@ -0,0 +1,42 @@
+import math
+import threading
+from collections import deque
+from typing import Iterable, Optional
+
+
+def percentile(sorted_values: list[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class RollingStats:
+    """Thread-safe window of the most recent samples with percentile summaries."""
+
+    def __init__(self, window: int = 1000):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            self.total += value
+
+    def summary(self, percentiles: Iterable[int] = (50, 95, 99)) -> dict:
+        with self._lock:
+            values = sorted(self._samples)
+            count, total = self.count, self.total
+        out = {
+            "count": count,
+            "mean": round(total / count, 2) if count else None,
+            "max": round(values[-1], 2) if values else None,
+        }
+        for pct in percentiles:
+            value = percentile(values, pct)
+            out[f"p{pct}"] = round(value, 2) if value is not None else None
+        return out
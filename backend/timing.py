@@ -0,0 +1,176 @@
+"""
+Per-request stage timing.
+
+ServerTimingMiddleware opens a timing scope for every HTTP request. Code
+running inside the request adds stage durations with record()/timed().
+run_in_threadpool carries the scope into its worker thread; plain executors
+and threads do not, so submit work there through contextvars.copy_context().run.
+The durations go out as a Server-Timing header (stages recorded while a
+streamed body is still running only reach the aggregate) and are aggregated
+per endpoint for /api/debug/timings, along with background jobs (record_job).
+"""
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+from backend.stats import RollingStats
+
+
+class _RequestTimings:
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        # Worker threads of one request (batch questions) record concurrently
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.endpoint_done: Optional[float] = None
+
+
+_current: ContextVar[Optional[_RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record(name: str, ms: float) -> None:
+    """Add a stage duration to the current request (no-op outside a request)."""
+    timings = _current.get()
+    if timings is not None:
+        with timings.lock:
+            timings.stages[name] = round(timings.stages.get(name, 0.0) + ms, 2)
+
+
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def _ms_since(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+# ---------------------------------------------------------------------------
+# Per-endpoint aggregation
+# ---------------------------------------------------------------------------
+
+class _EndpointStats:
+    def __init__(self):
+        self.total = RollingStats()
+        self.stages: dict[str, RollingStats] = {}
+
+
+_endpoints: dict[str, _EndpointStats] = {}
+_endpoints_lock = threading.Lock()
+
+
+def _record_endpoint(endpoint: str, stages: dict[str, float], total_ms: float) -> None:
+    with _endpoints_lock:
+        stats = _endpoints.setdefault(endpoint, _EndpointStats())
+        for name in stages:
+            stats.stages.setdefault(name, RollingStats())
+    stats.total.add(total_ms)
+    for name, ms in stages.items():
+        stats.stages[name].add(ms)
+
+
+def record_job(kind: str, stages: dict[str, float], total_ms: float) -> None:
+    """Aggregate the stage timings of a background job (they run outside any request)."""
+    _record_endpoint(f"JOB {kind}", dict(stages), total_ms)
+
+
+def endpoint_timings() -> dict:
+    """p50/p95/p99 of total and per-stage durations (ms) for every endpoint seen."""
+    with _endpoints_lock:
+        items = sorted(_endpoints.items())
+    return {
+        endpoint: {
+            "total": stats.total.summary(),
+            "stages": {name: rolling.summary() for name, rolling in sorted(stats.stages.items())},
+        }
+        for endpoint, stats in items
+    }
+
+
+# ---------------------------------------------------------------------------
+# ASGI middleware and route class
+# ---------------------------------------------------------------------------
+
+def _server_timing(stages: dict[str, float], total_ms: float) -> str:
+    parts = [f"{name};dur={ms}" for name, ms in stages.items()]
+    parts.append(f"total;dur={total_ms}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """Times each HTTP request and adds a Server-Timing header to its response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = _RequestTimings()
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                if timings.endpoint_done is not None:
+                    # Response-model validation and encoding happen after the endpoint returns
+                    record("validate", _ms_since(timings.endpoint_done))
+                headers = MutableHeaders(scope=message)
+                with timings.lock:
+                    stages = dict(timings.stages)
+                headers.append("Server-Timing", _server_timing(stages, _ms_since(timings.started)))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if isinstance(route, APIRoute):
+                method = scope["method"]
+                with timings.lock:
+                    stages = dict(timings.stages)
+                _record_endpoint(f"{method} {route.path}", stages, _ms_since(timings.started))
+
+
+def _mark_endpoint_done() -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.endpoint_done = time.perf_counter()
+
+
+def _timed_endpoint(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that marks when the endpoint returns, so response validation can be timed."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
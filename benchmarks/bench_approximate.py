@@ -0,0 +1,124 @@
+"""
+Approximate-mode benchmark: runs aggregate questions exactly and on the
+approximate-mode sample, and reports latency, relative error of the
+estimates and how many exact values fall inside their confidence intervals.
+--copies stacks the snapshot on itself to stand in for a larger portfolio.
+
+    python -m benchmarks.bench_approximate --copies 20 --repeat 3 --out approximate.json
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from backend.data.loader import get_dataframe
+from backend.query.approximate import execute_approximate
+from backend.query.executor import execute_pandas_code
+from benchmarks.common import measure, write_report
+from benchmarks.corpus import CORPUS
+
+QUESTIONS = [
+    {
+        "name": "efficiency_by_region",
+        "code": (
+            "result = df.groupby('Region').agg(**{\n"
+            "    'Count of Cases': ('Loan Number', 'count'),\n"
+            "    'AUM': ('POS', 'sum'),\n"
+            "    'MTD Collection': ('Collected Amount', 'sum'),\n"
+            "}).reset_index()\n"
+            "result['Amount Efficiency'] = result['MTD Collection'] / result['AUM'] * 100"
+        ),
+    },
+    {
+        "name": "connect_coverage_by_dpd",
+        "code": (
+            "g = df.groupby('DPD Bucket')\n"
+            "result = pd.DataFrame({\n"
+            "    'Count of Cases': g['Loan Number'].count(),\n"
+            "    'Connect Coverage': g['Call Contact'].sum() / g['Loan Number'].count() * 100,\n"
+            "    'Avg DPD': g['DPD'].mean(),\n"
+            "}).reset_index()"
+        ),
+    },
+    {
+        "name": "portfolio_totals",
+        "code": "result = pd.DataFrame({'AUM': [df['POS'].sum()], 'Count of Cases': [len(df)]})",
+    },
+]
+
+
+def _aligned(exact: pd.DataFrame, estimate: pd.DataFrame, numeric: list) -> pd.DataFrame:
+    """exact in the row order of estimate (matched on label columns, else the index)."""
+    labels = [col for col in estimate.columns if col not in numeric]
+    if labels:
+        return exact.set_index(labels).reindex(estimate.set_index(labels).index).reset_index()
+    return exact.reindex(estimate.index)
+
+
+def _accuracy(exact: pd.DataFrame, estimate: pd.DataFrame, report: dict) -> dict:
+    numeric = report["scaled_columns"] + report["unscaled_columns"]
+    truth = _aligned(exact, estimate, [col for col in estimate.columns if str(col) in numeric])
+    errors, covered, intervals = [], 0, 0
+    for col in estimate.columns:
+        if str(col) not in numeric:
+            continue
+        values = estimate[col].to_numpy(dtype=float)
+        actual = truth[col].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            errors.extend(np.abs(values - actual) / np.abs(actual))
+        for interval, value in zip(report["intervals"].get(str(col), []), actual):
+            if interval is not None and np.isfinite(value):
+                intervals += 1
+                covered += bool(interval[0] <= value <= interval[1])
+    errors = [e for e in errors if np.isfinite(e)]
+    return {
+        "max_relative_error": round(max(errors), 4) if errors else None,
+        "median_relative_error": round(float(np.median(errors)), 4) if errors else None,
+        "intervals": intervals,
+        "covered": covered,
+    }
+
+
+def run(repeat: int = 3, copies: int = 1) -> dict:
+    df = get_dataframe()
+    if copies > 1:
+        df = pd.concat([df] * copies, ignore_index=True)
+
+    snippets = {}
+    for entry in QUESTIONS + [{"name": e["name"], "code": e["code"]} for e in CORPUS]:
+        code = entry["code"]
+        exact = execute_pandas_code(code, df)
+        estimate, report = execute_approximate(code, df)
+
+        exact_ms = measure(lambda: execute_pandas_code(code, df), repeat=repeat)["median_ms"]
+        approximate_ms = measure(lambda: execute_approximate(code, df), repeat=repeat)["median_ms"]
+        snippets[entry["name"]] = {
+            "row_level": report["row_level"],
+            "scaled_columns": report["scaled_columns"],
+            "exact_ms": exact_ms,
+            "approximate_ms": approximate_ms,
+            "speedup": round(exact_ms / approximate_ms, 2) if approximate_ms else None,
+            **({} if report["row_level"] else _accuracy(exact, estimate, report)),
+        }
+
+    aggregates = [s for s in snippets.values() if not s["row_level"]]
+    intervals = sum(s["intervals"] for s in aggregates)
+    return {
+        "rows": len(df),
+        "sample_rows": report["sample_rows"],
+        "snippets": snippets,
+        "interval_coverage": round(sum(s["covered"] for s in aggregates) / intervals, 4) if intervals else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--copies', type=int, default=1, help="stack the snapshot this many times")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("approximate", run(args.repeat, args.copies), args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Export benchmark: legacy in-memory openpyxl workbook vs streamed write-only
+xlsx, csv and csv.gz. Reports total time, time-to-first-byte, peak traced
+memory (tracemalloc) and output size.
+
+    python -m benchmarks.bench_export --rows 5000 20000 --out export.json
+"""
+import argparse
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+
+from backend.data.loader import get_dataframe
+from backend.query.writers import export_stream
+from benchmarks.common import write_report
+
+
+def _legacy_xlsx(df: pd.DataFrame):
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Query Results')
+    output.seek(0)
+    yield output.getvalue()
+
+
+def _streams(df: pd.DataFrame) -> dict:
+    return {
+        "xlsx_legacy": lambda: _legacy_xlsx(df),
+        "xlsx_stream": lambda: export_stream(df, 'xlsx')[0],
+        "csv_stream": lambda: export_stream(df, 'csv')[0],
+        "csv_gz_stream": lambda: export_stream(df, 'csv.gz')[0],
+    }
+
+
+def _drain(make_iter) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    ttfb = None
+    size = 0
+    for chunk in make_iter():
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    return total, (ttfb or total), size
+
+
+def measure_stream(make_iter, trace_memory: bool = True) -> dict:
+    """Timed pass without tracing, then (optionally) a tracemalloc pass for peak memory."""
+    total, ttfb, size = _drain(make_iter)
+    result = {
+        "total_ms": round(total * 1000, 1),
+        "ttfb_ms": round(ttfb * 1000, 1),
+        "bytes": size,
+    }
+    if trace_memory:
+        tracemalloc.start()
+        _drain(make_iter)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_mb"] = round(peak / 1024 / 1024, 2)
+    return result
+
+
+def run(row_counts, formats=None, trace_memory: bool = True) -> dict:
+    df = get_dataframe()
+    results = {}
+    for rows in row_counts:
+        frame = df.head(rows)
+        streams = _streams(frame)
+        results[str(len(frame))] = {
+            name: measure_stream(make_iter, trace_memory)
+            for name, make_iter in streams.items()
+            if not formats or name in formats
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--formats', nargs='*', default=None)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass (slow)")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("export", run(args.rows, args.formats, not args.no_memory), args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Flag store benchmark: the overall-flag derivation (row-wise column sum vs.
+packed OR) and the channel coverage / conversion summary (pandas sums and
+groupby vs. popcounts), with memory of the int64 columns vs. the packed bits.
+Checks both paths give the same numbers.
+
+    python -m benchmarks.bench_flags --repeat 5 --out flags.json
+"""
+import argparse
+from typing import Optional
+
+import pandas as pd
+
+from backend.data.channels import channel_summary, flag_store_stats, get_flag_store
+from backend.data.flags import CHANNELS, OVERALL_FLAGS, FlagStore
+from backend.data.loader import get_dataframe
+from benchmarks.common import measure, write_report
+
+
+def _pandas_overall(df: pd.DataFrame) -> dict:
+    """The loader's previous derivation: (df[cols].sum(axis=1) > 0).astype(int)."""
+    return {
+        name: (df[[col for col in parts if col in df.columns]].sum(axis=1) > 0).astype(int)
+        for name, parts in OVERALL_FLAGS.items()
+    }
+
+
+def _packed_overall(store: FlagStore) -> dict:
+    return {name: store.column(store.any_of(parts)) for name, parts in OVERALL_FLAGS.items()}
+
+
+def _pandas_summary(df: pd.DataFrame, by: Optional[str] = None) -> pd.DataFrame:
+    columns = [
+        f'{channel} {kind}' for channel in CHANNELS for kind in ('Attempt', 'Contact', 'PTP', 'PTP Conversion')
+        if f'{channel} {kind}' in df.columns
+    ]
+    if by is None:
+        return df[columns].sum().to_frame().T
+    return df.groupby(by)[columns].sum()
+
+
+def _pandas_matches(df: pd.DataFrame, by: Optional[str] = None) -> bool:
+    expected = _pandas_summary(df, by)
+    for row in channel_summary(by):
+        if row["channel"] == 'Overall':
+            continue
+        totals = expected.loc[row["group"]] if by else expected.iloc[0]
+        for key, kind in (('attempts', 'Attempt'), ('contacts', 'Contact'), ('ptp', 'PTP')):
+            column = f'{row["channel"]} {kind}'
+            if int(totals.get(column, 0)) != row[key]:
+                return False
+    return True
+
+
+def run(repeat: int = 5) -> dict:
+    df = get_dataframe()
+    store = get_flag_store()
+    packed = _packed_overall(store)
+    identical = all((packed[name] == df[name].to_numpy()).all() for name in OVERALL_FLAGS if name in df.columns)
+
+    return {
+        "rows": len(df),
+        "memory": flag_store_stats(),
+        "overall_flags": {
+            "identical": bool(identical),
+            "pandas_ms": measure(lambda: _pandas_overall(df), repeat=repeat)["median_ms"],
+            "packed_ms": measure(lambda: _packed_overall(store), repeat=repeat)["median_ms"],
+        },
+        "summary": {
+            "identical": _pandas_matches(df),
+            "pandas_ms": measure(lambda: _pandas_summary(df), repeat=repeat)["median_ms"],
+            "packed_ms": measure(lambda: channel_summary(), repeat=repeat)["median_ms"],
+        },
+        "summary_by_region": {
+            "identical": _pandas_matches(df, 'Region'),
+            "pandas_ms": measure(lambda: _pandas_summary(df, 'Region'), repeat=repeat)["median_ms"],
+            "packed_ms": measure(lambda: channel_summary('Region'), repeat=repeat)["median_ms"],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("flags", run(args.repeat), args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Compare result encodings: legacy JSON (to_dict + sanitize_for_json + json),
+vectorized JSON (records / columns via orjson), Arrow IPC and Parquet.
+
+    python -m benchmarks.bench_formats --rows 1000 10000 50000 --out formats.json
+"""
+import argparse
+import json
+
+from backend.data.loader import get_dataframe
+from backend.query.executor import sanitize_for_json
+from backend.query.serialize import (
+    dumps, frame_to_records, frame_to_columns, frame_to_arrow_ipc, frame_to_parquet,
+)
+from benchmarks.common import measure, write_report
+
+
+def _encoders(frame):
+    return {
+        "json_legacy": lambda: json.dumps(sanitize_for_json(frame.to_dict(orient='records'))).encode(),
+        "json_records": lambda: dumps(frame_to_records(frame)),
+        "json_columns": lambda: dumps(frame_to_columns(frame)),
+        "arrow_ipc": lambda: frame_to_arrow_ipc(frame),
+        "parquet": lambda: frame_to_parquet(frame),
+    }
+
+
+def run(row_counts, repeat: int = 3) -> dict:
+    df = get_dataframe()
+    results = {}
+    for rows in row_counts:
+        frame = df.head(rows)
+        per_format = {}
+        for name, encode in _encoders(frame).items():
+            timing = measure(encode, repeat=repeat)
+            timing["bytes"] = len(encode())
+            per_format[name] = timing
+        results[str(len(frame))] = per_format
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("formats", run(args.rows, args.repeat), args.out)
+
+
+if __name__ == '__main__':
+    main()
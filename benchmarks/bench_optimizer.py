@@ -0,0 +1,78 @@
+"""
+Generated-code optimizer benchmark: replays benchmarks/corpus.py with the
+rewrites off and on, checks the results are identical and reports the time
+saved per snippet and per rewrite.
+
+    python -m benchmarks.bench_optimizer --repeat 3 --out optimizer.json
+"""
+import argparse
+
+import pandas as pd
+
+from backend.config import settings
+from backend.data.loader import get_dataframe
+from backend.query.executor import execute_pandas_code
+from backend.query.optimizer import optimize_code, optimizer_stats
+from benchmarks.common import measure, write_report
+from benchmarks.corpus import CORPUS
+
+
+def _execute(code: str, df: pd.DataFrame, optimize: bool) -> pd.DataFrame:
+    previous = settings.optimize_generated_code
+    settings.optimize_generated_code = optimize
+    try:
+        return execute_pandas_code(code, df)
+    finally:
+        settings.optimize_generated_code = previous
+
+
+def run(repeat: int = 3, rows: int = 0) -> dict:
+    df = get_dataframe()
+    if rows:
+        df = df.head(rows)
+
+    snippets = {}
+    by_rewrite: dict[str, float] = {}
+    for entry in CORPUS:
+        code = entry["code"]
+        _, applied = optimize_code(code)
+        baseline = _execute(code, df, optimize=False)
+        optimized = _execute(code, df, optimize=True)
+        identical = baseline.equals(optimized) and baseline.dtypes.equals(optimized.dtypes)
+
+        original_ms = measure(lambda: _execute(code, df, False), repeat=repeat)["median_ms"]
+        optimized_ms = measure(lambda: _execute(code, df, True), repeat=repeat)["median_ms"]
+        saved_ms = round(original_ms - optimized_ms, 3)
+        for name in applied:
+            by_rewrite[name] = round(by_rewrite.get(name, 0.0) + saved_ms, 3)
+
+        snippets[entry["name"]] = {
+            "expected_rewrite": entry["rewrite"],
+            "applied": applied,
+            "identical": identical,
+            "original_ms": original_ms,
+            "optimized_ms": optimized_ms,
+            "saved_ms": saved_ms,
+            "speedup": round(original_ms / optimized_ms, 2) if optimized_ms else None,
+        }
+
+    return {
+        "rows": len(df),
+        "snippets": snippets,
+        "saved_ms_by_rewrite": by_rewrite,
+        "all_identical": all(s["identical"] for s in snippets.values()),
+        "counters": optimizer_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--rows', type=int, default=0, help="limit to the first N rows (0 = all)")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("optimizer", run(args.repeat, args.rows), args.out)
+
+
+if __name__ == '__main__':
+    main()
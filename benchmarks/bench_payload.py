@@ -0,0 +1,80 @@
+"""
+Chart payload benchmark: for results of different lengths, the JSON size of
+the series the chart draws (every result row vs. the reduced chart_data), of
+the whole response with and without --max-rows, and the chart-data stage time.
+
+    python -m benchmarks.bench_payload --max-rows 50 --repeat 5 --out payload.json
+"""
+import argparse
+
+from backend.data.loader import get_dataframe
+from backend.query.charts import reduce_chart_data
+from backend.query.pipeline import outcome_payload, run_generated_code
+from backend.query.serialize import dumps, frame_to_records
+from benchmarks.common import measure, write_report
+
+RESULTS = [
+    {
+        "name": "collection_by_state",
+        "code": (
+            "result = df.groupby('State').agg(**{'Count of Cases': ('Loan Number', 'count'), "
+            "'MTD Collection': ('Collected Amount', 'sum')}).reset_index()"
+        ),
+    },
+    {
+        "name": "efficiency_by_agent",
+        "code": (
+            "result = df.groupby('Agent Name').agg(**{'AUM': ('POS', 'sum'), "
+            "'MTD Collection': ('Collected Amount', 'sum')}).reset_index()\n"
+            "result['Amount Efficiency'] = result['MTD Collection'] / result['AUM'] * 100"
+        ),
+    },
+    {
+        "name": "collection_by_loan_day",
+        "code": (
+            "days = pd.Timestamp('2023-01-01') + pd.to_timedelta(df.index.to_series() % 1000, unit='D')\n"
+            "result = df.groupby(days.rename('Payment Day'))['Collected Amount'].sum().reset_index(name='Daily Collection')"
+        ),
+    },
+]
+
+
+def _size(obj) -> int:
+    return len(dumps(obj))
+
+
+def run(repeat: int = 5, max_rows: int = 50) -> dict:
+    df = get_dataframe()
+    results = {}
+    for entry in RESULTS:
+        outcome = run_generated_code(entry["name"], entry["code"], df=df)
+        if not outcome["success"]:
+            results[entry["name"]] = {"error": outcome["error"]}
+            continue
+        result, chart, chart_data = outcome["result"], outcome["chart"], outcome["chart_data"]
+        series = frame_to_records(result[[chart["x_key"]] + chart["y_keys"]]) if chart["y_keys"] else []
+        results[entry["name"]] = {
+            "rows": len(result),
+            "chart_type": chart["chart_type"],
+            "method": chart_data["method"] if chart_data else None,
+            "chart_points": chart_data["points"] if chart_data else len(series),
+            "series_bytes_full": _size(series),
+            "series_bytes_reduced": _size(chart_data["data"]) if chart_data else _size(series),
+            "response_bytes": _size(outcome_payload(outcome)),
+            "response_bytes_max_rows": _size(outcome_payload(outcome, max_rows=max_rows)),
+            "chart_data_ms": measure(lambda: reduce_chart_data(result, chart), repeat=repeat)["median_ms"],
+        }
+    return {"max_rows": max_rows, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-rows', type=int, default=50, help="inline rows for the truncated response")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("payload", run(args.repeat, args.max_rows), args.out)
+
+
+if __name__ == '__main__':
+    main()
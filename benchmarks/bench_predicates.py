@@ -0,0 +1,113 @@
+"""
+Filter-mask cache benchmark: a session of questions that share filters
+("South region", "DPD > 90", "Status == COLLECTED") run with the cache off,
+then with it on from cold. Checks the results are identical and reports
+per-snippet time and the cache hit rate.
+
+    python -m benchmarks.bench_predicates --repeat 5 --out predicates.json
+"""
+import argparse
+
+import pandas as pd
+
+from backend.config import settings
+from backend.data.loader import get_dataframe
+from backend.query.executor import execute_pandas_code
+from backend.query.predicates import clear_predicate_cache, predicate_cache_stats
+from benchmarks.common import measure, write_report
+
+SESSION = [
+    {
+        "name": "south_by_bucket",
+        "code": "result = df[df['Region'] == 'South'].groupby('DPD Bucket', observed=True).agg({'POS': 'sum'}).reset_index()",
+    },
+    {
+        "name": "south_collected_by_state",
+        "code": (
+            "south = df[(df['Region'] == 'South') & (df['Status'] == 'COLLECTED')]\n"
+            "result = south.groupby('State')['Collected Amount'].sum().reset_index()"
+        ),
+    },
+    {
+        "name": "collected_share",
+        "code": (
+            "collected = df['Status'] == 'COLLECTED'\n"
+            "result = pd.DataFrame({'Cases': [collected.sum()], 'Amount': [df.loc[collected, 'Collected Amount'].sum()]})"
+        ),
+    },
+    {
+        "name": "south_late_by_agent",
+        "code": (
+            "late = df[(df['DPD'] > 90) & (df['Region'] == 'South')]\n"
+            "result = late.groupby('Agent Name').size().reset_index(name='Count of Cases')"
+        ),
+    },
+    {
+        "name": "late_outside_east_west",
+        "code": "result = df[(df['DPD'] > 90) & ~df['Region'].isin(['East', 'West'])].groupby('Region').size().reset_index(name='n')",
+    },
+    {
+        "name": "collected_south_by_product",
+        "code": (
+            "rows = df[(df['Status'] == 'COLLECTED') & (df['Region'] == 'South')]\n"
+            "result = rows.groupby('Loan Product')['POS'].sum().reset_index()"
+        ),
+    },
+]
+
+
+def _execute(code: str, df: pd.DataFrame, cache: bool) -> pd.DataFrame:
+    previous = settings.cache_predicates
+    settings.cache_predicates = cache
+    try:
+        return execute_pandas_code(code, df)
+    finally:
+        settings.cache_predicates = previous
+
+
+def run(repeat: int = 5) -> dict:
+    df = get_dataframe()
+    clear_predicate_cache()
+    before = predicate_cache_stats()
+
+    snippets = {}
+    for entry in SESSION:
+        code = entry["code"]
+        baseline = _execute(code, df, cache=False)
+        cold_hits = predicate_cache_stats()["hits"]
+        cached = _execute(code, df, cache=True)
+        snippets[entry["name"]] = {
+            "identical": baseline.equals(cached) and baseline.dtypes.equals(cached.dtypes),
+            "hits_on_first_run": predicate_cache_stats()["hits"] - cold_hits,
+            "uncached_ms": measure(lambda: _execute(code, df, False), repeat=repeat)["median_ms"],
+            "cached_ms": measure(lambda: _execute(code, df, True), repeat=repeat)["median_ms"],
+        }
+        snippets[entry["name"]]["saved_ms"] = round(
+            snippets[entry["name"]]["uncached_ms"] - snippets[entry["name"]]["cached_ms"], 3
+        )
+
+    after = predicate_cache_stats()
+    return {
+        "rows": len(df),
+        "snippets": snippets,
+        "all_identical": all(s["identical"] for s in snippets.values()),
+        "saved_ms_total": round(sum(s["saved_ms"] for s in snippets.values()), 3),
+        "cache": {
+            "entries": after["entries"],
+            "bytes": after["bytes"],
+            "hits": after["hits"] - before["hits"],
+            "misses": after["misses"] - before["misses"],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("predicates", run(args.repeat), args.out)
+
+
+if __name__ == '__main__':
+    main()
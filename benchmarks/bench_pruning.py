@@ -0,0 +1,83 @@
+"""
+Column-pruning benchmark: replays benchmarks/corpus.py on the full frame and
+on the columns each snippet references, checks the results are identical
+and reports columns kept, execution time and peak traced memory.
+
+    python -m benchmarks.bench_pruning --repeat 3 --out pruning.json
+"""
+import argparse
+import ast
+import tracemalloc
+
+import pandas as pd
+
+from backend.config import settings
+from backend.data.loader import get_dataframe
+from backend.query.columns import plan_columns
+from backend.query.executor import execute_pandas_code
+from benchmarks.common import measure, write_report
+from benchmarks.corpus import CORPUS
+
+
+def _execute(code: str, df: pd.DataFrame, prune: bool) -> pd.DataFrame:
+    previous = settings.prune_unused_columns
+    settings.prune_unused_columns = prune
+    try:
+        return execute_pandas_code(code, df)
+    finally:
+        settings.prune_unused_columns = previous
+
+
+def _peak_mb(code: str, df: pd.DataFrame, prune: bool) -> float:
+    tracemalloc.start()
+    try:
+        _execute(code, df, prune)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+
+def run(repeat: int = 3, trace_memory: bool = True) -> dict:
+    df = get_dataframe()
+    snippets = {}
+    for entry in CORPUS:
+        code = entry["code"]
+        kept, reason = plan_columns(ast.parse(code), df)
+        full = _execute(code, df, prune=False)
+        pruned = _execute(code, df, prune=True)
+
+        full_ms = measure(lambda: _execute(code, df, False), repeat=repeat)["median_ms"]
+        pruned_ms = measure(lambda: _execute(code, df, True), repeat=repeat)["median_ms"]
+        snippets[entry["name"]] = {
+            "columns_kept": len(kept) if kept is not None else len(df.columns),
+            "reason": reason,
+            "identical": full.equals(pruned) and full.dtypes.equals(pruned.dtypes),
+            "full_ms": full_ms,
+            "pruned_ms": pruned_ms,
+            "saved_ms": round(full_ms - pruned_ms, 3),
+        }
+        if trace_memory:
+            snippets[entry["name"]]["full_peak_mb"] = _peak_mb(code, df, False)
+            snippets[entry["name"]]["pruned_peak_mb"] = _peak_mb(code, df, True)
+
+    return {
+        "rows": len(df),
+        "columns": len(df.columns),
+        "snippets": snippets,
+        "pruned": sum(1 for s in snippets.values() if s["reason"] == "pruned"),
+        "all_identical": all(s["identical"] for s in snippets.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc passes (slow)")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("pruning", run(args.repeat, not args.no_memory), args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Startup benchmark: import time of backend.main in a fresh interpreter, and
+for blocking and background startup, the time from spawning uvicorn until
+/healthz (port bound, serving) and /readyz (data loaded, warm-up done)
+first answer 200.
+
+    python -m benchmarks.bench_startup --repeat 3 --out startup.json
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from benchmarks.common import write_report
+
+_IMPORT_SNIPPET = (
+    "import sys, time; start = time.perf_counter(); import backend.main; "
+    "print(round((time.perf_counter() - start) * 1000, 2), 'openai' in sys.modules)"
+)
+
+
+def _env(**extra) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    env.update(extra)
+    return env
+
+
+def _import_ms() -> tuple[float, bool]:
+    out = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SNIPPET], env=_env(), capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return float(out[-2]), out[-1] == "True"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _status(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def _time_to_ready(background: bool, timeout: float = 60.0) -> dict:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=_env(BACKGROUND_STARTUP=str(background).lower()),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    marks = {}
+    try:
+        while time.perf_counter() - start < timeout and "readyz_ms" not in marks:
+            for probe in ("healthz", "readyz"):
+                if f"{probe}_ms" not in marks and _status(f"http://127.0.0.1:{port}/{probe}") == 200:
+                    marks[f"{probe}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait()
+    return marks
+
+
+def run(repeat: int = 3) -> dict:
+    imports = [_import_ms() for _ in range(repeat)]
+    report = {
+        "import_ms": statistics.median(ms for ms, _ in imports),
+        "openai_imported_eagerly": any(eager for _, eager in imports),
+    }
+    for mode, background in (("blocking", False), ("background", True)):
+        runs = [_time_to_ready(background) for _ in range(repeat)]
+        report[mode] = {
+            key: statistics.median(r[key] for r in runs if key in r)
+            for key in ("healthz_ms", "readyz_ms")
+            if any(key in r for r in runs)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("startup", run(args.repeat), args.out)
+
+
+if __name__ == '__main__':
+    main()
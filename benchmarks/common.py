@@ -0,0 +1,48 @@
+"""Shared helpers for the benchmark scripts."""
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, warmup: int = 1) -> dict:
+    """Time fn() `repeat` times (after `warmup` untimed calls); returns ms stats."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "max_ms": round(max(samples), 3),
+        "repeat": repeat,
+    }
+
+
+def write_report(name: str, results: dict, out: Optional[str] = None) -> dict:
+    """Wrap results with run metadata and write them as JSON to `out` (or stdout)."""
+    import numpy as np
+    import pandas as pd
+
+    report = {
+        "benchmark": name,
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, default=str)
+    if out:
+        with open(out, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return report
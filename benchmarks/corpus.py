@@ -0,0 +1,98 @@
+"""
+Replay corpus of generated pandas code, in the shapes the LLM tends to write.
+Each entry names the optimizer rewrite it exercises (None: nothing to rewrite).
+"""
+
+CORPUS = [
+    {
+        "name": "row_apply_ratio",
+        "rewrite": "row_apply",
+        "code": """
+df['Resolution Rate'] = df.apply(lambda row: row['Collected Amount'] / (row['POS'] + 1) * 100, axis=1)
+result = df.groupby('Region')['Resolution Rate'].mean().reset_index()
+""",
+    },
+    {
+        "name": "row_apply_weighted",
+        "rewrite": "row_apply",
+        "code": """
+df['Weighted DPD'] = df.apply(lambda row: row['DPD'] * row['POS'], axis=1)
+result = df.groupby('DPD Bucket', as_index=False)['Weighted DPD'].sum()
+""",
+    },
+    {
+        "name": "iterrows_accumulate",
+        "rewrite": "iterrows",
+        "code": """
+totals = {}
+for _, row in df.iterrows():
+    totals[row['Region']] = totals.get(row['Region'], 0) + row['POS']
+result = pd.DataFrame({'Region': list(totals), 'Total POS': list(totals.values())})
+""",
+    },
+    {
+        "name": "loop_filter_region",
+        "rewrite": "loop_filter",
+        "code": """
+rows = []
+for region in df['Region'].unique():
+    region_df = df[df['Region'] == region]
+    rows.append({'Region': region, 'Count of Cases': len(region_df), 'Total POS': region_df['POS'].sum()})
+result = pd.DataFrame(rows)
+""",
+    },
+    {
+        "name": "loop_filter_state",
+        "rewrite": "loop_filter",
+        "code": """
+rows = []
+for state in sorted(df['State'].dropna().unique()):
+    subset = df[df['State'] == state]
+    rows.append([state, subset['Collected Amount'].sum(), subset['DPD'].mean()])
+result = pd.DataFrame(rows, columns=['State', 'Collected Amount', 'Avg DPD'])
+""",
+    },
+    {
+        "name": "group_apply_sum",
+        "rewrite": "group_reduce",
+        "code": """
+result = df.groupby('State').apply(lambda g: g['Collected Amount'].sum()).reset_index(name='Collected Amount')
+""",
+    },
+    {
+        "name": "group_apply_median",
+        "rewrite": "group_reduce",
+        "code": """
+result = df.groupby(['Region', 'DPD Bucket']).apply(lambda g: g['POS'].median()).reset_index(name='Median POS')
+""",
+    },
+    {
+        "name": "filter_then_group",
+        "rewrite": None,
+        "code": """
+high_dpd = df[df['DPD'] > 30]
+result = high_dpd.groupby('Region')['POS'].sum().reset_index()
+""",
+    },
+    {
+        "name": "pivot_buckets",
+        "rewrite": None,
+        "code": """
+result = df.pivot_table(index='Region', columns='DPD Bucket', values='POS', aggfunc='sum').reset_index()
+""",
+    },
+    {
+        "name": "top_accounts",
+        "rewrite": None,
+        "code": """
+result = df.sort_values('POS', ascending=False).head(10)
+""",
+    },
+    {
+        "name": "already_vectorized",
+        "rewrite": None,
+        "code": """
+result = df.groupby('Region', as_index=False).agg({'POS': 'sum', 'Collected Amount': 'sum'})
+""",
+    },
+]
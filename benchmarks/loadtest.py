@@ -0,0 +1,375 @@
+"""
+Load test: how many concurrent analysts one instance serves.
+
+Closed-loop workers repeatedly pick a scenario from a weighted mix and run it
+against the app, at each concurrency level for --duration seconds:
+
+    query      POST /api/query
+    flow       POST /api/query/preview -> /api/query/modify-logic -> /api/query/confirm
+    dashboard  GET /api/metrics, /api/regions, /api/buckets, /api/channels
+    export     POST /api/export of a query result (--export-rows rows)
+
+The LLM is the local stub (settings.llm_stub) with --ttft-ms latency before
+the first token and --tokens-per-second streaming. By default the app runs
+in-process (httpx over ASGI, same event loop and thread pool as uvicorn);
+--port serves it with uvicorn on a local port instead, and --url targets a
+server that is already running (started with LLM_STUB=true; pass --pid to
+sample its memory). Per level: throughput, latency percentiles per request
+and per scenario, error rate and peak RSS of the serving process.
+
+    python -m benchmarks.loadtest --concurrency 1 4 16 64 --duration 20 --out load.json
+    python -m benchmarks.loadtest --mix query=2,flow=1,dashboard=4 --ttft-ms 400 --tokens-per-second 80 --port
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+import httpx
+
+from backend.stats import RollingStats
+from benchmarks.common import write_report
+
+SCENARIOS = ['query', 'flow', 'dashboard', 'export']
+DEFAULT_MIX = 'query=4,flow=2,dashboard=3,export=1'
+DASHBOARD = ['/api/metrics', '/api/regions', '/api/buckets', '/api/channels']
+DIMENSIONS = ['State', 'Region', 'DPD Bucket', 'POS Band', 'Allocation Name']
+MEASURES = ['collection', 'AUM', 'average DPD', 'count of cases']
+FOLLOWUPS = ['add Resolved column', 'add POS column', 'add Collected Amount column']
+_WINDOW = 1_000_000  # keep every sample of a level
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """'query=4,flow=1' -> {'query': 4.0, 'flow': 1.0}; unknown scenarios raise ValueError."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name} (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Mix has no weight")
+    return mix
+
+
+def questions() -> list[str]:
+    return [f"{measure} by {dimension}" for dimension in DIMENSIONS for measure in MEASURES]
+
+
+# ---------------------------------------------------------------------------
+# Memory of the serving process
+# ---------------------------------------------------------------------------
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Current resident set size of pid (Linux /proc), None where unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Peak RSS of a process, sampled on a background thread."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            value = rss_mb(self.pid)
+            if value is not None and (self.peak is None or value > self.peak):
+                self.peak = value
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class _NoSampler:
+    """Stand-in when there is no process to sample."""
+
+    peak = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    """Latency and error counts per request label and per scenario for one level."""
+
+    def __init__(self):
+        self.requests: dict[str, RollingStats] = {}
+        self.scenarios: dict[str, RollingStats] = {}
+        self.errors: dict[str, int] = {}
+        self.request_count = 0
+
+    def request(self, label: str, ms: float, ok: bool) -> None:
+        self.requests.setdefault(label, RollingStats(_WINDOW)).add(ms)
+        self.request_count += 1
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def scenario(self, name: str, ms: float) -> None:
+        self.scenarios.setdefault(name, RollingStats(_WINDOW)).add(ms)
+
+
+async def _call(client: httpx.AsyncClient, rec: Recorder, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        await response.aread()
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    rec.request(f"{method} {path}", (time.perf_counter() - start) * 1000, ok)
+    return response if ok else None
+
+
+async def _query(client, rec, question: str, ctx: dict) -> None:
+    await _call(client, rec, "POST", "/api/query", json={"question": question})
+
+
+async def _flow(client, rec, question: str, ctx: dict) -> None:
+    response = await _call(client, rec, "POST", "/api/query/preview", json={"question": question})
+    if response is None:
+        return
+    preview = response.json()
+    logic = [{"Column": col["name"], "Logic": col["logic"]} for col in preview["output_columns"]]
+    response = await _call(client, rec, "POST", "/api/query/modify-logic", json={
+        "current_logic": logic, "followup": ctx["rng"].choice(FOLLOWUPS),
+    })
+    if response is None:
+        return
+    await _call(client, rec, "POST", "/api/query/confirm", json={
+        "question": question,
+        "confirmed_logic": response.json()["updated_logic"],
+        "preview_data": preview,
+    })
+
+
+async def _dashboard(client, rec, question: str, ctx: dict) -> None:
+    await asyncio.gather(*(_call(client, rec, "GET", path) for path in DASHBOARD))
+
+
+async def _export(client, rec, question: str, ctx: dict) -> None:
+    await _call(client, rec, "POST", "/api/export", json=ctx["export_body"])
+
+
+_RUNNERS: dict[str, Callable] = {'query': _query, 'flow': _flow, 'dashboard': _dashboard, 'export': _export}
+
+
+async def _export_body(client: httpx.AsyncClient, rows: int) -> dict:
+    """A query result (rows repeated up to `rows`) as an /api/export body."""
+    response = await client.post("/api/query", json={"question": "collection by State"})
+    response.raise_for_status()
+    result = response.json()
+    data = result["data"] or [{}]
+    return {"data": (data * (rows // len(data) + 1))[:rows], "columns": result["columns"]}
+
+
+# ---------------------------------------------------------------------------
+# Levels
+# ---------------------------------------------------------------------------
+
+async def _worker(client, rec: Recorder, mix: dict, deadline: float, ctx: dict, distinct: bool) -> None:
+    rng = ctx["rng"]
+    names, weights = list(mix), list(mix.values())
+    pool = questions()
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        question = rng.choice(pool)
+        if distinct:
+            question = f"{question} (run {next(ctx['serial'])})"
+        start = time.perf_counter()
+        await _RUNNERS[name](client, rec, question, ctx)
+        rec.scenario(name, (time.perf_counter() - start) * 1000)
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    duration: float,
+    mix: dict,
+    pid: Optional[int],
+    export_body: dict,
+    seed: int = 0,
+    distinct: bool = False,
+) -> dict:
+    rec = Recorder()
+    shared = {"serial": itertools.count(1), "export_body": export_body}
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    with RssSampler(pid) if pid else _NoSampler() as sampler:
+        await asyncio.gather(*(
+            _worker(client, rec, mix, deadline, {**shared, "rng": random.Random(seed * 1000 + i)}, distinct)
+            for i in range(concurrency)
+        ))
+    elapsed = time.perf_counter() - start
+    errors = sum(rec.errors.values())
+    scenarios = sum(stats.count for stats in rec.scenarios.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "requests": rec.request_count,
+        "requests_per_s": round(rec.request_count / elapsed, 2),
+        "scenarios_per_s": round(scenarios / elapsed, 2),
+        "errors": errors,
+        "error_rate": round(errors / rec.request_count, 4) if rec.request_count else None,
+        "errors_by_request": rec.errors,
+        "peak_rss_mb": sampler.peak,
+        "latency_ms": {label: stats.summary() for label, stats in sorted(rec.requests.items())},
+        "scenario_ms": {name: stats.summary() for name, stats in sorted(rec.scenarios.items())},
+    }
+
+
+async def _run_levels(client, levels, duration, mix, pid, export_rows, seed, distinct) -> list[dict]:
+    # Warm: load the snapshot and the first prompts before timing
+    for path in DASHBOARD:
+        (await client.get(path)).raise_for_status()
+    export_body = await _export_body(client, export_rows)
+    results = []
+    for concurrency in levels:
+        results.append(await run_level(client, concurrency, duration, mix, pid, export_body, seed, distinct))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Targets
+# ---------------------------------------------------------------------------
+
+def _stub_settings(ttft_ms: float, tokens_per_second: float) -> None:
+    from backend.config import settings
+    settings.llm_stub = True
+    settings.llm_stub_ttft_ms = ttft_ms
+    settings.llm_stub_tokens_per_second = tokens_per_second
+
+
+def _in_process(**kwargs) -> list[dict]:
+    from backend.main import app
+
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            return await _run_levels(client, pid=os.getpid(), **kwargs)
+
+    return asyncio.run(go())
+
+
+def _against(url: str, pid: Optional[int], **kwargs) -> list[dict]:
+    async def go():
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+            return await _run_levels(client, pid=pid, **kwargs)
+
+    return asyncio.run(go())
+
+
+def _serve(ttft_ms: float, tokens_per_second: float, timeout: float = 120.0) -> tuple[subprocess.Popen, str]:
+    """uvicorn on a free local port with the stub LLM; returns (process, base url) once ready."""
+    from benchmarks.bench_startup import _env, _free_port, _status
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=_env(
+            LLM_STUB="true", LLM_STUB_TTFT_MS=str(ttft_ms), LLM_STUB_TOKENS_PER_SECOND=str(tokens_per_second),
+        ),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.perf_counter() + timeout
+    while _status(f"{url}/readyz") != 200:
+        if server.poll() is not None or time.perf_counter() > deadline:
+            server.terminate()
+            raise RuntimeError("Server did not become ready")
+        time.sleep(0.1)
+    return server, url
+
+
+def run(
+    levels: list[int],
+    duration: float = 10.0,
+    mix: Optional[dict] = None,
+    ttft_ms: float = 300.0,
+    tokens_per_second: float = 0.0,
+    export_rows: int = 1000,
+    seed: int = 0,
+    distinct: bool = False,
+    port: bool = False,
+    url: Optional[str] = None,
+    pid: Optional[int] = None,
+) -> dict:
+    mix = mix or parse_mix(DEFAULT_MIX)
+    kwargs = dict(levels=levels, duration=duration, mix=mix, export_rows=export_rows, seed=seed, distinct=distinct)
+    if url:
+        target, results = url, _against(url, pid, **kwargs)
+    elif port:
+        server, target = _serve(ttft_ms, tokens_per_second)
+        try:
+            results = _against(target, server.pid, **kwargs)
+        finally:
+            server.terminate()
+            server.wait()
+    else:
+        _stub_settings(ttft_ms, tokens_per_second)
+        target, results = "in-process", _in_process(**kwargs)
+    return {
+        "target": target,
+        "mix": mix,
+        "duration_s": duration,
+        "llm_stub": None if url else {"ttft_ms": ttft_ms, "tokens_per_second": tokens_per_second},
+        "distinct_questions": distinct,
+        "levels": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"scenario weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--ttft-ms', type=float, default=300.0, help="stub LLM delay before the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=0.0, help="stub LLM streaming rate (0: no delay)")
+    parser.add_argument('--export-rows', type=int, default=1000)
+    parser.add_argument('--distinct', action='store_true', help="make every question unique (no coalescing)")
+    parser.add_argument('--seed', type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--port', action='store_true', help="serve the app with uvicorn on a local port")
+    target.add_argument('--url', default=None, help="already running server (started with LLM_STUB=true)")
+    parser.add_argument('--pid', type=int, default=None, help="with --url: server process for peak RSS")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report("loadtest", run(
+        args.concurrency, args.duration, parse_mix(args.mix), args.ttft_ms, args.tokens_per_second,
+        args.export_rows, args.seed, args.distinct, args.port, args.url, args.pid,
+    ), args.out)
+
+
+if __name__ == '__main__':
+    main()
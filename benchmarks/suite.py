@@ -0,0 +1,153 @@
+"""
+Scaling benchmark suite on synthetic portfolios (see benchmarks.synthetic).
+
+For each row count: generating the file (reused from --data-dir when already
+there), load_and_process_data, the dashboard endpoints (/api/metrics,
+/api/regions, /api/buckets), execute_pandas_code over the replay corpus,
+sanitize_for_json on result records and /api/export. The app serves each
+synthetic file in turn; the configured data file is restored at the end.
+
+With --compare, timings more than --tolerance slower than the same entry of
+a previous report are listed under "regressions".
+
+    python -m benchmarks.suite --rows 100000 1000000 --out suite.json
+    python -m benchmarks.suite --rows 100000 --compare suite.json --out suite-new.json
+"""
+import argparse
+import json
+import os
+import time
+from typing import Optional
+
+from backend.config import settings
+from backend.data.loader import load_and_process_data, reload_dataframe
+from backend.query.executor import execute_pandas_code, sanitize_for_json
+from benchmarks.common import measure, write_report
+from benchmarks.corpus import CORPUS
+from benchmarks.synthetic import write_synthetic
+
+DASHBOARD = ['/api/metrics', '/api/regions', '/api/buckets']
+SANITIZE_MAX_ROWS = 10_000
+
+
+def _timed(fn) -> tuple[object, float]:
+    start = time.perf_counter()
+    value = fn()
+    return value, round((time.perf_counter() - start) * 1000, 3)
+
+
+def _dataset(rows: int, data_dir: str, seed: int) -> tuple[str, Optional[float]]:
+    """Path of the synthetic file for `rows`, and its generation ms (None if reused)."""
+    path = os.path.join(data_dir, f"synthetic-{rows}.csv.gz")
+    if os.path.exists(path):
+        return path, None
+    os.makedirs(data_dir, exist_ok=True)
+    _, ms = _timed(lambda: write_synthetic(path, rows, seed))
+    return path, ms
+
+
+def run_size(rows: int, data_dir: str, repeat: int = 3, seed: int = 0, export_rows: int = 5_000) -> dict:
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    path, generate_ms = _dataset(rows, data_dir, seed)
+    result = {"file": path, "file_bytes": os.path.getsize(path), "generate_ms": generate_ms}
+
+    result["load_and_process_data"] = measure(lambda: load_and_process_data(path), repeat=repeat, warmup=0)
+    df = reload_dataframe(path)
+    result["columns"] = len(df.columns)
+
+    client = TestClient(app)
+    result["endpoints"] = {}
+    for endpoint in DASHBOARD:
+        assert client.get(endpoint).status_code == 200, endpoint
+        result["endpoints"][endpoint] = measure(lambda: client.get(endpoint), repeat=repeat)
+
+    result["execute_pandas_code"] = {}
+    for entry in CORPUS:
+        try:
+            result["execute_pandas_code"][entry["name"]] = measure(
+                lambda: execute_pandas_code(entry["code"], df), repeat=repeat,
+            )
+        except Exception as e:
+            result["execute_pandas_code"][entry["name"]] = {"error": f"{type(e).__name__}: {e}"}
+
+    sample = df.head(SANITIZE_MAX_ROWS)
+    result["sanitize_for_json"] = {
+        "rows": len(sample),
+        **measure(lambda: sanitize_for_json(sample.to_dict(orient='records')), repeat=repeat),
+    }
+
+    exported = df.head(export_rows)
+    body = {"data": sanitize_for_json(exported.to_dict(orient='records')), "columns": [str(c) for c in exported.columns]}
+    assert client.post('/api/export', json=body).status_code == 200
+    result["export_excel"] = {
+        "rows": len(exported),
+        **measure(lambda: client.post('/api/export', json=body).content, repeat=repeat),
+    }
+    return result
+
+
+def _timings(node, prefix: str = "") -> dict:
+    """Flatten a report's results to {path: median_ms}."""
+    if isinstance(node, dict):
+        if "median_ms" in node:
+            return {prefix: node["median_ms"]}
+        flat = {}
+        for key, value in node.items():
+            flat.update(_timings(value, f"{prefix}/{key}" if prefix else str(key)))
+        return flat
+    return {}
+
+
+def compare(results: dict, previous_path: str, tolerance: float = 0.2) -> list[dict]:
+    """Entries more than `tolerance` (fraction) slower than in the previous report."""
+    with open(previous_path) as f:
+        previous = _timings(json.load(f)["results"]["sizes"])
+    regressions = []
+    for key, ms in _timings(results["sizes"]).items():
+        before = previous.get(key)
+        if before and ms > before * (1 + tolerance):
+            regressions.append({"entry": key, "before_ms": before, "after_ms": ms, "ratio": round(ms / before, 2)})
+    return regressions
+
+
+def run(
+    sizes: list[int],
+    data_dir: str,
+    repeat: int = 3,
+    seed: int = 0,
+    export_rows: int = 5_000,
+    previous: Optional[str] = None,
+    tolerance: float = 0.2,
+) -> dict:
+    original = settings.data_file_path
+    try:
+        results = {"sizes": {str(rows): run_size(rows, data_dir, repeat, seed, export_rows) for rows in sizes}}
+    finally:
+        reload_dataframe(original)
+    if previous:
+        results["regressions"] = compare(results, previous, tolerance)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--data-dir', default='./data/synthetic', help="where synthetic files are written / reused")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--export-rows', type=int, default=5_000)
+    parser.add_argument('--compare', default=None, help="previous suite report to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown vs. --compare (fraction)")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+    write_report(
+        "suite",
+        run(args.rows, args.data_dir, args.repeat, args.seed, args.export_rows, args.compare, args.tolerance),
+        args.out,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Synthetic portfolio generator: a raw allocation file with the snapshot's
+schema at any row count (100K to tens of millions).
+
+Rows are bootstrapped whole from the seed snapshot, so States, Regions, DPD,
+dispositions, channel sent / delivered counts and how they co-occur keep the
+seed's distributions. Loan Numbers are redrawn (unique 12-digit numbers) and
+each row's money columns are scaled by one lognormal factor, so amounts
+spread out without breaking their ratios (e.g. Resolution amount vs. POS).
+Output is written in chunks, so memory stays flat with the row count.
+
+    python -m benchmarks.synthetic --rows 1000000 --out data/synthetic-1000000.csv.gz
+"""
+import argparse
+import gzip
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import settings
+
+MONEY_COLUMNS = [
+    'POS', 'Allocation amount', 'Amount Pending', 'Resolution amount',
+    'Principal Balance Amount', 'Revenue',
+]
+AMOUNT_SPREAD = 0.15  # sigma of the lognormal scale factor
+_LOAN_NUMBER_BASE = 10 ** 11
+_LOAN_NUMBER_SPAN = 9 * 10 ** 11
+_LOAN_NUMBER_STRIDE = 2_654_435_761  # prime, coprime to the span
+
+
+def load_seed(path: Optional[str] = None) -> pd.DataFrame:
+    """The raw seed file (default: settings.data_file_path), unprocessed."""
+    path = path or settings.data_file_path
+    if '.csv' in path:
+        return pd.read_csv(path, encoding='latin-1', low_memory=False)
+    return pd.read_excel(path)
+
+
+def generate(
+    rows: int,
+    seed: int = 0,
+    chunk_rows: int = 500_000,
+    seed_df: Optional[pd.DataFrame] = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield chunks of `rows` synthetic raw rows in total."""
+    seed_df = load_seed() if seed_df is None else seed_df
+    rng = np.random.default_rng(seed)
+    start = int(rng.integers(0, _LOAN_NUMBER_SPAN))
+    money = [col for col in MONEY_COLUMNS if col in seed_df.columns]
+
+    for offset in range(0, rows, chunk_rows):
+        size = min(chunk_rows, rows - offset)
+        chunk = seed_df.iloc[rng.integers(0, len(seed_df), size)].reset_index(drop=True)
+        if 'Loan Number' in chunk.columns:
+            # Multiplicative stride through the 12-digit range: unique and scattered
+            steps = np.arange(offset, offset + size, dtype=np.int64) * _LOAN_NUMBER_STRIDE
+            chunk['Loan Number'] = _LOAN_NUMBER_BASE + (start + steps) % _LOAN_NUMBER_SPAN
+        if money:
+            scale = rng.lognormal(0.0, AMOUNT_SPREAD, size)
+            for col in money:
+                chunk[col] = (chunk[col] * scale).round(2)
+        yield chunk
+
+
+def write_synthetic(
+    path: str,
+    rows: int,
+    seed: int = 0,
+    chunk_rows: int = 500_000,
+    seed_path: Optional[str] = None,
+) -> str:
+    """Write `rows` synthetic rows to path (.csv or .csv.gz) and return path."""
+    seed_df = load_seed(seed_path)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='latin-1', newline='') as f:
+        for i, chunk in enumerate(generate(rows, seed, chunk_rows, seed_df)):
+            chunk.to_csv(f, index=False, header=(i == 0))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--out', required=True, help=".csv or .csv.gz path")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--seed-file', default=None, help="raw file to bootstrap from (default: the configured data file)")
+    parser.add_argument('--chunk-rows', type=int, default=500_000)
+    args = parser.parse_args()
+    write_synthetic(args.out, args.rows, args.seed, args.chunk_rows, args.seed_file)
+    print(args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,12 +28,7 @@ export async function fetchBuckets() {
   return res.json();
 }
 
-export async function exportToExcel(data, columns) {
-  const res = await fetch(`${API_BASE}/api/export`, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ data, columns }),
-  });
+async function downloadExport(res) {
   if (!res.ok) throw new Error('Export failed');
   const blob = await res.blob();
   const url = URL.createObjectURL(blob);
@@ -46,6 +41,22 @@ export async function exportToExcel(data, columns) {
   URL.revokeObjectURL(url);
 }
 
+export async function exportToExcel(data, columns) {
+  const res = await fetch(`${API_BASE}/api/export`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ data, columns }),
+  });
+  return downloadExport(res);
+}
+
+// Export a result kept server-side (no need to re-upload the rows)
+export async function exportResultById(resultId) {
+  const res = await fetch(`${API_BASE}/api/results/${resultId}/export`);
+  if (res.status === 404) return null;
+  return downloadExport(res);
+}
+
 // ---------------------------------------------------------------------------
 // Two-step preview/confirm flow (new endpoints from AI-data)
 // ---------------------------------------------------------------------------
@@ -3,7 +3,7 @@ import { Download, AlertCircle } from 'lucide-react';
 import ResultTable from './ResultTable';
 import ResultChart from './ResultChart';
 import QueryLoadingState from './QueryLoadingState';
-import { exportToExcel } from '../api/client';
+import { exportToExcel, exportResultById } from '../api/client';
 import { isRateColumn, formatNumber } from '../utils/formatters';
 
 function SingleValueHero({ chart, data }) {
@@ -65,7 +65,9 @@ export default function QueryResult({ result, loading, queryText }) {
     );
   }
 
-  const handleExport = () => {
+  const handleExport = async () => {
+    // Fall back to uploading the rows if the server-side copy has expired
+    if (result.result_id && (await exportResultById(result.result_id)) !== null) return;
     exportToExcel(result.data, result.columns);
   };
 
@@ -83,6 +85,10 @@ export default function QueryResult({ result, loading, queryText }) {
     return null;
   })();
 
+  // Long results come with a reduced series for the chart (top-N + "Other", or
+  // downsampled lines); the table below still gets every row
+  const chartRows = result.chart_data?.data ?? result.data;
+
   const renderCharts = () => {
     if (isSingleValue) {
       return <SingleValueHero chart={result.chart} data={result.data} />;
@@ -99,7 +105,7 @@ export default function QueryResult({ result, loading, queryText }) {
               <ResultChart
                 key={key}
                 chart={{ ...result.chart, y_keys: [key], title: key }}
-                data={result.data}
+                data={chartRows}
                 colorIndex={i}
                 compact
               />
@@ -111,7 +117,7 @@ export default function QueryResult({ result, loading, queryText }) {
           <ResultChart
             key={chartGroups.rateKeys[0]}
             chart={{ ...result.chart, y_keys: chartGroups.rateKeys, title: chartGroups.rateKeys[0] }}
-            data={result.data}
+            data={chartRows}
           />
         );
       }
@@ -121,7 +127,7 @@ export default function QueryResult({ result, loading, queryText }) {
           <ResultChart
             key="amounts"
             chart={{ ...result.chart, y_keys: chartGroups.amountKeys, title: chartGroups.amountKeys.join(' & ') }}
-            data={result.data}
+            data={chartRows}
             colorIndex={chartGroups.rateKeys.length}
           />
         );
@@ -137,7 +143,7 @@ export default function QueryResult({ result, loading, queryText }) {
             <ResultChart
               key={key}
               chart={{ ...result.chart, y_keys: [key], title: key }}
-              data={result.data}
+              data={chartRows}
               colorIndex={i}
               compact
             />
@@ -147,7 +153,7 @@ export default function QueryResult({ result, loading, queryText }) {
     }
 
     // All amount columns or single key — single grouped chart
-    return <ResultChart chart={result.chart} data={result.data} />;
+    return <ResultChart chart={result.chart} data={chartRows} />;
   };
 
   return (
@@ -0,0 +1,45 @@
+import ast
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def mixed_frame() -> pd.DataFrame:
+    """30 rows: strings with None, ints, floats with NaN and -0.0, bools and a nullable Int64 column."""
+    return pd.DataFrame({
+        'k': ['a', 'b', 'a', None, 'c', 'b'] * 5,
+        'n': [1, 2, 3, 4, 5, 6] * 5,
+        'x': [1.5, np.nan, -0.0, 2.25, 0.0, 7.0] * 5,
+        'flag': [True, False, True, True, False, False] * 5,
+        'nullable': pd.array([1, None, 3, 4, None, 6] * 5, dtype='Int64'),
+    })
+
+
+def _run_code(code: Union[str, ast.Module], df: pd.DataFrame, names: Optional[dict] = None):
+    """Exec code (source or a parsed tree) on a copy of df, like the executor; returns `result`."""
+    namespace = {'df': df.copy(), 'pd': pd, 'np': np, **(names or {})}
+    tree = ast.parse(code) if isinstance(code, str) else code
+    exec(compile(tree, '<test>', 'exec'), namespace)
+    return namespace['result']
+
+
+def _assert_same_result(actual, expected):
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(actual, expected)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(actual, expected)
+    else:
+        assert actual == expected
+
+
+@pytest.fixture
+def run_code():
+    return _run_code
+
+
+@pytest.fixture
+def assert_same_result():
+    return _assert_same_result
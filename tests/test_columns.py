@@ -0,0 +1,153 @@
+import ast
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.query.columns import plan_columns, pruning_stats
+from backend.query.executor import execute_pandas_code, profile_pandas_code
+
+
+@pytest.fixture
+def frame(mixed_frame) -> pd.DataFrame:
+    """The shared mixed frame plus two columns no test code reads."""
+    return mixed_frame.assign(wide_text=['lorem ipsum'] * 30, unused=np.arange(30.0))
+
+
+def _plan(code: str, df: pd.DataFrame):
+    return plan_columns(ast.parse(code), df)
+
+
+def assert_full_frame(code: str, df: pd.DataFrame):
+    kept, reason = _plan(code, df)
+    assert kept is None, kept
+    return reason
+
+
+@pytest.fixture
+def assert_pruned_same(frame, run_code, assert_same_result):
+    """Assert that code keeps exactly `kept` and gives the same result on the pruned frame."""
+    def check(code: str, kept: list[str]):
+        planned, reason = _plan(code, frame)
+        assert planned == kept, reason
+        assert_same_result(run_code(code, frame[planned]), run_code(code, frame))
+    return check
+
+
+@pytest.mark.parametrize("code, kept", [
+    ("result = df.groupby('k')['n'].sum().reset_index()", ['k', 'n']),
+    ("result = df.groupby('k', dropna=False)['nullable'].sum().reset_index()", ['k', 'n', 'nullable']),
+    ("result = df[df['x'] > 0][['k', 'x']]", ['k', 'x']),
+    ("result = df[df['x'].isna()][['k']]", ['k', 'x']),
+    ("result = df[df.n > 2].groupby('k').agg(total=('x', 'sum')).reset_index()", ['k', 'n', 'x']),
+    ("result = df.groupby('k').agg({'x': 'mean', 'nullable': 'max'}).reset_index()", ['k', 'n', 'x', 'nullable']),
+    ("result = df.query('n > 2')[['n']]", ['n']),
+    ("result = df.dropna(subset=['x'])[['k', 'x']]", ['k', 'x']),
+    ("result = df.sort_values('x').head(3)[['k', 'x']]", ['k', 'x']),
+    ("result = pd.DataFrame({'rows': [len(df[df['flag']])]})", ['flag']),
+    ("df['y'] = df['n'] * df['x']\nresult = df[['k', 'y']]", ['k', 'n', 'x']),
+    ("df.loc[df['n'] > 3, 'x'] = 0\nresult = df[['x']]", ['n', 'x']),
+    ("df = df.fillna(0)\nresult = df.groupby('k')['x'].sum().reset_index()", ['k', 'x']),
+    ("result = df.pivot_table(index='k', values='x', aggfunc='sum').reset_index()", ['k', 'x']),
+    ("result = df.groupby('k').apply(lambda g: g['n'].sum()).to_frame('n')", ['k', 'n']),
+])
+def test_pruned_frame_gives_same_result(code, kept, assert_pruned_same):
+    assert_pruned_same(code, kept)
+
+
+def test_row_wise_code_pruned_when_row_dtype_unchanged(assert_pruned_same):
+    code = "df['y'] = df.apply(lambda row: row['n'] * 2, axis=1)\nresult = df[['k', 'y']]"
+    assert_pruned_same(code, ['k', 'n'])
+    code = (
+        "total = 0\n"
+        "for i, row in df.iterrows():\n"
+        "    if row['k'] == 'a':\n"
+        "        total += row['n']\n"
+        "result = pd.DataFrame({'total': [total]})"
+    )
+    assert_pruned_same(code, ['k', 'n'])
+
+
+def test_row_wise_code_not_pruned_when_row_dtype_changes(frame):
+    # Alone, 'n' would give int64 rows instead of the object rows of the full frame
+    code = "df['y'] = df.apply(lambda row: row['n'] * 2, axis=1)\nresult = df[['y']]"
+    assert _plan(code, frame)[1] == "row-wise code would see a different row dtype"
+    numeric = frame[['n', 'x']]
+    assert _plan(code, numeric)[1] == "row-wise code would see a different row dtype"
+
+
+def test_mutation_through_alias_is_pruned_safely(assert_pruned_same):
+    code = "d = df\nd['n2'] = d['n'] * 2\nresult = df[['n2']]"
+    assert_pruned_same(code, ['n'])
+    code = "rows = df[df['n'] > 1]\nrows['x'] = 1\nresult = rows[['k', 'x']]"
+    assert_pruned_same(code, ['k', 'n', 'x'])
+
+
+@pytest.mark.parametrize("code", [
+    "result = df",
+    "result = df.copy()",
+    "out = df[df['n'] > 1]\nresult = out",
+    "result = df.describe()",
+    "result = df.sum(numeric_only=True).to_frame()",
+    "result = df[[c for c in df.columns if c.startswith('n')]]",
+    "col = 'null' + 'able'\nresult = df[col].to_frame()",
+    "col = f\"{'n'}\"\nresult = df[col].to_frame()",
+    "result = df.dropna()[['k']]",
+    "result = df.drop_duplicates()[['k']]",
+    "result = df.iloc[:, 0:2]",
+    "result = df.loc[:, 'k':'x']",
+    "result = getattr(df, 'n').to_frame()",
+    "result = pd.concat([df, df])[['k']]",
+    "result = df.select_dtypes('number')[['n']]",
+    "result = df.groupby('k').sum()",
+    "result = df.groupby('k').agg('sum')",
+    "result = df.apply(lambda c: c.count()).to_frame()",
+    "def f(d):\n    return d[['n']]\nresult = f(df)",
+    "def f():\n    return df.describe()\nresult = f()",
+    "for c in df:\n    pass\nresult = df[['n']]",
+    "a, b = df, 1\nresult = a[['n']]",
+    "result = eval('df')[['n']]",
+    "df += 1\nresult = df[['n']]",
+])
+def test_refuses_to_prune(code, frame):
+    assert_full_frame(code, frame)
+
+
+def test_keeps_full_frame_when_every_column_is_used(frame):
+    code = "result = df[['k', 'n', 'x', 'flag', 'nullable', 'wide_text', 'unused']]"
+    assert assert_full_frame(code, frame) == "all columns referenced"
+
+
+def test_keeps_full_frame_for_duplicate_or_non_string_labels():
+    duplicated = pd.DataFrame([[1, 2, 3]], columns=['a', 'a', 'b'])
+    assert assert_full_frame("result = df[['b']]", duplicated) == "non-string or duplicate column labels"
+    numbered = pd.DataFrame([[1, 2, 3]], columns=['a', 0, 'b'])
+    assert assert_full_frame("result = df[['b']]", numbered) == "non-string or duplicate column labels"
+
+
+def test_execute_does_not_mutate_input(frame):
+    df = frame.copy()
+    result = execute_pandas_code("df['n'] = 0\ndf.loc[df['x'] > 0, 'k'] = 'z'\nresult = df[['k', 'n']]", df)
+    pd.testing.assert_frame_equal(df, frame)
+    assert (result['n'] == 0).all()
+    # Not pruned: the full frame is copied instead
+    result = execute_pandas_code("df['n'] = 0\nresult = df", df)
+    pd.testing.assert_frame_equal(df, frame)
+    assert (result['n'] == 0).all()
+
+
+def test_missed_column_retries_on_full_frame(frame):
+    # chr(110) == 'n': a column name the analysis cannot see
+    code = "result = pd.DataFrame({'rows': [len(df[chr(110)])]})"
+    assert _plan(code, frame)[0] == []
+    before = pruning_stats()["retried_full"]
+    result = execute_pandas_code(code, frame)
+    assert result['rows'].tolist() == [len(frame)]
+    assert pruning_stats()["retried_full"] == before + 1
+
+
+def test_profile_reports_pruning(frame):
+    _, report = profile_pandas_code("result = df.groupby('k')['n'].sum().reset_index()", frame)
+    assert report["columns"]["kept"] == 2
+    assert report["columns"]["total"] == len(frame.columns)
+    assert report["columns"]["reason"] == "pruned"
@@ -0,0 +1,48 @@
+import time
+
+import pandas as pd
+import pytest
+
+from backend.query.executor import GeneratedExit, execute_pandas_code
+from backend.query.jobs import FINISHED, JobQueue
+from backend.query.pipeline import run_generated_code
+
+FRAME = pd.DataFrame({'k': ['a', 'b', 'a'], 'n': [1, 2, 3]})
+
+
+def _wait(jobs: JobQueue, job_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job still {jobs.get(job_id)['status']}")
+
+
+@pytest.mark.parametrize("code", ["raise SystemExit(1)", "exit()", "raise KeyboardInterrupt"])
+def test_generated_code_cannot_exit(code):
+    with pytest.raises(GeneratedExit):
+        execute_pandas_code(code, FRAME)
+
+
+def test_exiting_code_fails_the_job_and_keeps_the_worker():
+    jobs = JobQueue(workers=1, max_queued=10, retention_seconds=60)
+    job = jobs.submit("run", lambda ctx: run_generated_code("q", "raise SystemExit(1)", ctx, df=FRAME))
+    finished = _wait(jobs, job["job_id"])
+    assert finished["status"] == "failed"
+    assert "SystemExit" in finished["error"]
+
+    job = jobs.submit("run", lambda ctx: run_generated_code("q", "result = df.groupby('k')['n'].sum()", ctx, df=FRAME))
+    assert _wait(jobs, job["job_id"])["status"] == "succeeded"
+    assert all(t.is_alive() for t in jobs._threads)
+
+
+def test_base_exception_in_run_fails_the_job():
+    def run(ctx):
+        raise SystemExit(2)
+
+    jobs = JobQueue(workers=1, max_queued=10, retention_seconds=60)
+    assert _wait(jobs, jobs.submit("run", run)["job_id"])["status"] == "failed"
+    job = jobs.submit("run", lambda ctx: run_generated_code("q", "result = df", ctx, df=FRAME))
+    assert _wait(jobs, job["job_id"])["status"] == "succeeded"
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from backend.config import settings
+from backend.llm import client
+
+
+class _Stream:
+    def __init__(self, deltas):
+        self._chunks = [SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=d))]) for d in deltas]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+class _FlakyClient:
+    """Fails the first request with a retryable error, then streams."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.attempts += 1
+        if self.attempts == 1:
+            raise ConnectionError("reset")
+        return _Stream(["SELECT", " 1"])
+
+
+def test_ttft_excludes_failed_attempts_and_backoff(monkeypatch):
+    calls = []
+    fake = _FlakyClient()
+    monkeypatch.setattr(client, "_get_client", lambda: fake)
+    monkeypatch.setattr(client, "_retryable", lambda: (ConnectionError,))
+    monkeypatch.setattr(client, "record_call", lambda *args, **kwargs: calls.append(args))
+    monkeypatch.setattr(settings, "llm_retry_backoff_seconds", 0.2)
+
+    assert client._chat("system", "question", 10, "test") == "SELECT 1"
+    assert fake.attempts == 2
+    _, latency_ms, ttft_ms, _, retries = calls[0]
+    assert retries == 1
+    # Latency is end to end, so it includes the 200 ms backoff; TTFT does not
+    assert latency_ms >= 200
+    assert ttft_ms < 100
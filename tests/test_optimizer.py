@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.query.optimizer import HELPERS, optimize_code, optimizer_stats
+
+
+def _fast_paths(rewrite: str) -> int:
+    return optimizer_stats()[rewrite]["fast_path"]
+
+
+def assert_not_rewritten(code: str):
+    code_out, applied = optimize_code(code)
+    assert applied == [], code_out
+    assert code_out == code
+
+
+@pytest.fixture
+def run(run_code):
+    """run(code, df, optimize): the code's result, with or without the rewrites."""
+    def run_(code: str, df: pd.DataFrame, optimize: bool):
+        if not optimize:
+            return run_code(code, df)
+        return run_code(optimize_code(code)[0], df, HELPERS)
+    return run_
+
+
+@pytest.fixture
+def assert_same(run, assert_same_result):
+    """Assert that `rewrite` applies to code and leaves its result on df unchanged."""
+    def check(code: str, df: pd.DataFrame, rewrite: str):
+        code_out, applied = optimize_code(code)
+        assert rewrite in applied, code_out
+        assert_same_result(run(code, df, optimize=True), run(code, df, optimize=False))
+    return check
+
+
+# -- row_apply ---------------------------------------------------------------
+
+@pytest.mark.parametrize("expr", [
+    "row['n'] + row['x']",
+    "row['n'] * 2 - row['flag']",
+    "-row['x'] / 4",
+    "row['n'] // 4 + row['n'] % 4",
+    "(row['n'] + 1) ** 2",
+])
+def test_row_apply_matches_apply_on_mixed_frame(expr, mixed_frame, assert_same):
+    assert_same(f"result = df.apply(lambda row: {expr}, axis=1)", mixed_frame, "row_apply")
+
+
+@pytest.mark.parametrize("expr", [
+    "row['n'] + row['x']",
+    "row['n'] * 3",
+    "row['x'] ** 2 - 1",
+])
+def test_row_apply_matches_apply_on_numeric_frame(expr, mixed_frame, assert_same):
+    df = mixed_frame[['n', 'x']]
+    assert_same(f"result = df.apply(lambda row: {expr}, axis=1)", df, "row_apply")
+
+
+def test_row_apply_matches_apply_on_nullable_column(mixed_frame, assert_same):
+    assert_same("result = df.apply(lambda row: row['nullable'] * 2, axis=1)", mixed_frame, "row_apply")
+    assert_same("result = df.apply(lambda row: row['nullable'] + 1, axis=1)", mixed_frame[['nullable']], "row_apply")
+
+
+def test_row_apply_keeps_division_by_zero_error(run):
+    df = pd.DataFrame({'a': [1, 2, 3], 'b': [1, 0, 2], 's': ['x', 'y', 'z']})
+    code = "result = df.apply(lambda row: row['a'] / row['b'], axis=1)"
+    with pytest.raises(ZeroDivisionError):
+        run(code, df, optimize=False)
+    with pytest.raises(ZeroDivisionError):
+        run(code, df, optimize=True)
+
+
+def test_row_apply_assigned_to_new_column_matches(mixed_frame, assert_same):
+    code = "df['y'] = df.apply(lambda row: row['n'] * row['x'], axis=1)\nresult = df"
+    assert_same(code, mixed_frame, "row_apply")
+
+
+def test_row_apply_does_not_mutate_input(mixed_frame):
+    df = mixed_frame.copy()
+    namespace = {'df': df, 'pd': pd, **HELPERS}
+    code, _ = optimize_code("result = df.apply(lambda row: row['n'] + row['x'], axis=1)")
+    exec(code, namespace)
+    pd.testing.assert_frame_equal(df, mixed_frame)
+
+
+@pytest.mark.parametrize("code", [
+    "result = df.apply(lambda row: row['n'] ** 5, axis=1)",
+    "result = df.apply(lambda row: row['n'] ** row['n'], axis=1)",
+    "result = df.apply(lambda row: row['k'].upper(), axis=1)",
+    "result = df.apply(lambda row: max(row['n'], row['x']), axis=1)",
+    "result = df.apply(lambda row: row['n'] if row['flag'] else 0, axis=1)",
+    "result = df.apply(lambda row: row['n'] + 1)",
+    "result = df.apply(lambda row: row['n'] + 1, axis=1, result_type='expand')",
+    "result = df.apply(lambda row: 1, axis=1)",
+    "result = df.apply(lambda row, k=1: row['n'] + k, axis=1)",
+])
+def test_row_apply_refuses(code):
+    assert_not_rewritten(code)
+
+
+def test_row_apply_int_power_on_mixed_frame_does_not_overflow(run):
+    df = pd.DataFrame({'a': np.arange(100) * 60000, 's': ['x'] * 100})
+    code = "result = df.apply(lambda row: row['a'] ** 3, axis=1)"
+    expected = run(code, df, optimize=False)
+    actual = run(code, df, optimize=True)
+    assert actual.iloc[-1] == 209584584000000000000
+    pd.testing.assert_series_equal(actual, expected)
+
+
+def test_row_apply_int_arithmetic_on_mixed_frame_takes_fast_path(assert_same):
+    df = pd.DataFrame({'a': np.arange(100), 'b': [True, False] * 50, 's': ['x'] * 100})
+    before = _fast_paths("row_apply")
+    assert_same("result = df.apply(lambda row: row['a'] * 2 + row['b'], axis=1)", df, "row_apply")
+    assert _fast_paths("row_apply") == before + 1
+
+
+# -- iterrows ----------------------------------------------------------------
+
+def test_iterrows_matches_on_mixed_frame(mixed_frame, run):
+    code = (
+        "out = []\n"
+        "for i, row in df.iterrows():\n"
+        "    out.append((i, row['k'], row['n'], row['x'], row['flag'], row['nullable']))\n"
+        "result = out"
+    )
+    code_out, applied = optimize_code(code)
+    assert applied == ["iterrows"]
+    expected = run(code, mixed_frame, optimize=False)
+    actual = run(code, mixed_frame, optimize=True)
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        for a, b in zip(got, want):
+            assert type(a) is type(b)
+            assert a is b or a == b or (pd.isna(a) and pd.isna(b))
+
+
+def test_iterrows_sees_frame_as_of_loop_start(mixed_frame, assert_same):
+    code = (
+        "total = 0\n"
+        "for i, row in df.iterrows():\n"
+        "    total += row['n']\n"
+        "    df.loc[i + 1, 'n'] = 100\n"
+        "result = total"
+    )
+    assert_same(code, mixed_frame[['n', 'x']].copy(), "iterrows")
+
+
+@pytest.mark.parametrize("body", [
+    "out.append(row)",
+    "out.append(row.to_dict())",
+    "out.append(row.get('n'))",
+    "row['n'] = 0",
+    "row = None",
+    "out.append(len(row))",
+])
+def test_iterrows_refuses_whole_row_use(body):
+    assert_not_rewritten(f"out = []\nfor i, row in df.iterrows():\n    {body}\nresult = out")
+
+
+# -- loop_filter -------------------------------------------------------------
+
+@pytest.mark.parametrize("column, values", [
+    ('k', "['a', 'b', 'c', 'missing']"),
+    ('k', "df['k'].unique()"),
+    ('n', "[1, 2, 7]"),
+    ('n', "df['n'].unique()"),
+    ('flag', "[True, False]"),
+    ('flag', "[1, 0]"),
+    ('x', "df['x'].unique()"),
+    ('nullable', "[1, 3, 6]"),
+])
+def test_loop_filter_matches(column, values, mixed_frame, assert_same):
+    code = (
+        "parts = []\n"
+        f"for v in {values}:\n"
+        f"    sub = df[df['{column}'] == v]\n"
+        "    parts.append(sub)\n"
+        "result = pd.concat(parts)"
+    )
+    assert_same(code, mixed_frame, "loop_filter")
+
+
+def test_loop_filter_missing_values_fall_back(mixed_frame, assert_same):
+    for value in ("None", "np.nan", "pd.NA"):
+        code = f"sub = None\nfor v in [{value}]:\n    sub = df[df['k'] == v]\nresult = sub"
+        assert_same(code, mixed_frame, "loop_filter")
+    code = "out = []\nfor v in [1, pd.NA, None]:\n    out.append(len(df[df['nullable'] == v]))\nresult = out"
+    assert_same(code, mixed_frame, "loop_filter")
+
+
+def test_loop_filter_numeric_key_on_object_column(assert_same):
+    df = pd.DataFrame({'k': [1, 1.0, True, 'a', 2], 'v': range(5)})
+    code = "out = {}\nfor v in [1, True, 2, 'a']:\n    out[v] = df[df['k'] == v]['v'].tolist()\nresult = out"
+    assert_same(code, df, "loop_filter")
+
+
+def test_loop_filter_refuses_frame_mutated_through_alias(mixed_frame, run):
+    code = (
+        "d = df\n"
+        "out = []\n"
+        "for v in ['a', 'b']:\n"
+        "    out.append(len(d[d['k'] == v]))\n"
+        "    df.loc[df['k'] == 'a', 'k'] = 'b'\n"
+        "result = out"
+    )
+    assert "loop_filter" not in optimize_code(code)[1]
+    assert run(code, mixed_frame, optimize=True) == run(code, mixed_frame, optimize=False) == [10, 20]
+
+
+@pytest.mark.parametrize("code", [
+    # the frame is changed in the loop
+    "for v in ['a']:\n    df = df[df['k'] == v]\nresult = df",
+    "for v in ['a']:\n    sub = df[df['k'] == v]\n    df['k'] = 'b'\nresult = sub",
+    "for v in ['a']:\n    sub = df[df['k'] == v]\n    df.drop(columns='n', inplace=True)\nresult = sub",
+    # the loop variable is rebound in the body
+    "for v in ['a']:\n    v = 'b'\n    sub = df[df['k'] == v]\nresult = sub",
+    # not an equality filter on the loop variable
+    "for v in ['a']:\n    sub = df[df['k'] != v]\nresult = sub",
+    "for v in ['a']:\n    sub = df[df['k'] == 'a']\nresult = sub",
+    "for v in ['a']:\n    sub = df[other['k'] == v]\nresult = sub",
+])
+def test_loop_filter_refuses(code):
+    assert "loop_filter" not in optimize_code(code)[1]
+
+
+def test_loop_filter_leaves_closures_alone():
+    code = "fs = []\nfor v in ['a', 'b']:\n    fs.append(lambda: df[df['k'] == v])\nresult = [len(f()) for f in fs]"
+    assert "loop_filter" not in optimize_code(code)[1]
+
+
+# -- group_reduce ------------------------------------------------------------
+
+@pytest.mark.parametrize("how", ["sum", "mean", "median", "min", "max", "count"])
+@pytest.mark.parametrize("column", ["n", "x", "flag"])
+def test_group_reduce_matches(how, column, mixed_frame, assert_same):
+    assert_same(f"result = df.groupby('k').apply(lambda g: g['{column}'].{how}())", mixed_frame, "group_reduce")
+
+
+@pytest.mark.parametrize("how", ["sum", "min", "max", "count"])
+def test_group_reduce_matches_on_nullable_column(how, mixed_frame, assert_same):
+    assert_same(f"result = df.groupby('k').apply(lambda g: g['nullable'].{how}())", mixed_frame, "group_reduce")
+
+
+@pytest.mark.parametrize("keywords", ["dropna=False", "sort=False", "observed=True"])
+def test_group_reduce_matches_with_groupby_options(keywords, mixed_frame, assert_same):
+    assert_same(f"result = df.groupby('k', {keywords}).apply(lambda g: g['x'].sum())", mixed_frame, "group_reduce")
+
+
+def test_group_reduce_matches_on_several_keys(mixed_frame, assert_same):
+    assert_same("result = df.groupby(['k', 'flag']).apply(lambda g: g['n'].sum())", mixed_frame, "group_reduce")
+
+
+def test_group_reduce_on_group_key_falls_back(mixed_frame, run):
+    code = "result = df.groupby('n').apply(lambda g: g['n'].sum())"
+    assert "group_reduce" in optimize_code(code)[1]
+    before = optimizer_stats()["group_reduce"]["fallback"]
+    with pytest.raises(KeyError):
+        run(code, mixed_frame, optimize=False)
+    with pytest.raises(KeyError):
+        run(code, mixed_frame, optimize=True)
+    assert optimizer_stats()["group_reduce"]["fallback"] == before + 1
+
+
+@pytest.mark.parametrize("code", [
+    "result = df.groupby('k').apply(lambda g: g['n'].sum() + 1)",
+    "result = df.groupby('k').apply(lambda g: g['n'].sum(min_count=1))",
+    "result = df.groupby('k').apply(lambda g: g['n'].std())",
+    "result = df.groupby('k').apply(lambda g: g.n.sum())",
+    "result = df.groupby('k', as_index=False).apply(lambda g: g['n'].sum())",
+    "result = df.groupby('k').apply(lambda g: g['n'].sum(), include_groups=False)",
+    "result = df.groupby('k')['n'].apply(lambda s: s.sum())",
+])
+def test_group_reduce_refuses(code):
+    assert "group_reduce" not in optimize_code(code)[1]
@@ -0,0 +1,238 @@
+import ast
+
+import pandas as pd
+import pytest
+
+from backend.query.predicates import (
+    FRAME_KEY_NAME,
+    HELPERS,
+    clear_predicate_cache,
+    filter_key,
+    mask_cache_key,
+    predicate_cache_stats,
+    predicate_key,
+    rewrite_predicates,
+)
+
+KEY = "test-frame"
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    clear_predicate_cache()
+    yield
+    clear_predicate_cache()
+
+
+@pytest.fixture
+def frame(mixed_frame) -> pd.DataFrame:
+    """The shared mixed frame on a non-zero index, so masks must keep the labels."""
+    return mixed_frame.set_axis(pd.RangeIndex(100, 130))
+
+
+def _key(expr: str):
+    return predicate_key(ast.parse(expr, mode='eval').body)
+
+
+@pytest.fixture
+def run(run_code):
+    """run(code, df, frame_key, rewrite): the code's result, with or without cached predicates."""
+    def run_(code: str, df: pd.DataFrame, frame_key=None, rewrite: bool = False):
+        if not rewrite:
+            return run_code(code, df)
+        tree = ast.parse(code)
+        rewrite_predicates(tree)
+        return run_code(tree, df, {**HELPERS, FRAME_KEY_NAME: frame_key})
+    return run_
+
+
+@pytest.fixture
+def assert_same(frame, run, assert_same_result):
+    """Assert that code is rewritten and gives the same result cold, warm and without a key."""
+    def check(code: str):
+        assert rewrite_predicates(ast.parse(code)), code
+        expected = run(code, frame)
+        # First run computes the masks, the second reads them back from the cache
+        for _ in range(2):
+            assert_same_result(run(code, frame, KEY, rewrite=True), expected)
+        assert_same_result(run(code, frame, None, rewrite=True), expected)
+    return check
+
+
+@pytest.mark.parametrize("predicate", [
+    "df['k'] == 'a'",
+    "'a' == df['k']",
+    "df['k'] != 'a'",
+    "df['n'] > 2",
+    "2 < df['n']",
+    "df['n'] <= 3.0",
+    "df['x'] >= -0.5",
+    "df['x'] == 0",
+    "df['x'] < 1e20",
+    "df['n'] == 1e20",
+    "df['k'].isin(['a', 'c'])",
+    "df['n'].isin([1, 2.0, 6])",
+    "df['k'].isna()",
+    "df['x'].notnull()",
+    "df['n'].between(2, 4)",
+    "df['x'].between(-1, 2.25)",
+    "(df['k'] == 'a') & (df['n'] > 2)",
+    "(df['n'] > 2) | (df['x'].isna())",
+    "~(df['k'] == 'b')",
+    "~df['x'].isna() & ((df['k'] == 'a') | (df['k'] == 'b'))",
+    "(df['n'] > 2) & (df['n'] > 2)",
+])
+def test_rewritten_filter_matches(predicate, assert_same):
+    assert_same(f"result = df[{predicate}]")
+    assert_same(f"result = ({predicate}).to_frame('mask')")
+
+
+@pytest.mark.parametrize("predicate", [
+    "df['nullable'] > 2",
+    "df['nullable'] == 3",
+    "(df['nullable'] > 2) & (df['k'] == 'a')",
+    "~(df['nullable'] > 2)",
+    "df['nullable'].isna()",
+    "df['nullable'].between(2, 4)",
+])
+def test_rewritten_filter_matches_on_nullable_column(predicate, assert_same):
+    assert_same(f"result = ({predicate}).to_frame('mask')")
+    assert_same(f"result = df.loc[{predicate}]")
+
+
+def test_rewritten_filters_in_larger_snippet(assert_same):
+    code = (
+        "south = df[(df['k'] == 'a') & (df['n'] >= 2)]\n"
+        "late = df[df['x'] > 0]\n"
+        "result = pd.DataFrame({'south': [south['n'].sum()], 'late': [len(late)], "
+        "'either': [int(((df['k'] == 'a') | (df['x'] > 0)).sum())]})"
+    )
+    assert_same(code)
+
+
+def test_cache_serves_repeat_predicates(frame, run):
+    code = "result = df[(df['k'] == 'a') & (df['n'] > 2)]"
+    run(code, frame, KEY, rewrite=True)
+    before = predicate_cache_stats()["hits"]
+    run("result = df[(df['n'] > 2) & (df['k'] == 'a')]", frame, KEY, rewrite=True)
+    assert predicate_cache_stats()["hits"] > before
+
+
+def test_nullable_masks_are_not_cached(frame, run):
+    before = predicate_cache_stats()["uncacheable"]
+    run("result = df[df['nullable'] > 2]", frame, KEY, rewrite=True)
+    assert predicate_cache_stats()["uncacheable"] == before + 1
+    assert predicate_cache_stats()["entries"] == 0
+
+
+def test_cached_mask_not_served_for_other_row_count(frame, run, assert_same_result):
+    run("result = df[df['n'] > 2]", frame, KEY, rewrite=True)
+    head = frame.head(7)
+    assert_same_result(run("result = df[df['n'] > 2]", head, KEY, rewrite=True), head[head['n'] > 2])
+
+
+def test_mask_cache_key_only_for_loaded_snapshot(frame):
+    assert mask_cache_key(frame) is None
+
+
+@pytest.mark.parametrize("left, right", [
+    ("df['n'] > 2", "2 < df['n']"),
+    ("df['n'] == 2", "df['n'] == 2.0"),
+    ("(df['k'] == 'a') & (df['n'] > 2)", "(df['n'] > 2) & (df['k'] == 'a')"),
+    ("(df['k'] == 'a') | (df['k'] == 'b') | (df['k'] == 'c')", "(df['k'] == 'c') | ((df['k'] == 'b') | (df['k'] == 'a'))"),
+    ("df['n'].between(2, 4)", "(df['n'] >= 2) & (df['n'] <= 4)"),
+    ("df['k'].isin(['b', 'a', 'a'])", "df['k'].isin(('a', 'b'))"),
+    ("df['k'].isnull()", "df['k'].isna()"),
+])
+def test_equivalent_predicates_share_a_key(left, right):
+    assert _key(left) == _key(right) is not None
+
+
+@pytest.mark.parametrize("left, right", [
+    ("df['n'] == 1", "df['n'] == '1'"),
+    ("df['n'] == 1", "df['n'] == 1.5"),
+    ("df['n'] > 2", "df['n'] >= 2"),
+    ("df['k'] == 'a'", "df['x'] == 'a'"),
+    ("(df['k'] == 'a') & (df['n'] > 2)", "(df['k'] == 'a') | (df['n'] > 2)"),
+])
+def test_different_predicates_get_different_keys(left, right):
+    assert _key(left) != _key(right)
+
+
+@pytest.mark.parametrize("expr", [
+    "df['flag'] == True",
+    "df['k'] == None",
+    "df['x'] == float('nan')",
+    "df['x'] > np.inf",
+    "df['n'] == df['x']",
+    "df['n'] == limit",
+    "other['n'] > 2",
+    "df.n > 2",
+    "1 < df['n'] < 3",
+    "df['n'].isin(values)",
+    "df['k'].isin([])",
+    "df['k'].isin(['a', None])",
+    "df['k'].isna(axis=0)",
+    "df['n'].between(1, 3, inclusive='left')",
+    "(df['n'] > 2) & flags",
+])
+def test_not_a_cacheable_predicate(expr):
+    assert _key(expr) is None
+
+
+@pytest.mark.parametrize("code", [
+    "df = df[df['n'] > 1]\nresult = df[df['k'] == 'a']",
+    "df['n'] = 0\nresult = df[df['n'] > 1]",
+    "df.loc[0, 'n'] = 9\nresult = df[df['n'] > 1]",
+    "df.n = 0\nresult = df[df['n'] > 1]",
+    "del df['x']\nresult = df[df['n'] > 1]",
+    "df.drop(columns='x', inplace=True)\nresult = df[df['n'] > 1]",
+    "df['x'].fillna(0, inplace=True)\nresult = df[df['x'] > 1]",
+    "df.insert(0, 'y', 1)\nresult = df[df['n'] > 1]",
+    "df.pop('x')\nresult = df[df['n'] > 1]",
+    "df.update(df * 2)\nresult = df[df['n'] > 1]",
+    "d = df\nd['n'] = 0\nresult = df[df['n'] > 1]",
+    "frames = [df]\nresult = df[df['n'] > 1]",
+    "result = pd.concat([df])[df['n'] > 1]",
+    "def f(df):\n    return df[df['n'] > 1]\nresult = f(df)",
+    "f = lambda df: df[df['n'] > 1]\nresult = f(df)",
+    "result = [df[df['n'] > 1] for df in [df]][0]",
+    "if (df := df.head(3)) is not None:\n    result = df[df['n'] > 1]",
+    "exec(\"df['n'] = 0\")\nresult = df[df['n'] > 1]",
+    "eval(\"df.insert(0, 'y', 1)\")\nresult = df[df['n'] > 1]",
+])
+def test_refuses_when_frame_may_change(code):
+    assert rewrite_predicates(ast.parse(code)) == []
+
+
+def test_dynamic_code_mutating_frame_keeps_original_result(frame, run, assert_same_result):
+    code = "exec(\"df['n'] = 0\")\nresult = df[df['n'] > 1]"
+    run("result = df[df['n'] > 1]", frame, KEY, rewrite=True)
+    assert_same_result(run(code, frame, KEY, rewrite=True), run(code, frame))
+
+
+@pytest.mark.parametrize("text, code", [
+    ("k = a", "df['k'] == 'a'"),
+    ("k == 'a'", "df['k'] == 'a'"),
+    ("K != b", "df['k'] != 'b'"),
+    ("n > 2", "df['n'] > 2"),
+    ("n >= 2.0", "df['n'] >= 2"),
+    ("x < 1,000", "df['x'] < 1000"),
+    ("k in (a, c)", "df['k'].isin(['a', 'c'])"),
+    ("k not in [a, c]", "~df['k'].isin(['a', 'c'])"),
+    ("x is null", "df['x'].isna()"),
+    ("k is not null", "df['k'].notna()"),
+])
+def test_preview_filter_keys_match_code_keys(text, code, frame):
+    assert filter_key(text, frame) == _key(code) is not None
+
+
+@pytest.mark.parametrize("text", [
+    "missing = a",
+    "n > many",
+    "k is null already",
+    "k in ()",
+    "k",
+])
+def test_unrecognised_preview_filters(text, frame):
+    assert filter_key(text, frame) is None
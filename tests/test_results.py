@@ -0,0 +1,37 @@
+import pandas as pd
+
+from backend.query.pipeline import outcome_payload, run_generated_code
+from backend.query.store import get_result, get_result_store
+
+FRAME = pd.DataFrame({'k': ['a', 'b', 'a'], 'n': [1, 2, 3]})
+
+
+def test_result_stored_once_per_outcome():
+    outcome = run_generated_code("q", "result = df.groupby('k')['n'].sum().reset_index()", df=FRAME)
+    entries = get_result_store().stats()["entries"]
+    payloads = [outcome_payload(outcome, orient) for orient in ("records", "columns", "records")]
+    assert get_result_store().stats()["entries"] == entries
+    assert {p["result_id"] for p in payloads} == {outcome["result_id"]}
+    pd.testing.assert_frame_equal(get_result(outcome["result_id"]), outcome["result"])
+
+
+def test_failed_outcome_has_no_result_id():
+    outcome = run_generated_code("q", "result = df['missing']", df=FRAME)
+    assert not outcome["success"]
+    assert outcome_payload(outcome)["result_id"] is None
+
+
+def test_result_endpoints():
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    outcome = run_generated_code("q", "result = df.groupby('k')['n'].sum().reset_index()", df=FRAME)
+    result_id = outcome["result_id"]
+    client = TestClient(app)
+    page = client.get(f"/api/results/{result_id}", params={"sort_by": "n", "ascending": "false"}).json()
+    assert page["total_rows"] == 2
+    assert [row["k"] for row in page["data"]] == ["a", "b"]
+    assert client.get(f"/api/results/{result_id}", params={"filter": ["nope=1"]}).status_code == 400
+    assert client.get(f"/api/results/{result_id}/export", params={"format": "csv"}).status_code == 200
+    assert client.delete(f"/api/results/{result_id}").json() == {"deleted": result_id}
+    assert client.get(f"/api/results/{result_id}").status_code == 404
@@ -0,0 +1,57 @@
+from datetime import timedelta
+from typing import Any, List
+
+import numpy as np
+import orjson
+import pandas as pd
+import pytest
+from pydantic import TypeAdapter
+
+from backend.query.executor import sanitize_for_json
+from backend.query.serialize import dumps, frame_to_payload
+
+_RECORDS = TypeAdapter(List[dict[str, Any]])
+
+_STAMPS = pd.to_datetime(
+    ['2026-01-01', '2026-01-03 12:00', None, '2026-02-01 00:00:00.5', '2026-02-01 00:00:00.000000001'],
+    format='ISO8601',
+)
+_DAYS = pd.to_datetime(['2025-12-31', '2026-01-01', '2026-01-01', '2025-01-01', '2027-02-01'])
+
+COLUMNS = {
+    'timedelta': _STAMPS - _DAYS,
+    'timedelta_days': pd.to_timedelta([1, 2, None, 400, -1], unit='D'),
+    'timedelta_object': pd.Series([pd.Timedelta('1h'), None, np.timedelta64(5, 's'), pd.NaT, 'Grand Total'], dtype=object),
+    'categorical': pd.Categorical(['x', None, 'y', 'x', 'y']),
+    'categorical_numbers': pd.Categorical([1, 2, None, 1, 2]),
+    'nullable_boolean': pd.array([True, None, False, True, None], dtype='boolean'),
+    'nullable_int': pd.array([1, None, 3, 4, None], dtype='Int64'),
+    'datetime': _STAMPS,
+    'datetime_tz': _STAMPS.tz_localize('UTC'),
+    'float': [1.5, np.nan, 3.0, -0.0, 2.0],
+    'string': pd.array(['a', None, 'c', 'd', 'e'], dtype='string'),
+}
+
+
+def _baseline(df: pd.DataFrame) -> list[dict]:
+    """What sanitize_for_json + the pydantic response model used to send."""
+    return orjson.loads(_RECORDS.dump_json(sanitize_for_json(df.to_dict(orient='records'))))
+
+
+@pytest.mark.parametrize("column", list(COLUMNS))
+def test_records_match_baseline_encoding(column):
+    df = pd.DataFrame({column: COLUMNS[column]})
+    _, data = frame_to_payload(df, "records")
+    assert orjson.loads(dumps(data)) == _baseline(df)
+
+
+@pytest.mark.parametrize("column", list(COLUMNS))
+def test_columns_orient_matches_records(column):
+    df = pd.DataFrame({column: COLUMNS[column]})
+    _, data = frame_to_payload(df, "columns")
+    assert orjson.loads(dumps(data))[column] == [row[column] for row in _baseline(df)]
+
+
+def test_timedelta_scalars_outside_frames():
+    payload = {"elapsed": pd.Timedelta(days=1, hours=2), "gap": timedelta(seconds=-90)}
+    assert orjson.loads(dumps(payload)) == {"elapsed": "P1DT2H", "gap": "-PT1M30S"}